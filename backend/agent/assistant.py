@@ -1,4 +1,3 @@
-import openai
 import logging
 import re
 import json
@@ -6,21 +5,33 @@ import io
 import base64
 import os
 import unicodedata
+import threading
 from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime
-from typing import List, Dict, Optional, Any, Tuple
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from pathlib import Path
 
 # Imports database
 from config.database import get_db_connection, get_db, CustomSQLDatabase, get_schema
 
 # Imports agent modules
-from agent.llm_utils import ask_llm 
+from agent.llm_utils import ask_llm, chat_completion, chat_completion_stream
 from langchain.prompts import PromptTemplate
 from agent.template_matcher.matcher import SemanticTemplateMatcher
+from agent.template_matcher.exact_matcher import ExactTemplateMatcher
+from agent.template_store import TemplateSnapshot, get_template_store
 from agent.cache_manager import CacheManager
 from agent.cache_manager1 import CacheManager1
+from agent.domain_router import DomainRouter
+from agent.stage_runner import StageRunner, get_stage_runner
+from agent.prompt_builder import get_prompt_builder
+from agent.question_parser import ParsedQuestion, QuestionParser, NAME_PATTERN, detect_pdf_request, strip_accents
+from agent.sql_params import BoundQuery, bind_template, render_sql, execute_bound
+from agent.result_cache import get_result_cache
+from agent.children_directory import SCHOOL_YEAR, get_children_directory
+from agent.single_flight import SingleFlight
 
 
 # Imports security and templates
@@ -43,6 +54,15 @@ plt.switch_backend('Agg')
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Nombre de lignes envoyées dans l'aperçu du mode streaming
+STREAM_PREVIEW_ROWS = int(os.getenv("STREAM_PREVIEW_ROWS", "10"))
+# Lots de questions : taille maximale et nombre de questions résolues / formatées simultanément
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "50"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))
+
+# pyplot repose sur un état global : un seul rendu à la fois
+_GRAPH_LOCK = threading.Lock()
+
 class SQLAssistant:
     
     def __init__(self, db=None, model="gpt-4o", temperature=0.3, max_tokens=500):
@@ -59,6 +79,10 @@ class SQLAssistant:
         self.conversation_history = []
         self.cache = CacheManager()
         self.cache1 = CacheManager1()
+        self.question_parser = QuestionParser(self.cache1.extractor)
+        self.children_directory = get_children_directory()
+        # Générations SQL identiques simultanées regroupées en un seul appel LLM
+        self.single_flight = SingleFlight()
         
         # Configuration des coûts et schéma
         self.cost_per_1k_tokens = 0.005
@@ -66,13 +90,13 @@ class SQLAssistant:
         
         # Chargement des configurations
         #self.relations_description = self._safe_load_relations()
-        self.domain_descriptions = self._safe_load_domain_descriptions()
-        self.domain_to_tables_mapping = self._safe_load_domain_to_tables_mapping()
+        # Templates et prompts/*.json : rechargés à chaud par le store (voir template_store.py)
+        self.template_store = get_template_store()
         self.ask_llm = ask_llm
-        
-        # Template matcher et templates questions
-        self.template_matcher = SemanticTemplateMatcher()
-        self.templates_questions = self._safe_load_templates()
+        self.domain_router = self._safe_init_domain_router(self.template_store.snapshot)
+        self.template_store.subscribe(self._on_templates_reloaded)
+        self.stage_runner = get_stage_runner()
+        self.prompt_builder = get_prompt_builder()
         self.last_generated_sql = ""
         self.query_history = []
         self.conversation_history_old = []  # Renommer pour éviter confusion
@@ -83,85 +107,53 @@ class SQLAssistant:
         
         logger.info("✅ SQLAssistant initialisé avec succès")
     
-    def _safe_get_schema(self):
+    def _safe_init_domain_router(self, snapshot: TemplateSnapshot) -> Optional[DomainRouter]:
+        """Initialise le routeur local de domaines (repli LLM si confiance faible)"""
         try:
-            return self.db.get_schema() if self.db else []
+            return DomainRouter(
+                snapshot.domain_descriptions,
+                snapshot.domain_to_tables_mapping,
+                llm_fallback=lambda q: self.get_relevant_domains(q, self.domain_descriptions)
+            )
         except Exception as e:
-            logger.warning(f"⚠️ Impossible de récupérer le schéma: {e}")
-            return []
-
+            logger.warning(f"⚠️ Routeur de domaines indisponible: {e}")
+            return None
 
-    def _safe_load_domain_descriptions(self) -> dict:
-        """Charge les descriptions de domaine avec gestion d'erreurs"""
-        try:
-            domain_path = Path(__file__).parent  / 'prompts' / 'domain_descriptions.json'
-            if domain_path.exists():
-                with open(domain_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            logger.warning("⚠️ Fichier domain_descriptions.json non trouvé")
-            return {}
-        except Exception as e:
-            logger.error(f"❌ Erreur chargement domain descriptions: {e}")
-            return {}
+    def _on_templates_reloaded(self, snapshot: TemplateSnapshot, previous: TemplateSnapshot):
+        """Appelé par le store (thread de fond) : reconstruit le routeur si les domaines ont changé"""
+        if (snapshot.domain_descriptions != previous.domain_descriptions
+                or snapshot.domain_to_tables_mapping != previous.domain_to_tables_mapping):
+            self.domain_router = self._safe_init_domain_router(snapshot)
 
-    def _safe_load_domain_to_tables_mapping(self) -> dict:
-        """Charge le mapping domaine-tables avec gestion d'erreurs"""
-        try:
-            mapping_path = Path(__file__).parent   / 'prompts' / 'domain_tables_mapping.json'
-            if mapping_path.exists():
-                with open(mapping_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            logger.warning("⚠️ Fichier domain_tables_mapping.json non trouvé")
-            return {}
-        except Exception as e:
-            logger.error(f"❌ Erreur chargement domain mapping: {e}")
-            return {}
+    # Vues sur le snapshot courant du store (remplacé atomiquement à chaque rechargement)
+    @property
+    def templates_questions(self) -> List[Dict]:
+        return self.template_store.snapshot.templates
 
-    def _safe_load_templates(self) -> list:
-        """Charge les templates de questions avec gestion d'erreurs"""
-        try:
-            templates_path = Path(__file__).parent/ 'templates_questions.json'
-            
-            if not templates_path.exists():
-                logger.info(f"⚠️ Fichier non trouvé, création: {templates_path}")
-                templates_path.write_text('{"questions": []}', encoding='utf-8')
-                return []
+    @property
+    def template_matcher(self) -> SemanticTemplateMatcher:
+        return self.template_store.snapshot.semantic_matcher
 
-            content = templates_path.read_text(encoding='utf-8').strip()
-            if not content:
-                logger.warning("⚠️ Fichier vide, réinitialisation")
-                templates_path.write_text('{"questions": []}', encoding='utf-8')
-                return []
+    @property
+    def exact_template_matcher(self) -> ExactTemplateMatcher:
+        return self.template_store.snapshot.exact_matcher
 
-            try:
-                data = json.loads(content)
-                if not isinstance(data.get("questions", []), list):
-                    raise ValueError("Format invalide: 'questions' doit être une liste")
-                
-                valid_templates = []
-                for template in data["questions"]:
-                    if all(key in template for key in ["template_question", "requete_template"]):
-                        valid_templates.append(template)
-                    else:
-                        logger.warning(f"⚠️ Template incomplet ignoré: {template.get('description', 'sans description')}")
-                
-                if valid_templates:
-                    self.template_matcher.load_templates(valid_templates)
-                    logger.info(f"✅ {len(valid_templates)} templates chargés")
-                
-                return valid_templates
+    @property
+    def domain_descriptions(self) -> Dict[str, str]:
+        return self.template_store.snapshot.domain_descriptions
 
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Fichier JSON corrompu, réinitialisation. Erreur: {e}")
-                backup_path = templates_path.with_suffix('.bak.json')
-                templates_path.rename(backup_path)
-                templates_path.write_text('{"questions": []}', encoding='utf-8')
-                return []
+    @property
+    def domain_to_tables_mapping(self) -> Dict[str, List[str]]:
+        return self.template_store.snapshot.domain_to_tables_mapping
 
+    def _safe_get_schema(self):
+        try:
+            return self.db.get_schema() if self.db else []
         except Exception as e:
-            logger.error(f"❌ Erreur critique lors du chargement: {e}")
+            logger.warning(f"⚠️ Impossible de récupérer le schéma: {e}")
             return []
 
+
     # ================================
     # MÉTHODES PRINCIPALES D'INTERACTION
     # ================================
@@ -238,19 +230,16 @@ class SQLAssistant:
             roles = []
 
         # Validation des rôles (identique à la version existante)
-        if not roles:
-            return "", "❌ Accès refusé : Aucun rôle fourni", None, 0
-        
-        valid_roles = ['ROLE_SUPER_ADMIN', 'ROLE_PARENT']
-        has_valid_role = any(role in valid_roles for role in roles)
-        
-        if not has_valid_role:
-            return "", f"❌ Accès refusé : Rôles fournis {roles}, requis {valid_roles}", None, 0
+        role_error = self._check_roles(roles)
+        if role_error:
+            return "", role_error, None, 0
 
         # 🚫 AJOUT: Vérification spéciale pour les parents qui demandent des attestations
+        parsed = None
         if 'ROLE_PARENT' in roles and 'ROLE_SUPER_ADMIN' not in roles:
-            # Vérifier si c'est une demande d'attestation
-            pdf_request = self._check_for_pdf_request(question)
+            # Analyse unique de la question, réutilisée par tout le traitement parent
+            parsed = self.question_parser.parse(question)
+            pdf_request = parsed.pdf_request
             if pdf_request:
                 error_message = """❌ Accès refusé : Génération de documents officiels réservée aux administrateurs.
 
@@ -289,7 +278,7 @@ class SQLAssistant:
             if 'ROLE_SUPER_ADMIN' in roles:
                 sql_query, formatted_response, graph_data = self._process_super_admin_question(question)
             elif 'ROLE_PARENT' in roles:
-                sql_query, formatted_response, graph_data = self._process_parent_question(question, user_id)
+                sql_query, formatted_response, graph_data = self._process_parent_question(question, user_id, parsed)
             
             # 🆕 SAUVEGARDER LA RÉPONSE ASSISTANT
             self.conversation_manager.add_message(
@@ -314,6 +303,17 @@ class SQLAssistant:
             return "", error_message, None, conversation_id or 0
     def _process_super_admin_question(self, question: str) -> tuple[str, str, Optional[str]]:
         """Traite une question admin - VERSION CORRIGÉE"""
+        plan = self._resolve_super_admin_sql(question)
+        return self._answer_from_plan(plan, question)
+
+    def _resolve_super_admin_sql(self, question: str, use_ai: bool = True) -> Dict[str, Any]:
+        """
+        Étape 1 (admin) : détermine la requête SQL sans l'exécuter.
+        Retourne un plan {"role", "sql", "source", "message"} ; un message non vide
+        est une réponse finale (attestation, erreur) qui ne nécessite pas d'exécution.
+        Avec use_ai=False, l'appel LLM est laissé à l'appelant (source "ai_pending").
+        """
+        plan = {"role": "admin", "sql": "", "source": None, "message": None}
         
         # Vérifier d'abord si c'est une demande d'attestation
         pdf_request = self._check_for_pdf_request(question)
@@ -327,7 +327,8 @@ class SQLAssistant:
                 # Récupérer les infos de l'étudiant
                 student_data = self.get_student_info_by_name(student_name)
                 if not student_data:
-                    return "", f"❌ Aucun élève trouvé avec le nom '{student_name}'", None
+                    plan["message"] = f"❌ Aucun élève trouvé avec le nom '{student_name}'"
+                    return plan
                 
                 # Préparer les données pour le PDF
                 student_data['nom_complet'] = f"{student_data['NomFr']} {student_data['PrenomFr']}"
@@ -336,154 +337,178 @@ class SQLAssistant:
                 # Générer le PDF
                 pdf_result = generator.generate(student_data)
                 if pdf_result['status'] != 'success':
-                    return "", "❌ Erreur lors de la génération du document", None
+                    plan["message"] = "❌ Erreur lors de la génération du document"
+                    return plan
                 
                 pdf_url = f"/download-attestation/{pdf_result['filename']}"
-                return "", f"✅ Attestation générée pour {student_name}\n📄 Télécharger: {pdf_url}", None
+                plan["message"] = f"✅ Attestation générée pour {student_name}\n📄 Télécharger: {pdf_url}"
+                return plan
                 
             except Exception as e:
                 logger.error(f"Erreur génération attestation: {e}")
-                return "", f"❌ Erreur lors de la génération: {str(e)}", None
+                plan["message"] = f"❌ Erreur lors de la génération: {str(e)}"
+                return plan
         
-        # Le reste du traitement normal pour les questions SQL...
+        # 1. Cache des requêtes admin
         cached = self.cache.get_cached_query(question)
         if cached:
             sql_template, variables = cached
-            sql_query = sql_template
-            for column, value in variables.items():
-                sql_query = sql_query.replace(f"{{{column}}}", value)
+            bound = bind_template(sql_template, variables)
             
             logger.info("⚡ Requête admin récupérée depuis le cache")
-            try:
-                result = self.execute_sql_query(sql_query)
-                if result['success']:
-                    # 🎯 GÉNÉRATION DE GRAPHIQUE POUR CACHE
-                    graph_data = self.generate_graph_if_relevant(result['data'], question)
-                    formatted_result = self.format_response_with_ai(result['data'], question, sql_query)
-                    return sql_query, formatted_result, graph_data  # 🎯 3 VALEURS
-                else:
-                    return sql_query, f"❌ Erreur d'exécution SQL : {result['error']}", None
-            except Exception as db_error:
-                return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}", None
+            plan.update(sql=render_sql(bound), bound=bound, source="cache")
+            return plan
         
         # 2. Vérifier les templates existants
         template_match = self.find_matching_template(question)
         if template_match:
             logger.info("🔍 Template admin trouvé")
-            sql_query = self.generate_query_from_template(
+            bound = self.bind_query_from_template(
                 template_match["template"],
                 template_match["variables"]
             )
-            try:
-                result = self.execute_sql_query(sql_query)
-                if result['success']:
-                    # 🎯 GÉNÉRATION DE GRAPHIQUE POUR TEMPLATE
-                    graph_data = self.generate_graph_if_relevant(result['data'], question)
-                    formatted_result = self.format_response_with_ai(result['data'], question, sql_query)
-                    return sql_query, formatted_result, graph_data  # 🎯 3 VALEURS
-                else:
-                    return sql_query, f"❌ Erreur d'exécution SQL : {result['error']}", None
-            except Exception as db_error:
-                return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}", None
+            plan.update(sql=render_sql(bound), bound=bound, source="template")
+            return plan
         
-        # 3. Génération AI + exécution + formatage
+        # 3. Génération AI
+        if not use_ai:
+            plan["source"] = "ai_pending"
+            return plan
+
         try:
-            # 🎯 GÉNÉRATION SQL MANQUANTE - AJOUT ICI
-            sql_query = self.generate_sql_with_ai(question)
+            # Questions identiques en cours : une seule génération, mise en cache par le premier appelant
+            key = ("admin", " ".join(question.lower().split()))
+            sql_query, shared = self.single_flight.do(key, self.generate_sql_with_ai, question)
             
             if not sql_query:
-                return "", "❌ La requête générée est vide.", None
-                
-            result = self.execute_sql_query(sql_query)
-            if result['success']:
-                # 🎯 GÉNÉRATION DE GRAPHIQUE
-                graph_data = self.generate_graph_if_relevant(result['data'], question)
-                
-                formatted_result = self.format_response_with_ai(result['data'], question, sql_query)
-                self.cache.cache_query(question, sql_query)
-                
-                return sql_query, formatted_result, graph_data  
-            else:
-                # Tentative de correction automatique
-                corrected_sql = self._auto_correct_sql(sql_query, result['error'])
-                if corrected_sql:
-                    retry_result = self.execute_sql_query(corrected_sql)
-                    if retry_result['success']:
-                        graph_data = self.generate_graph_if_relevant(retry_result['data'], question)
-                        formatted_result = self.format_response_with_ai(retry_result['data'], question, corrected_sql)
-                        self.cache.cache_query(question, sql_query)
-                        return corrected_sql, formatted_result, graph_data  
-                
-                return sql_query, f"❌ Erreur d'exécution SQL : {result['error']}", None
+                plan["message"] = "❌ La requête générée est vide."
+                return plan
+            
+            plan.update(sql=sql_query, source="ai_shared" if shared else "ai")
+            return plan
             
         except Exception as e:
-            logger.error(f"Erreur dans _process_super_admin_question: {e}")
-            return "", f"❌ Erreur de traitement : {str(e)}", None    
+            logger.error(f"Erreur dans _resolve_super_admin_sql: {e}")
+            plan["message"] = f"❌ Erreur de traitement : {str(e)}"
+            return plan
 
+    def _execute_plan(self, plan: Dict[str, Any], question: str, auto_correct: bool = True,
+                      connection=None) -> Dict[str, Any]:
+        """
+        Étape 2 : exécute la requête du plan.
+        Les requêtes générées par IA sont mises en cache si elles aboutissent ; côté admin,
+        une requête en échec est corrigée automatiquement puis ré-exécutée une fois.
+        Une requête issue d'un cache ou d'un template (plan["bound"]) est exécutée avec
+        ses paramètres liés, sauf si plan["sql"] a été modifié depuis.
+        Retourne {"success", "sql", "data", "error"}.
+        """
+        sql_query = plan["sql"]
+        bound = plan.get("bound")
+        if bound is not None and render_sql(bound) != sql_query:
+            bound = None
+        try:
+            if bound is not None:
+                result = self.execute_sql_query(bound.sql, bound.params, connection=connection)
+            else:
+                result = self.execute_sql_query(sql_query, connection=connection)
+        except Exception as db_error:
+            return {"success": False, "sql": sql_query, "data": [], "error": str(db_error)}
+        
+        cache = self.cache if plan["role"] == "admin" else self.cache1
+        
+        if result['success']:
+            if plan["source"] == "ai":
+                if plan["role"] == "parent":
+                    cache.cache_query(question, sql_query, parsed=plan.get("parsed"))
+                else:
+                    cache.cache_query(question, sql_query)
+            return {"success": True, "sql": sql_query, "data": result['data'], "error": None}
+        
+        # Tentative de correction automatique (requêtes IA admin)
+        if auto_correct and plan["source"] == "ai" and plan["role"] == "admin":
+            corrected_sql = self._auto_correct_sql(sql_query, result['error'])
+            if corrected_sql:
+                retry_result = self.execute_sql_query(corrected_sql, connection=connection)
+                if retry_result['success']:
+                    cache.cache_query(question, corrected_sql)
+                    return {"success": True, "sql": corrected_sql, "data": retry_result['data'], "error": None}
+        
+        return {"success": False, "sql": sql_query, "data": [], "error": result['error']}
 
-            return "", f"Erreur: {str(e)}", None, None, None
-    def _check_for_pdf_request(self, question: str) -> Optional[tuple[str, str]]:
-        """Vérifie si c'est une demande de document PDF"""
-        patterns = {
-            'attestation': [
-                r'attestation\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)',
-                r'certificat\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)',
-                r'document\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)',
-            ]
-        }
+    def _answer_from_plan(self, plan: Dict[str, Any], question: str) -> tuple[str, str, Optional[str]]:
+        """Exécute le plan puis formate la réponse ; retourne (sql, réponse, graphique)"""
+        if plan["message"]:
+            return plan["sql"], plan["message"], None
         
-        for doc_type, regex_list in patterns.items():
-            for pattern in regex_list:
-                match = re.search(pattern, question, re.IGNORECASE)
-                if match:
-                    student_name = match.group(2).strip() if match.group(2) else "Étudiant"
-                    return student_name, doc_type
+        execution = self._execute_plan(plan, question)
+        if not execution["success"]:
+            return execution["sql"], f"❌ Erreur d'exécution SQL : {execution['error']}", None
         
-        return None
+        formatted_result, graph_data = self._finalize_answer(execution["data"], question, execution["sql"])
+        return execution["sql"], formatted_result, graph_data
+
+    def _check_for_pdf_request(self, question: str) -> Optional[tuple[str, str]]:
+        """Vérifie si c'est une demande de document PDF"""
+        return detect_pdf_request(question)
         
-    def _process_parent_question(self, question: str, user_id: int) -> tuple[str, str, Optional[str]]:
+    def _process_parent_question(self, question: str, user_id: int,
+                                 parsed: Optional[ParsedQuestion] = None) -> tuple[str, str, Optional[str]]:
         """Traite une question avec restrictions parent - VERSION CORRIGÉE MULTI-ENFANTS + BLOCAGE ATTESTATION"""
+        plan = self._resolve_parent_sql(question, user_id, parsed=parsed)
+        return self._answer_from_plan(plan, question)
+
+    def _resolve_parent_sql(self, question: str, user_id: int, use_ai: bool = True,
+                            parsed: Optional[ParsedQuestion] = None,
+                            runner: Optional[StageRunner] = None) -> Dict[str, Any]:
+        """
+        Étape 1 (parent) : détermine la requête SQL restreinte aux enfants, sans l'exécuter.
+        Avec use_ai=False, le contexte enfants est placé dans plan["context"] (source "ai_pending").
+        La question est analysée une seule fois (plan["parsed"]) puis réutilisée par chaque étape.
+        runner : pool des étapes (celui du lot pour ask_questions_batch), partagé par défaut.
+        """
+        runner = runner or self.stage_runner
+        if parsed is None:
+            parsed = self.question_parser.parse(question)
+        plan = {"role": "parent", "sql": "", "source": None, "message": None, "parsed": parsed}
         
         # 🚫 AJOUT: Bloquer les demandes d'attestation pour les parents
-        pdf_request = self._check_for_pdf_request(question)
-        if pdf_request:
-            return "", "❌ Accès refusé : Seuls les administrateurs peuvent générer des attestations et documents officiels. Veuillez contacter l'administration de l'école.", None
+        if parsed.pdf_request:
+            plan["message"] = "❌ Accès refusé : Seuls les administrateurs peuvent générer des attestations et documents officiels. Veuillez contacter l'administration de l'école."
+            return plan
         
+        # Pré-chargement des enfants pendant la consultation du cache
+        children_future = runner.submit(
+            "children", self.get_user_children_detailed_data, user_id
+        )
+
         # Nettoyage du cache
         self.cache1.clean_double_braces_in_cache()
         
         # Vérification cache parent
-        cached = self.cache1.get_cached_query(question, user_id)
+        cached = self.cache1.get_cached_query(question, user_id, parsed=parsed)
         if cached:
             sql_template, variables = cached
-            sql_query = sql_template
-            for column, value in variables.items():
-                sql_query = sql_query.replace(f"{{{column}}}", value)
+            # Même texte SQL pour tous les enfants / trimestres : seules les valeurs liées changent
+            bound = bind_template(sql_template, variables)
             
             logger.info("⚡ Requête parent récupérée depuis le cache")
-            try:
-                result = self.execute_sql_query(sql_query)
-                if result['success']:
-                    graph_data = self.generate_graph_if_relevant(result['data'], question)
-                    formatted_result = self.format_response_with_ai(result['data'], question, sql_query)
-                    return sql_query, formatted_result, graph_data
-                else:
-                    return sql_query, f"❌ Erreur d'exécution SQL : {result['error']}", None
-            except Exception as db_error:
-                return sql_query, f"❌ Erreur d'exécution SQL : {str(db_error)}", None
+            plan.update(sql=render_sql(bound), bound=bound, source="cache")
+            return plan
 
         # Récupération des données enfants avec informations détaillées
-        children_data = self.get_user_children_detailed_data(user_id)
+        children_data = runner.result("children", children_future, fallback=[])
         
         if not children_data:
-            return "", "❌ Aucun enfant trouvé pour ce parent ou erreur d'accès.", None
+            plan["message"] = "❌ Aucun enfant trouvé pour ce parent ou erreur d'accès."
+            return plan
         
         # 🎯 NOUVELLE LOGIQUE : Gestion intelligente des questions multi-enfants
-        child_context = self.analyze_child_context_in_question(question, children_data)
+        child_context = self.analyze_child_context_in_question(question, children_data, parsed)
         
         if child_context["action"] == "request_clarification":
             # Retourner une demande de clarification
-            return "", child_context["message"], None
+            plan["message"] = child_context["message"]
+            return plan
         elif child_context["action"] == "process_specific":
             # Traiter pour un enfant spécifique
             target_child = child_context["target_child"]
@@ -503,102 +528,157 @@ class SQLAssistant:
             
             logger.info(f"📊 Traitement pour tous les enfants: {children_names_str}")
         else:
-            return "", "❌ Impossible de déterminer l'enfant concerné par votre question.", None
+            plan["message"] = "❌ Impossible de déterminer l'enfant concerné par votre question."
+            return plan
 
         # Validation des noms dans la question
-        detected_names = self.detect_names_in_question(question, children_prenoms)
+        detected_names = self.detect_names_in_question(question, children_prenoms, parsed)
         if detected_names["unauthorized_names"]:
             unauthorized_list = ", ".join(detected_names["unauthorized_names"])
-            return "", f"❌ Accès interdit: Vous n'avez pas le droit de consulter les données de {unauthorized_list}", None
-        
-        # Génération SQL avec template parent
-        try:
-            sql_query = self.generate_sql_parent(question, user_id, children_ids_str, children_names_str)
-            
-            if not sql_query:
-                return "", "❌ La requête générée est vide.", None
-
-            # Validation de sécurité (sauf pour infos publiques)
-            if not self._is_public_info_query(question, sql_query):
-                if not self.validate_parent_access(sql_query, children_ids):
-                    return "", "❌ Accès refusé: La requête ne respecte pas les restrictions parent.", None
-            else:
-                logger.info("ℹ️ Question sur information publique - validation bypassée")
+            plan["message"] = f"❌ Accès interdit: Vous n'avez pas le droit de consulter les données de {unauthorized_list}"
+            return plan
+        
+        plan["context"] = {
+            "user_id": user_id,
+            "children_ids": children_ids,
+            "children_ids_str": children_ids_str,
+            "children_names_str": children_names_str
+        }
+        if not use_ai:
+            plan["source"] = "ai_pending"
+            return plan
 
-            # Exécution
-            result = self.execute_sql_query(sql_query)
-            
-            if result['success']:
-                graph_data = self.generate_graph_if_relevant(result['data'], question)
-                formatted_result = self.format_response_with_ai(result['data'], question, sql_query)
-                self.cache1.cache_query(question, sql_query)
-                return sql_query, formatted_result, graph_data
-            else:
-                return sql_query, f"❌ Erreur d'exécution SQL : {result['error']}", None
+        # Génération SQL avec template parent (partagée entre questions identiques simultanées)
+        try:
+            return self._generate_parent_sql_coalesced(plan, question, parsed)
                 
         except Exception as e:
-            logger.error(f"Erreur dans _process_parent_question: {e}")
-            return "", f"❌ Erreur de traitement : {str(e)}", None
-    def get_user_children_detailed_data(self, user_id: int) -> List[Dict]:
-        """Récupère les données détaillées des enfants pour un parent"""
-        connection = None
-        cursor = None
-        children_data = []
+            logger.error(f"Erreur dans _resolve_parent_sql: {e}")
+            plan["message"] = f"❌ Erreur de traitement : {str(e)}"
+            return plan
 
+    def _generate_parent_sql_coalesced(self, plan: Dict[str, Any], question: str,
+                                       parsed: ParsedQuestion) -> Dict[str, Any]:
+        """
+        Génération LLM regroupée par (rôle, question normalisée, nombre d'enfants ciblés) :
+        les parents posant la même question en même temps attendent la génération du premier,
+        puis lient leurs propres IDs enfants et valeurs (trimestre, matière...) au template obtenu.
+        Si le template ne peut pas être réutilisé, une génération dédiée est faite.
+        Les requêtes partagées (source "ai_shared") ne sont pas remises en cache.
+        """
+        context = plan["context"]
+        key = ("parent", parsed.template, len(context["children_ids"]))
+        generated, shared = self.single_flight.do(
+            key, self._generate_parent_sql_for_sharing, question, parsed, context
+        )
+        if not shared:
+            return self._accept_parent_sql(plan, question, generated["sql"])
+        
+        bound = self._bind_shared_parent_sql(generated, parsed, context["children_ids"])
+        if bound is None:
+            logger.info("🔁 Requête partagée non réutilisable pour ce parent, génération dédiée")
+            sql_query = self.generate_sql_parent(
+                question, context["user_id"], context["children_ids_str"], context["children_names_str"]
+            )
+            return self._accept_parent_sql(plan, question, sql_query)
+        
+        logger.info("🤝 Requête parent générée pour une question identique, IDs enfants liés")
+        plan = self._accept_parent_sql(plan, question, render_sql(bound))
+        if not plan["message"]:
+            plan.update(bound=bound, source="ai_shared")
+        return plan
+
+    def _generate_parent_sql_for_sharing(self, question: str, parsed: ParsedQuestion,
+                                         context: Dict[str, Any]) -> Dict[str, Any]:
+        """Génération du premier appelant, avec le template réutilisable par les suivants"""
+        sql_query = self.generate_sql_parent(
+            question, context["user_id"], context["children_ids_str"], context["children_names_str"]
+        )
+        return {
+            "sql": sql_query,
+            "template": self._parent_sql_template(sql_query, question, parsed.variables, context),
+            "variables": dict(parsed.variables)
+        }
+
+    def _parent_sql_template(self, sql_query: str, question: str, variables: Dict[str, str],
+                             context: Dict[str, Any]) -> Optional[str]:
+        """
+        Template de la requête générée ({id_personne} et variables de la question), ou None
+        si une valeur propre au premier parent y reste écrite en dur : son ID, un ID ou un prénom
+        de ses enfants, ou tout nombre absent de la question.
+        """
+        if not sql_query:
+            return None
         try:
-            query = """
-            SELECT DISTINCT 
-                pe.id AS id_enfant, 
-                pe.PrenomFr AS prenom,
-                pe.NomFr AS nom,
-                e.DateNaissance AS date_naissance,
-                YEAR(CURDATE()) - YEAR(e.DateNaissance) AS age,
-                c.CODECLASSEFR AS classe,
-                n.NOMNIVAR AS niveau,
-                CASE 
-                    WHEN pe.Civilite = 1 THEN 'M'
-                    WHEN pe.Civilite = 2 THEN 'F'
-                    ELSE 'Inconnu'
-                END AS genre
-            FROM personne p
-            JOIN parent pa ON p.id = pa.Personne
-            JOIN parenteleve pev ON pa.id = pev.Parent
-            JOIN eleve e ON pev.Eleve = e.id
-            JOIN personne pe ON e.IdPersonne = pe.id
-            JOIN inscriptioneleve ie ON e.id = ie.Eleve
-            JOIN classe c ON ie.Classe = c.id
-            JOIN niveau n ON c.IDNIV = n.id
-            JOIN anneescolaire a ON ie.AnneeScolaire = a.id
-            WHERE p.id = %s AND a.AnneeScolaire = %s
-            ORDER BY e.DateNaissance ASC
-            """
-            
-            connection = get_db()
-            cursor = connection.cursor()
-            
-            current_year = "2024/2025"
-            cursor.execute(query, (user_id, current_year))
-            children_data = cursor.fetchall()
-            
-            if children_data:
-                logger.info(f"✅ Trouvé {len(children_data)} enfants pour le parent {user_id}")
-            
-            return children_data
-            
+            template = self.cache1._normalize_sql(sql_query, variables)
         except Exception as e:
-            logger.error(f"❌ Erreur get_user_children_detailed_data pour parent {user_id}: {str(e)}")
-            return []
-            
-        finally:
-            try:
-                if cursor:
-                    cursor.close()
-                    
-                if connection and hasattr(connection, '_direct_connection'):
-                    connection.close()
-                    logger.debug("🔌 Connexion MySQL directe fermée")
-            except Exception as close_error:
-                logger.warning(f"⚠️ Erreur lors du nettoyage: {str(close_error)}")
+            logger.debug(f"Normalisation de la requête partagée impossible: {e}")
+            return None
+        
+        ids = [str(int(child_id)) for child_id in context["children_ids"]]
+        children_names = [name.strip() for name in context["children_names_str"].split(",")]
+        
+        def replace_id_list(match):
+            numbers = re.split(r'\s*,\s*', match.group(1).strip())
+            return "IN ({id_personne})" if sorted(numbers) == sorted(ids) else match.group(0)
+        
+        template = re.sub(r'\bIN\s*\(\s*(\d+(?:\s*,\s*\d+)*)\s*\)', replace_id_list, template, flags=re.IGNORECASE)
+        if len(ids) == 1:
+            template = re.sub(rf"(\bidpersonne\s*=\s*)'?{ids[0]}'?(?!\d)", r"\1{id_personne}", template,
+                              flags=re.IGNORECASE)
+        
+        if '{id_personne}' not in template:
+            return None
+        if any(re.search(rf'(?<!\d){value}(?!\d)', template) for value in ids + [str(context["user_id"])]):
+            return None
+        # Hors chaînes et placeholders, seuls les nombres de la question (communs à tous les parents) sont admis
+        literals = re.sub(r"'[^']*'|\"[^\"]*\"|\{\w+\}", " ", template)
+        if set(re.findall(r'(?<![\w.])\d+(?![\w.])', literals)) - set(re.findall(r'\d+', question)):
+            return None
+        template_lower = template.lower()
+        if any(name and name.lower() in template_lower for name in children_names):
+            return None
+        return template
+
+    def _bind_shared_parent_sql(self, generated: Dict[str, Any], parsed: ParsedQuestion,
+                                children_ids: List[int]) -> Optional[BoundQuery]:
+        """Requête partagée liée aux enfants et aux valeurs de ce parent, ou None si non réutilisable"""
+        template = generated["template"]
+        if template is None:
+            return None
+        # Une valeur différente de celle du premier parent doit avoir son placeholder dans le template
+        for name, value in parsed.variables.items():
+            if generated["variables"].get(name) != value and f"{{{name}}}" not in template:
+                return None
+        try:
+            bound = bind_template(template, {**parsed.variables, "id_personne": list(children_ids)})
+        except ValueError:
+            return None
+        if re.search(r'\{\w+\}', bound.sql):
+            return None
+        return bound
+
+    def _accept_parent_sql(self, plan: Dict[str, Any], question: str, sql_query: str) -> Dict[str, Any]:
+        """Contrôle d'accès d'une requête parent générée, puis mise à jour du plan"""
+        if not sql_query:
+            plan["message"] = "❌ La requête générée est vide."
+            return plan
+
+        # Validation de sécurité (sauf pour infos publiques)
+        if not self._is_public_info_query(question, sql_query, plan.get("parsed")):
+            if not self.validate_parent_access(sql_query, plan["context"]["children_ids"]):
+                plan["message"] = "❌ Accès refusé: La requête ne respecte pas les restrictions parent."
+                return plan
+        else:
+            logger.info("ℹ️ Question sur information publique - validation bypassée")
+
+        plan.update(sql=sql_query, source="ai")
+        return plan
+
+    def get_user_children_detailed_data(self, user_id: int) -> List[Dict]:
+        """Récupère les données détaillées des enfants pour un parent (annuaire partagé, année SCHOOL_YEAR)"""
+        return self.children_directory.get_children(user_id)
+
     def handle_multiple_children_logic(self, question: str, children_data: List[Dict], user_id: int) -> Optional[str]:
         """Gère la logique pour les parents avec plusieurs enfants"""
         
@@ -814,7 +894,8 @@ class SQLAssistant:
         return result  
         
     
-    def analyze_child_context_in_question(self, question: str, children_data: List[Dict]) -> Dict[str, Any]:
+    def analyze_child_context_in_question(self, question: str, children_data: List[Dict],
+                                          parsed: Optional[ParsedQuestion] = None) -> Dict[str, Any]:
         """
         Analyse intelligente du contexte enfant dans la question
         Retourne une action à effectuer et les données associées
@@ -832,7 +913,7 @@ class SQLAssistant:
                 "target_child": children_data[0] if children_data else None
             }
         
-        question_lower = question.lower()
+        question_lower = parsed.lower if parsed else question.lower()
         
         # 1. Vérifier si un prénom spécifique est mentionné
         for child in children_data:
@@ -923,8 +1004,7 @@ class SQLAssistant:
             }
         
         # 5. Vérifier si un nom non autorisé est mentionné
-        import re
-        potential_names = re.findall(r'\b[A-ZÀ-ÿ][a-zà-ÿ]+\b', question)
+        potential_names = parsed.names if parsed else NAME_PATTERN.findall(question)
         child_names = [child['prenom'] for child in children_data]
         
         for name in potential_names:
@@ -957,26 +1037,56 @@ class SQLAssistant:
 
     def generate_sql_with_ai(self, question: str) -> str:
         """Génère une requête SQL via IA pour admin"""
-        relevant_domains = self.get_relevant_domains(question, self.domain_descriptions)
+        llm_response = self.ask_llm(self._build_admin_prompt(question))
+        return self._postprocess_admin_sql(llm_response)
+
+    def generate_sql_parent(self, question: str, user_id: int, children_ids_str: str, children_names_str: str) -> str:
+        """Génère une requête SQL avec restrictions parent"""
+        prompt = self._build_parent_prompt(question, user_id, children_ids_str, children_names_str)
+        llm_response = self.ask_llm(prompt)
+        return self._postprocess_parent_sql(llm_response)
+
+    def _get_prompt_context(self, question: str) -> Tuple[Optional[List[str]], str]:
+        """Retourne (tables candidates, descriptions des domaines) ; None = tout le schéma"""
+        relevant_domains = self.get_relevant_domains_improved(question)
+        # Descriptions et mapping lus dans le même snapshot
+        snapshot = self.template_store.snapshot
+        domain_descriptions = snapshot.domain_descriptions
         
         if relevant_domains:
-            relevant_tables = self.get_tables_from_domains(relevant_domains, self.domain_to_tables_mapping)
-            table_info = self.db.get_table_info(relevant_tables)
+            relevant_tables = self.get_tables_from_domains(relevant_domains, snapshot.domain_to_tables_mapping)
             relevant_domain_descriptions = "\n".join(
-                f"{dom}: {self.domain_descriptions[dom]}" for dom in relevant_domains if dom in self.domain_descriptions
+                f"{dom}: {domain_descriptions[dom]}" for dom in relevant_domains if dom in domain_descriptions
             )
         else:
-            table_info = self.db.get_table_info()
-            relevant_domain_descriptions = "\n".join(self.domain_descriptions.values())
-
-        prompt = ADMIN_PROMPT_TEMPLATE.format(
-            input=question,
-            table_info=table_info,
-            relevant_domain_descriptions=relevant_domain_descriptions,
-            #relations=self.relations_description
+            relevant_tables = None
+            relevant_domain_descriptions = "\n".join(domain_descriptions.values())
+        return relevant_tables, relevant_domain_descriptions
+
+    def _build_sql_prompt(self, template: PromptTemplate, role: str, question: str, **fields) -> str:
+        """Prompt de génération SQL avec schéma réduit au budget de tokens du rôle"""
+        relevant_tables, relevant_domain_descriptions = self._get_prompt_context(question)
+        fields.update(input=question, relevant_domain_descriptions=relevant_domain_descriptions)
+        try:
+            return self.prompt_builder.build(template, role, question, relevant_tables, **fields)
+        except Exception as e:
+            logger.warning(f"⚠️ Assemblage du prompt sous budget impossible, schéma non réduit: {e}")
+            table_info = self.db.get_table_info(relevant_tables) if relevant_tables else self.db.get_table_info()
+            return template.format(table_info=table_info, **fields)
+
+    def _build_admin_prompt(self, question: str) -> str:
+        return self._build_sql_prompt(ADMIN_PROMPT_TEMPLATE, "admin", question)
+
+    def _build_parent_prompt(self, question: str, user_id: int, children_ids_str: str, children_names_str: str) -> str:
+        return self._build_sql_prompt(
+            PARENT_PROMPT_TEMPLATE, "parent", question,
+            user_id=user_id,
+            children_ids=children_ids_str,
+            children_names=children_names_str
         )
 
-        llm_response = self.ask_llm(prompt)
+    def _postprocess_admin_sql(self, llm_response: str) -> str:
+        """Nettoyage et validation de la réponse LLM (admin)"""
         sql_query = self._clean_sql(llm_response)
         sql_query = self._auto_fix_quotes_in_sql(sql_query)
         
@@ -989,31 +1099,8 @@ class SQLAssistant:
             logger.error(f"Erreur validation SQL: {e}")
             raise ValueError(f"Requête SQL invalide: {str(e)}")
 
-    def generate_sql_parent(self, question: str, user_id: int, children_ids_str: str, children_names_str: str) -> str:
-        """Génère une requête SQL avec restrictions parent"""
-        relevant_domains = self.get_relevant_domains(question, self.domain_descriptions)
-        
-        if relevant_domains:
-            relevant_tables = self.get_tables_from_domains(relevant_domains, self.domain_to_tables_mapping)
-            table_info = self.db.get_table_info(relevant_tables)
-            relevant_domain_descriptions = "\n".join(
-                f"{dom}: {self.domain_descriptions[dom]}" for dom in relevant_domains if dom in self.domain_descriptions
-            )
-        else:
-            table_info = self.db.get_table_info()
-            relevant_domain_descriptions = "\n".join(self.domain_descriptions.values())
-
-        prompt = PARENT_PROMPT_TEMPLATE.format(
-            input=question,
-            table_info=table_info,
-            relevant_domain_descriptions=relevant_domain_descriptions,
-            #relations=self.relations_description,
-            user_id=user_id,
-            children_ids=children_ids_str,
-            children_names=children_names_str
-        )
-        
-        llm_response = self.ask_llm(prompt)
+    def _postprocess_parent_sql(self, llm_response: str) -> str:
+        """Nettoyage et validation de la réponse LLM (parent)"""
         sql_query = self._clean_sql(llm_response)
         
         # Validation
@@ -1085,20 +1172,48 @@ class SQLAssistant:
     # EXÉCUTION SQL
     # ================================
 
-    def execute_sql_query(self, sql_query: str) -> dict:
-        """Exécute une requête SQL et retourne les résultats"""
+    def execute_sql_query(self, sql_query: str, params: Optional[tuple] = None, connection=None) -> dict:
+        """
+        Exécute une requête SQL et retourne les résultats.
+        Avec params, sql_query est au format MySQLdb (%s) et les valeurs sont liées par le curseur
+        (ou par une requête préparée réutilisée si SQL_PREPARED_STATEMENTS=1).
+        Une connexion fournie par l'appelant (lot de questions) est utilisée sans être rendue au pool.
+        Les lectures sont servies par le cache des résultats (agent/result_cache.py) tant que
+        leur TTL n'est pas écoulé ; une écriture invalide les résultats des tables modifiées.
+        """
+        owns_connection = connection is None
+        cursor = None
+        result_cache = get_result_cache()
         try:
             if not sql_query:
                 return {"success": False, "error": "Requête SQL vide", "data": []}
             
-            connection = get_db()
+            if result_cache:
+                cached_rows = result_cache.get(sql_query, params)
+                if cached_rows is not None:
+                    logger.info(f"⚡ Résultat SQL servi depuis le cache ({len(cached_rows)} ligne(s))")
+                    return {"success": True, "data": cached_rows}
+            
+            if owns_connection:
+                connection = get_db()
+            if connection is None:
+                return {"success": False, "error": "Connexion à la base de données indisponible", "data": []}
             cursor = connection.cursor()
             
            
-            logger.info(f"📜 SQL exécutée:\n{sql_query}")
+            if params:
+                logger.info(f"📜 SQL exécutée:\n{sql_query}\n📎 Paramètres: {params}")
+                execute_bound(connection, cursor, BoundQuery(sql_query, tuple(params)))
+            else:
+                logger.info(f"📜 SQL exécutée:\n{sql_query}")
+                cursor.execute(sql_query)
             
-            cursor.execute(sql_query)
             
+            if cursor.description is None:
+                # Écriture : les résultats en cache des tables modifiées ne sont plus valides
+                if result_cache:
+                    result_cache.invalidate_for(sql_query)
+                return {"success": True, "data": []}
             
             columns = [desc[0] for desc in cursor.description]
             results = cursor.fetchall()
@@ -1109,16 +1224,21 @@ class SQLAssistant:
                 for row in results
             ]
             
-            cursor.close()
-            if hasattr(connection, '_direct_connection'):
-                connection.close()
-            
-            return {"success": True, "data": self._serialize_data(data)}
+            data = self._serialize_data(data)
+            if result_cache:
+                result_cache.set(sql_query, params, data)
+            return {"success": True, "data": data}
             
         except Exception as e:
             logger.error(f"❌ Erreur exécution SQL: {e}")
             logger.error(f"❌ SQL qui a échoué: {sql_query}")
             return {"success": False, "error": str(e), "data": []}
+        
+        finally:
+            if cursor:
+                cursor.close()
+            if owns_connection and connection and hasattr(connection, '_direct_connection'):
+                connection.close()
 
     def _serialize_data(self, data):
         """Sérialise les données pour éviter les problèmes de types"""
@@ -1141,6 +1261,52 @@ class SQLAssistant:
         
         logger.debug(f"🔍 Formatage - Données reçues: {data}")
         
+        direct_answer = self._format_without_ai(data, question)
+        if direct_answer is not None:
+            return direct_answer
+        
+        # Pour les listes multiples
+        try:
+            # Formatage normal avec IA
+            response = chat_completion(
+                self._build_format_messages(data, question),
+                model=self.model,
+                temperature=0.2,
+                max_tokens=400,
+                cache_site="format"
+            )
+            
+            return response.strip()
+            
+        except Exception as e:
+            logger.error(f"Erreur formatage: {e}")
+            return self._format_simple_response(data, question)
+
+    def format_response_stream(self, data: List[Dict], question: str, sql_query: str) -> Iterator[str]:
+        """Même formatage que format_response_with_ai, produit au fil des tokens"""
+        direct_answer = self._format_without_ai(data, question)
+        if direct_answer is not None:
+            yield direct_answer
+            return
+        
+        emitted = False
+        try:
+            for token in chat_completion_stream(
+                self._build_format_messages(data, question),
+                model=self.model,
+                temperature=0.2,
+                max_tokens=400,
+                cache_site="format"
+            ):
+                emitted = True
+                yield token
+        except Exception as e:
+            logger.error(f"Erreur formatage (stream): {e}")
+            if not emitted:
+                yield self._format_simple_response(data, question)
+
+    def _format_without_ai(self, data: List[Dict], question: str) -> Optional[str]:
+        """Réponse directe (sans LLM) pour les résultats vides ou à valeur unique, sinon None"""
         if not data:
             return "✅ Requête exécutée mais aucun résultat trouvé."
         
@@ -1167,35 +1333,21 @@ class SQLAssistant:
             else:
                 return f"Résultat : {value}"
         
-        # Pour les listes multiples
-        try:
-            df = pd.DataFrame(data)
-            
-            # Formatage normal avec IA
-            messages = [
-                {
-                    "role": "system",
-                    "content": """Analysez les données SQL et donnez une réponse claire en français. 
+        return None
+
+    def _build_format_messages(self, data: List[Dict], question: str) -> List[Dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": """Analysez les données SQL et donnez une réponse claire en français. 
                     Présentez les résultats de manière structurée et utile."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Question: {question}\n\nDonnées: {json.dumps(data[:100], ensure_ascii=False)}"
-                }
-            ]
-            
-            response = openai.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.2,
-                max_tokens=400
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            logger.error(f"Erreur formatage: {e}")
-            return self._format_simple_response(data, question)
+            },
+            {
+                "role": "user",
+                "content": f"Question: {question}\n\nDonnées: {json.dumps(data[:100], ensure_ascii=False)}"
+            }
+        ]
+
     def _format_simple_response(self, data: List[Dict], question: str) -> str:
         """Formatage simple sans IA en cas d'erreur"""
         if not data:
@@ -1251,6 +1403,21 @@ class SQLAssistant:
     # GÉNÉRATION DE GRAPHIQUES
     # ================================
 
+    def _finalize_answer(self, data: List[Dict], question: str, sql_query: str,
+                         runner: Optional[StageRunner] = None) -> Tuple[str, Optional[str]]:
+        """
+        Formatage de la réponse (appel LLM) et génération du graphique (matplotlib) en parallèle.
+        En cas de délai dépassé : réponse simple sans IA, et pas de graphique.
+        """
+        results = (runner or self.stage_runner).run_parallel({
+            "format": (
+                self.format_response_with_ai, (data, question, sql_query),
+                lambda: self._format_simple_response(data, question)
+            ),
+            "graph": (self.generate_graph_if_relevant, (data, question), None),
+        })
+        return results["format"], results["graph"]
+
     def generate_graph_if_relevant(self, data: List[Dict], question: str) -> Optional[str]:
         """Génère un graphique si pertinent pour les données"""
         if not data or len(data) < 2:
@@ -1309,6 +1476,11 @@ class SQLAssistant:
         
         return None
     def generate_auto_graph(self, df: pd.DataFrame, graph_type: str = None) -> Optional[str]:
+        """Génère automatiquement un graphique (rendus sérialisés, pyplot n'étant pas thread-safe)"""
+        with _GRAPH_LOCK:
+            return self._render_auto_graph(df, graph_type)
+
+    def _render_auto_graph(self, df: pd.DataFrame, graph_type: str = None) -> Optional[str]:
         """Génère automatiquement un graphique - VERSION AMÉLIORÉE"""
         if df.empty or len(df) < 2:
             logger.debug("❌ DataFrame vide ou insuffisant")
@@ -1481,48 +1653,52 @@ class SQLAssistant:
     def _auto_correct_sql(self, bad_sql: str, error_msg: str) -> Optional[str]:
         """Tente de corriger automatiquement une requête SQL défaillante"""
         try:
-            correction_prompt = f"""
-            Vous êtes un expert SQL. Corrigez cette requête MySQL en vous basant sur l'erreur.
-            
-            Erreur: {error_msg}
-            
-            Requête incorrecte:
-            ```sql
-            {bad_sql}
-            ```
-            
-            Schéma disponible:
-            ```json
-            {json.dumps(self.schema[:10], indent=2)}
-            ```
-            
-            Règles:
-            - Générez UNIQUEMENT du SQL valide
-            - Pas d'explications, juste la requête corrigée
-            - Utilisez SELECT uniquement
-            
-            Requête corrigée:
-            ```sql
-            """
-            
-            response = openai.chat.completions.create(
+            response = chat_completion(
+                [{"role": "user", "content": self._build_correction_prompt(bad_sql, error_msg)}],
                 model=self.model,
-                messages=[{"role": "user", "content": correction_prompt}],
                 temperature=0,
                 max_tokens=300
             )
-            
-            corrected_sql = self._clean_sql(response.choices[0].message.content)
-            
-            if corrected_sql and self._validate_sql(corrected_sql):
-                logger.info("✅ Requête SQL corrigée avec succès")
-                return corrected_sql
+            return self._accept_corrected_sql(response)
                 
         except Exception as e:
             logger.error(f"Correction SQL échouée: {str(e)}")
             
         return None
 
+    def _build_correction_prompt(self, bad_sql: str, error_msg: str) -> str:
+        return f"""
+        Vous êtes un expert SQL. Corrigez cette requête MySQL en vous basant sur l'erreur.
+        
+        Erreur: {error_msg}
+        
+        Requête incorrecte:
+        ```sql
+        {bad_sql}
+        ```
+        
+        Schéma disponible:
+        ```json
+        {json.dumps(self.schema[:10], indent=2)}
+        ```
+        
+        Règles:
+        - Générez UNIQUEMENT du SQL valide
+        - Pas d'explications, juste la requête corrigée
+        - Utilisez SELECT uniquement
+        
+        Requête corrigée:
+        ```sql
+        """
+
+    def _accept_corrected_sql(self, response: str) -> Optional[str]:
+        corrected_sql = self._clean_sql(response)
+        
+        if corrected_sql and self._validate_sql(corrected_sql):
+            logger.info("✅ Requête SQL corrigée avec succès")
+            return corrected_sql
+        return None
+
     # ================================
     # MÉTHODES UTILITAIRES
     # ================================
@@ -1543,7 +1719,7 @@ class SQLAssistant:
         """
         
         try:
-            response = self.ask_llm(domain_prompt_content)
+            response = self.ask_llm(domain_prompt_content, cache_site="domains")
             domain_names = response.strip()
             
             if domain_names.lower() == 'none' or not domain_names:
@@ -1554,35 +1730,17 @@ class SQLAssistant:
             logger.error(f"❌ Erreur lors de l'identification des domaines: {e}")
             return []
     def get_relevant_domains_improved(self, query: str) -> List[str]:
-        """Version améliorée de la détection des domaines"""
-        
-        # Mappings directs question → domaine
-        direct_mappings = {
-            'section': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'civilité': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'nationalité': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'niveau': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'élève': ['ELEVES_INSCRIPTIONS'],
-            'inscription': ['ELEVES_INSCRIPTIONS'],
-            'classe': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'localité': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'gouvernorat': ['GENERAL_ADMINISTRATION_CONFIG'],
-            'établissement': ['GENERAL_ADMINISTRATION_CONFIG']
-        }
-        
-        query_lower = query.lower()
-        relevant_domains = set()
-        
-        # Recherche directe
-        for keyword, domains in direct_mappings.items():
-            if keyword in query_lower:
-                relevant_domains.update(domains)
-        
-        # Si aucun domaine trouvé, utiliser l'IA
-        if not relevant_domains:
+        """Détection locale des domaines (TF-IDF + mots-clés), LLM seulement si confiance faible"""
+        if not self.domain_router:
             return self.get_relevant_domains(query, self.domain_descriptions)
-    
-        return list(relevant_domains)
+
+        try:
+            domains, _score, _source = self.domain_router.route(query)
+            return domains
+        except Exception as e:
+            logger.error(f"❌ Erreur routeur de domaines: {e}")
+            return self.get_relevant_domains(query, self.domain_descriptions)
+
     def get_tables_from_domains(self, domains: List[str], domain_to_tables_map: Dict[str, List[str]]) -> List[str]:
         """Récupère toutes les tables associées aux domaines donnés"""
         tables = []
@@ -1592,11 +1750,13 @@ class SQLAssistant:
 
     def find_matching_template(self, question: str) -> Optional[Dict[str, Any]]:
         """Trouve un template correspondant à la question"""
-        exact_match = self._find_exact_template_match(question)
+        # Un seul snapshot pour les deux recherches, même si un rechargement survient entre-temps
+        snapshot = self.template_store.snapshot
+        exact_match = snapshot.exact_matcher.match(question)
         if exact_match:
             return exact_match
         
-        semantic_match, score = self.template_matcher.find_similar_template(question)
+        semantic_match, score = snapshot.semantic_matcher.find_similar_template(question)
         if semantic_match:
             logger.info(f"🔍 Template sémantiquement similaire trouvé (score: {score:.2f})")
             return self._extract_variables(question, semantic_match)
@@ -1604,19 +1764,8 @@ class SQLAssistant:
         return None
 
     def _find_exact_template_match(self, question: str) -> Optional[Dict[str, Any]]:
-        """Trouve un template exact"""
-        cleaned_question = question.rstrip(' ?')
-        for template in self.templates_questions:
-            pattern = template["template_question"]
-            regex_pattern = re.sub(r'\{(.+?)\}', r'(?P<\1>.+?)', pattern)
-            match = re.fullmatch(regex_pattern, cleaned_question, re.IGNORECASE)
-            if match:
-                variables = {k: v.strip() for k, v in match.groupdict().items()}
-                return {
-                    "template": template,
-                    "variables": variables if variables else {}
-                }
-        return None
+        """Trouve un template exact (tous les templates testés en un seul passage)"""
+        return self.exact_template_matcher.match(question)
 
     def _extract_variables(self, question: str, template: Dict) -> Dict[str, Any]:
         """Extrait les variables d'un template sémantique"""
@@ -1626,75 +1775,26 @@ class SQLAssistant:
             "variables": {}
         }
 
+    def bind_query_from_template(self, template: Dict, variables: Dict) -> BoundQuery:
+        """Requête paramétrée (%s) d'un template, les variables étant des valeurs liées"""
+        return bind_template(template["requete_template"], variables)
+
     def generate_query_from_template(self, template: Dict, variables: Dict) -> str:
-        """Génère une requête à partir d'un template et de variables"""
-        sql_template = template["requete_template"]
-        
-        # Remplace les variables dans le template
-        for var_name, var_value in variables.items():
-            placeholder = f"{{{var_name}}}"
-            sql_template = sql_template.replace(placeholder, str(var_value))
-        
-        return sql_template
+        """Génère une requête à partir d'un template et de variables (valeurs échappées)"""
+        return render_sql(self.bind_query_from_template(template, variables))
 
     # ================================
     # MÉTHODES SPÉCIFIQUES AUX PARENTS
     # ================================
 
     def get_user_children_data(self, user_id: int) -> Tuple[List[int], List[str]]:
-        """Récupère les données des enfants pour un parent"""
-        connection = None
-        cursor = None
-        children_ids = []
-        children_prenoms = []
-
-        try:
-            query = """
-            SELECT DISTINCT pe.id AS id_enfant, pe.PrenomFr AS prenom
-            FROM personne p
-            JOIN parent pa ON p.id = pa.Personne
-            JOIN parenteleve pev ON pa.id = pev.Parent
-            JOIN eleve e ON pev.Eleve = e.id
-            JOIN personne pe ON e.IdPersonne = pe.id
-            WHERE p.id = %s
-            """
-            
-            connection = get_db()
-            cursor = connection.cursor()
-            
-            cursor.execute(query, (user_id,))
-            children = cursor.fetchall()
-            
-            if children:
-                children_ids = [child['id_enfant'] for child in children]
-                children_prenoms = [child['prenom'] for child in children]
-                logger.info(f"✅ Found {len(children_ids)} children for parent {user_id}")
-            
-            return (children_ids, children_prenoms)
-            
-        except Exception as e:
-            logger.error(f"❌ Error getting children data for parent {user_id}: {str(e)}")
-            return ([], [])
-            
-        finally:
-            try:
-                if cursor:
-                    cursor.close()
-                    
-                if connection and hasattr(connection, '_direct_connection'):
-                    connection.close()
-                    logger.debug("🔌 Closed direct MySQL connection")
-            except Exception as close_error:
-                logger.warning(f"⚠️ Error during cleanup: {str(close_error)}")
+        """Récupère les IDs et prénoms des enfants pour un parent (dérivés de l'annuaire)"""
+        return self.children_directory.get_children_ids_and_names(user_id)
 
-    def detect_names_in_question(self, question: str, authorized_names: List[str]) -> Dict[str, List[str]]:
+    def detect_names_in_question(self, question: str, authorized_names: List[str],
+                                 parsed: Optional[ParsedQuestion] = None) -> Dict[str, List[str]]:
         """Détecte les noms dans une question et vérifie les autorisations"""
-        import unicodedata
-        
-        def normalize_name(name):
-            name = unicodedata.normalize('NFD', name.lower())
-            return ''.join(char for char in name if unicodedata.category(char) != 'Mn')
-        
+        normalize_name = strip_accents
         normalized_authorized = [normalize_name(name) for name in authorized_names]
         
         # Mots à exclure
@@ -1707,8 +1807,8 @@ class SQLAssistant:
             'emploi', 'temps', 'horaire', 'professeur', 'enseignant', 'directeur', 'principal'
         }
         
-        # Extraire les noms potentiels (commence par majuscule)
-        potential_names = re.findall(r'\b[A-ZÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÐÑÒÓÔÕÖØÙÚÛÜÝÞŸ][a-zàáâãäåæçèéêëìíîïðñòóôõöøùúûüýþÿ]+', question)
+        # Noms potentiels (commencent par une majuscule), extraits lors de l'analyse de la question
+        potential_names = parsed.names if parsed else NAME_PATTERN.findall(question)
         
         # Filtrer les mots exclus
         potential_names = [name for name in potential_names if normalize_name(name) not in excluded_words]
@@ -1812,9 +1912,10 @@ class SQLAssistant:
         logger.debug("✅ Validation parent réussie")
         return True
 
-    def _is_public_info_query(self, question: str, sql_query: str) -> bool:
+    def _is_public_info_query(self, question: str, sql_query: str,
+                              parsed: Optional[ParsedQuestion] = None) -> bool:
         """Vérifie si la question concerne des informations publiques"""
-        question_lower = question.lower()
+        question_lower = parsed.lower if parsed else question.lower()
         sql_lower = sql_query.lower()
         
         # Mots-clés pour informations publiques
@@ -1874,7 +1975,7 @@ class SQLAssistant:
             LIMIT 5
             """
 
-            current_year = "2024/2025"  
+            current_year = SCHOOL_YEAR
             
             # Préparer les paramètres de recherche
             like_pattern = f"%{search_name}%"
@@ -2007,6 +2108,21 @@ class SQLAssistant:
             logger.error(f"Erreur récupération messages: {e}")
             return []
 
+    def is_conversation_owner(self, conversation_id: int, user_id: int) -> bool:
+        """Vérifie que la conversation (identifiant fourni par le client) appartient à l'utilisateur"""
+        try:
+            return bool(self.conversation_manager.is_owner(conversation_id, user_id))
+        except Exception as e:
+            logger.error(f"Erreur vérification propriété conversation: {e}")
+            return False
+
+    def _owned_conversation_id(self, conversation_id: Optional[int], user_id: int) -> Optional[int]:
+        """conversation_id conservé s'il appartient à l'utilisateur, sinon None (nouvelle conversation)"""
+        if conversation_id is None or self.is_conversation_owner(conversation_id, user_id):
+            return conversation_id
+        logger.warning(f"⚠️ Conversation {conversation_id} refusée pour l'utilisateur {user_id}, nouvelle conversation")
+        return None
+
     def search_conversations(self, user_id: int, query: str, limit: int = 20) -> List[Dict]:
         """Recherche dans les conversations"""
         try:
@@ -2080,6 +2196,221 @@ class SQLAssistant:
         )
         return sql_query, formatted_response, graph_data
 
+    @staticmethod
+    def _check_roles(roles: List[str]) -> Optional[str]:
+        """Retourne le message de refus si aucun rôle autorisé n'est fourni, sinon None"""
+        if not roles:
+            return "❌ Accès refusé : Aucun rôle fourni"
+        
+        valid_roles = ['ROLE_SUPER_ADMIN', 'ROLE_PARENT']
+        if not any(role in valid_roles for role in roles):
+            return f"❌ Accès refusé : Rôles fournis {roles}, requis {valid_roles}"
+        return None
+
+    def ask_question_stream(self, question: str, user_id: Optional[int] = None,
+                            roles: Optional[List[str]] = None,
+                            conversation_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Variante progressive de ask_question_with_history.
+        Produit des événements dans l'ordre : sql, rows (nombre + aperçu), token (réponse
+        formatée au fil de l'eau), graph, puis done. Un refus ou une erreur produit 'error'.
+        """
+        user_id = user_id or 0
+        roles = roles or []
+
+        role_error = self._check_roles(roles)
+        if role_error:
+            yield {"event": "error", "message": role_error}
+            return
+
+        sql_query, formatted_response, graph_data = "", "", None
+        try:
+            conversation_id = self._owned_conversation_id(conversation_id, user_id)
+            if conversation_id is None:
+                conversation_id = self.conversation_manager.create_conversation(user_id, question)
+            self.conversation_manager.add_message(conversation_id, 'user', question)
+        except Exception as e:
+            logger.error(f"Erreur gestion conversation (stream): {e}")
+            conversation_id = conversation_id or 0
+
+        try:
+            if 'ROLE_SUPER_ADMIN' in roles:
+                plan = self._resolve_super_admin_sql(question)
+            else:
+                plan = self._resolve_parent_sql(question, user_id)
+
+            if plan["message"]:
+                formatted_response = plan["message"]
+                yield {"event": "message", "text": formatted_response}
+            else:
+                yield {"event": "sql", "sql": plan["sql"]}
+
+                execution = self._execute_plan(plan, question)
+                sql_query = execution["sql"]
+                if execution["sql"] != plan["sql"]:
+                    yield {"event": "sql", "sql": sql_query, "corrected": True}
+
+                if not execution["success"]:
+                    formatted_response = f"❌ Erreur d'exécution SQL : {execution['error']}"
+                    yield {"event": "error", "message": formatted_response}
+                else:
+                    data = execution["data"]
+                    yield {
+                        "event": "rows",
+                        "count": len(data),
+                        "preview": data[:STREAM_PREVIEW_ROWS]
+                    }
+
+                    # Le graphique est rendu pendant que la réponse est produite
+                    graph_future = self.stage_runner.submit(
+                        "graph", self.generate_graph_if_relevant, data, question
+                    )
+                    parts = []
+                    for token in self.format_response_stream(data, question, sql_query):
+                        parts.append(token)
+                        yield {"event": "token", "text": token}
+                    formatted_response = "".join(parts).strip()
+
+                    graph_data = self.stage_runner.result("graph", graph_future, fallback=None)
+                    if graph_data:
+                        yield {"event": "graph", "graph": graph_data}
+
+        except Exception as e:
+            logger.error(f"Erreur dans ask_question_stream: {e}")
+            formatted_response = f"❌ Erreur : {str(e)}"
+            yield {"event": "error", "message": formatted_response}
+
+        try:
+            if conversation_id:
+                self.conversation_manager.add_message(
+                    conversation_id, 'assistant', formatted_response, sql_query, graph_data
+                )
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde conversation (stream): {e}")
+
+        yield {
+            "event": "done",
+            "conversation_id": conversation_id,
+            "sql_query": sql_query,
+            "response": formatted_response,
+            "has_graph": graph_data is not None
+        }
+
+    def ask_questions_batch(self, questions: List[str], user_id: Optional[int] = None,
+                            roles: Optional[List[str]] = None,
+                            conversation_id: Optional[int] = None,
+                            max_concurrency: int = ASK_BATCH_CONCURRENCY) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Traite plusieurs questions en un seul appel ; retourne (résultats dans l'ordre des questions, conversation_id).
+        - questions identiques traitées une seule fois
+        - résolution SQL (cache, templates, LLM) en parallèle, au plus max_concurrency à la fois,
+          avec le même snapshot de templates, catalogue de schéma et routeur de domaines
+        - chaque SQL distinct exécuté une seule fois, les requêtes s'enchaînant sur une même connexion
+        - formatage et graphiques en parallèle (même plafond), puis une seule conversation pour tout le lot
+        Les étapes du lot (enfants, formatage, graphique) tournent sur un pool propre au lot,
+        dimensionné sur max_concurrency : un lot ne prend pas les workers partagés des autres /ask.
+        """
+        user_id = user_id or 0
+        roles = roles or []
+        if not questions:
+            return [], conversation_id or 0
+
+        role_error = self._check_roles(roles)
+        if role_error:
+            return [self._batch_result(question, "", role_error, None) for question in questions], 0
+
+        keys = [" ".join(question.split()) for question in questions]
+        unique = list(dict.fromkeys(keys))
+        is_admin = 'ROLE_SUPER_ADMIN' in roles
+
+        def resolve(question: str) -> Dict[str, Any]:
+            try:
+                if is_admin:
+                    return self._resolve_super_admin_sql(question)
+                return self._resolve_parent_sql(question, user_id, runner=runner)
+            except Exception as e:
+                logger.error(f"Erreur résolution (lot): {e}")
+                return {"role": "admin" if is_admin else "parent", "sql": "", "source": None,
+                        "message": f"❌ Erreur : {str(e)}"}
+
+        workers = max(1, min(max_concurrency, len(unique)))
+        # Formatage et graphique de chaque question en parallèle : deux étapes par worker du lot
+        with StageRunner(max_workers=2 * workers) as runner, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ask-batch") as executor:
+            plans = dict(zip(unique, executor.map(resolve, unique)))
+
+            # Exécution séquentielle sur une connexion empruntée une seule fois ; plan["sql"] contient
+            # les valeurs liées, deux plans de même texte donnent donc le même résultat
+            executions: Dict[str, Dict[str, Any]] = {}
+            by_sql: Dict[str, Dict[str, Any]] = {}
+            connection = get_db()
+            try:
+                for question, plan in plans.items():
+                    if plan["message"]:
+                        continue
+                    if plan["sql"] not in by_sql:
+                        by_sql[plan["sql"]] = self._execute_plan(plan, question, connection=connection)
+                    executions[question] = by_sql[plan["sql"]]
+            finally:
+                if connection is not None and hasattr(connection, '_direct_connection'):
+                    connection.close()
+            logger.info(f"📦 Lot de {len(questions)} questions: {len(unique)} distinctes, {len(by_sql)} requête(s) SQL")
+
+            def finalize(question: str) -> Tuple[str, str, Optional[str]]:
+                plan = plans[question]
+                if plan["message"]:
+                    return plan["sql"], plan["message"], None
+                execution = executions[question]
+                if not execution["success"]:
+                    return execution["sql"], f"❌ Erreur d'exécution SQL : {execution['error']}", None
+                try:
+                    formatted_result, graph_data = self._finalize_answer(
+                        execution["data"], question, execution["sql"], runner=runner
+                    )
+                except Exception as e:
+                    logger.error(f"Erreur formatage (lot): {e}")
+                    formatted_result, graph_data = self._format_simple_response(execution["data"], question), None
+                return execution["sql"], formatted_result, graph_data
+
+            answers = dict(zip(unique, executor.map(finalize, unique)))
+
+        try:
+            conversation_id = self._owned_conversation_id(conversation_id, user_id)
+            if conversation_id is None:
+                conversation_id = self.conversation_manager.create_conversation(user_id, questions[0])
+            for question, key in zip(questions, keys):
+                sql_query, formatted_response, graph_data = answers[key]
+                self.conversation_manager.add_message(conversation_id, 'user', question)
+                self.conversation_manager.add_message(
+                    conversation_id, 'assistant', formatted_response, sql_query, graph_data
+                )
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde conversation (lot): {e}")
+            conversation_id = conversation_id or 0
+
+        results = [self._batch_result(question, *answers[key]) for question, key in zip(questions, keys)]
+        return results, conversation_id
+
+    @staticmethod
+    def _batch_result(question: str, sql_query: str, response: str, graph_data: Optional[str]) -> Dict[str, Any]:
+        """Résultat d'une question du lot : success, clarification_needed, message (attestation...) ou error"""
+        if (response or "").startswith("❌"):
+            status = "error"
+        elif not sql_query and response and "plusieurs enfants" in response:
+            status = "clarification_needed"
+        elif not sql_query:
+            status = "message"
+        else:
+            status = "success"
+        return {
+            "question": question,
+            "sql_query": sql_query,
+            "response": response,
+            "status": status,
+            "graph": graph_data,
+            "has_graph": graph_data is not None
+        }
+
     # 🆕 NETTOYAGE PÉRIODIQUE DE L'HISTORIQUE
     def cleanup_user_history(self, user_id: int, keep_recent_days: int = 30) -> int:
         """Nettoie l'historique ancien d'un utilisateur en gardant les conversations récentes"""
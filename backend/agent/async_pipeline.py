@@ -0,0 +1,225 @@
+import os
+import asyncio
+import logging
+import functools
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+import pandas as pd
+
+from agent.llm_utils import aask_llm, achat_completion
+from agent.stage_runner import STAGE_TIMEOUTS, DEFAULT_STAGE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Nombre de questions traitées simultanément et de threads réservés aux accès MySQL/SQLite
+ASGI_MAX_CONCURRENT_ASKS = int(os.getenv("ASGI_MAX_CONCURRENT_ASKS", "200"))
+ASGI_DB_THREADS = int(os.getenv("ASGI_DB_THREADS", "20"))
+
+
+_thread_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def get_thread_limiter() -> anyio.CapacityLimiter:
+    """Limiteur partagé des threads de travail (créé dans la boucle d'événements)"""
+    global _thread_limiter
+    if _thread_limiter is None:
+        _thread_limiter = anyio.CapacityLimiter(ASGI_DB_THREADS)
+    return _thread_limiter
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Exécute une fonction bloquante (MySQL, SQLite, matplotlib) sur le pool de threads borné"""
+    return await anyio.to_thread.run_sync(
+        functools.partial(fn, *args, **kwargs), limiter=get_thread_limiter()
+    )
+
+
+class AsyncAssistantPipeline:
+    """
+    Pipeline asynchrone au-dessus de SQLAssistant (mode ASGI).
+    Les appels LLM sont attendus nativement ; les accès base de données, le
+    matching de templates et matplotlib sont déportés sur un pool de threads borné.
+    """
+
+    def __init__(self, assistant, max_concurrent: int = ASGI_MAX_CONCURRENT_ASKS):
+        self.assistant = assistant
+        self.max_concurrent = max_concurrent
+        # Créé à la première utilisation, dans la boucle d'événements
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    async def run_sync(self, fn: Callable, *args, **kwargs) -> Any:
+        return await run_blocking(fn, *args, **kwargs)
+
+    # ================================
+    # QUESTIONS
+    # ================================
+
+    async def ask(self, question: str, user_id: Optional[int] = None,
+                  roles: Optional[List[str]] = None,
+                  conversation_id: Optional[int] = None) -> Tuple[str, str, Optional[str], int]:
+        """Équivalent asynchrone de ask_question_with_history"""
+        user_id = user_id or 0
+        roles = roles or []
+
+        role_error = self.assistant._check_roles(roles)
+        if role_error:
+            return "", role_error, None, 0
+
+        async with self.semaphore:
+            history = self.assistant.conversation_manager
+            try:
+                conversation_id = await self.run_sync(
+                    self.assistant._owned_conversation_id, conversation_id, user_id
+                )
+                if conversation_id is None:
+                    conversation_id = await self.run_sync(history.create_conversation, user_id, question)
+                await self.run_sync(history.add_message, conversation_id, 'user', question)
+            except Exception as e:
+                logger.error(f"Erreur gestion conversation (async): {e}")
+                conversation_id = conversation_id or 0
+
+            try:
+                plan = await self.resolve(question, user_id, roles)
+                sql_query, formatted_response, graph_data = await self.answer_from_plan(plan, question)
+            except Exception as e:
+                logger.error(f"Erreur dans ask (async): {e}")
+                sql_query, formatted_response, graph_data = "", f"❌ Erreur : {str(e)}", None
+
+            if conversation_id:
+                try:
+                    await self.run_sync(
+                        history.add_message, conversation_id, 'assistant',
+                        formatted_response, sql_query, graph_data
+                    )
+                except Exception as e:
+                    logger.error(f"Erreur sauvegarde conversation (async): {e}")
+
+            return sql_query, formatted_response, graph_data, conversation_id
+
+    async def resolve(self, question: str, user_id: int, roles: List[str]) -> Dict[str, Any]:
+        """Étape 1 : cache et templates en thread, génération SQL par LLM en asynchrone"""
+        assistant = self.assistant
+        if 'ROLE_SUPER_ADMIN' in roles:
+            plan = await self.run_sync(assistant._resolve_super_admin_sql, question, use_ai=False)
+            if plan["source"] != "ai_pending":
+                return plan
+            try:
+                prompt = await self.run_sync(assistant._build_admin_prompt, question)
+                sql_query = assistant._postprocess_admin_sql(await aask_llm(prompt))
+                if not sql_query:
+                    plan["message"] = "❌ La requête générée est vide."
+                    return plan
+                plan.update(sql=sql_query, source="ai")
+            except Exception as e:
+                logger.error(f"Erreur génération SQL admin (async): {e}")
+                plan["message"] = f"❌ Erreur de traitement : {str(e)}"
+            return plan
+
+        plan = await self.run_sync(assistant._resolve_parent_sql, question, user_id, use_ai=False)
+        if plan["source"] != "ai_pending":
+            return plan
+        try:
+            context = plan["context"]
+            prompt = await self.run_sync(
+                assistant._build_parent_prompt, question, user_id,
+                context["children_ids_str"], context["children_names_str"]
+            )
+            sql_query = assistant._postprocess_parent_sql(await aask_llm(prompt))
+            return assistant._accept_parent_sql(plan, question, sql_query)
+        except Exception as e:
+            logger.error(f"Erreur génération SQL parent (async): {e}")
+            plan["message"] = f"❌ Erreur de traitement : {str(e)}"
+            return plan
+
+    async def execute(self, plan: Dict[str, Any], question: str) -> Dict[str, Any]:
+        """Étape 2 : exécution en thread, correction automatique par LLM en asynchrone"""
+        assistant = self.assistant
+        execution = await self.run_sync(assistant._execute_plan, plan, question, auto_correct=False)
+        if execution["success"] or not (plan["source"] == "ai" and plan["role"] == "admin"):
+            return execution
+
+        try:
+            response = await achat_completion(
+                [{"role": "user", "content": assistant._build_correction_prompt(plan["sql"], execution["error"])}],
+                model=assistant.model,
+                temperature=0,
+                max_tokens=300
+            )
+            corrected_sql = assistant._accept_corrected_sql(response)
+        except Exception as e:
+            logger.error(f"Correction SQL échouée (async): {str(e)}")
+            corrected_sql = None
+
+        if corrected_sql:
+            retry = await self.run_sync(assistant._execute_plan, dict(plan, sql=corrected_sql), question,
+                                        auto_correct=False)
+            if retry["success"]:
+                return retry
+        return execution
+
+    async def answer_from_plan(self, plan: Dict[str, Any], question: str) -> Tuple[str, str, Optional[str]]:
+        if plan["message"]:
+            return plan["sql"], plan["message"], None
+
+        execution = await self.execute(plan, question)
+        if not execution["success"]:
+            return execution["sql"], f"❌ Erreur d'exécution SQL : {execution['error']}", None
+
+        formatted_result, graph_data = await self.finalize_answer(execution["data"], question, execution["sql"])
+        return execution["sql"], formatted_result, graph_data
+
+    # ================================
+    # FORMATAGE ET GRAPHIQUES
+    # ================================
+
+    async def finalize_answer(self, data: List[Dict], question: str, sql_query: str) -> Tuple[str, Optional[str]]:
+        """Formatage LLM et rendu du graphique en parallèle, avec les délais de stage_runner"""
+        formatted, graph = await asyncio.gather(
+            self._with_timeout("format", self.format_response(data, question, sql_query),
+                               lambda: self.assistant._format_simple_response(data, question)),
+            self._with_timeout("graph", self.run_sync(self.assistant.generate_graph_if_relevant, data, question),
+                               lambda: None)
+        )
+        return formatted, graph
+
+    async def format_response(self, data: List[Dict], question: str, sql_query: str) -> str:
+        """Équivalent asynchrone de format_response_with_ai"""
+        assistant = self.assistant
+        direct_answer = assistant._format_without_ai(data, question)
+        if direct_answer is not None:
+            return direct_answer
+
+        try:
+            response = await achat_completion(
+                assistant._build_format_messages(data, question),
+                model=assistant.model,
+                temperature=0.2,
+                max_tokens=400,
+                cache_site="format"
+            )
+            return response.strip()
+        except Exception as e:
+            logger.error(f"Erreur formatage (async): {e}")
+            return assistant._format_simple_response(data, question)
+
+    async def generate_graph(self, data: List[Dict], graph_type: Optional[str] = None) -> Optional[str]:
+        """Rendu d'un graphique à partir de données brutes (endpoint /graph)"""
+        df = pd.DataFrame(data)
+        return await self.run_sync(self.assistant.generate_auto_graph, df, graph_type)
+
+    @staticmethod
+    async def _with_timeout(stage: str, awaitable, fallback: Callable[[], Any]) -> Any:
+        try:
+            return await asyncio.wait_for(awaitable, STAGE_TIMEOUTS.get(stage, DEFAULT_STAGE_TIMEOUT))
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Étape '{stage}' hors délai, valeur de repli utilisée")
+        except Exception as e:
+            logger.error(f"❌ Étape '{stage}' en échec: {e}")
+        return fallback()
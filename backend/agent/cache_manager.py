@@ -220,13 +220,20 @@ from typing import Dict, Any, Optional, Tuple, List
 import hashlib
 import re
 from collections import defaultdict
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import logging
+import sqlite3
+import threading
+from agent.cache_store import SQLiteCacheStore
+from agent.similarity_index import SimilarityIndex
+
+logger = logging.getLogger(__name__)
 
 class CacheManager:
     def __init__(self, cache_file: str = "sql_query_cache.json"):
         self.cache_file = Path(cache_file)
+        self.store = SQLiteCacheStore("sql_query_cache", legacy_json=cache_file)
+        self._lock = threading.Lock()
+        self.index = SimilarityIndex()
         self.cache = self._load_cache()
         
         # Patterns de base pour les valeurs structurées
@@ -251,32 +258,70 @@ class CacheManager:
         }
         self.discovered_patterns = defaultdict(list)
         
-        # Initialisation du vectorizer TF-IDF
-        self.vectorizer = TfidfVectorizer()
-        self.template_vectors = None
+        # Index de similarité (vecteurs persistés avec le cache)
         self._init_similarity_search()
 
     def _init_similarity_search(self):
-        """Initialise le système de recherche de similarité"""
-        if self.cache:
-            templates = [self._normalize_template(item['question_template']) 
-                        for item in self.cache.values()]
-            self.vectorizer.fit(templates)
-            self.template_vectors = self.vectorizer.transform(templates)
+        """Charge l'index de similarité depuis les vecteurs persistés ; seuls les manquants sont calculés"""
+        try:
+            stored = self.store.load_features()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Erreur chargement de l'index {self.store.table}: {e}")
+            stored = {}
+
+        missing = {}
+        for key, (_normalized, features) in stored.items():
+            if key not in self.cache:
+                continue
+            if features is None:
+                normalized = self._normalize_template(self.cache[key]['question_template'])
+                counts = self.index.encode(normalized)
+                missing[key] = (normalized, self.index.serialize(counts))
+            else:
+                counts = self.index.deserialize(features)
+            self.index.add(key, counts)
+
+        if missing:
+            try:
+                self.store.save_features(missing)
+                logger.info(f"✅ {len(missing)} vecteurs de similarité calculés et persistés ({self.store.table})")
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Vecteurs de similarité non persistés ({self.store.table}): {e}")
+
+    def _vectorize(self, key: str):
+        return self.index.encode(self._normalize_template(self.cache[key]['question_template']))
 
     def _load_cache(self) -> Dict[str, Any]:
-        if not self.cache_file.exists():
-            return {}
         try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            return self.store.load_all()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Erreur chargement du cache {self.store.table}: {e}")
             return {}
 
-    def _save_cache(self):
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        self._init_similarity_search()  # Recharge les vecteurs après sauvegarde
+    def _save_entry(self, key: str):
+        """Écrit une seule entrée et son vecteur (O(1)), puis l'ajoute à l'index"""
+        normalized = self._normalize_template(self.cache[key]['question_template'])
+        counts = self.index.encode(normalized)
+        self.store.upsert(key, self.cache[key], normalized, self.index.serialize(counts))
+        self.index.add(key, counts)
+
+    def _sync_from_store(self):
+        """Intègre les entrées écrites par les autres workers depuis la dernière lecture"""
+        try:
+            changes = self.store.changes_since_last_sync()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Synchronisation du cache {self.store.table} impossible: {e}")
+            return
+        for key, record in changes.items():
+            with self._lock:
+                self.cache[key] = {
+                    'question_template': record['question_template'],
+                    'sql_template': record['sql_template']
+                }
+            if record['features'] is not None:
+                self.index.add(key, self.index.deserialize(record['features']))
+            else:
+                self.index.add(key, self._vectorize(key))
 
     def _extract_parameters(self, text: str) -> Tuple[str, Dict[str, str]]:
         """Détection intelligente des paramètres"""
@@ -324,24 +369,30 @@ class CacheManager:
 
     def find_similar_template(self, question: str, threshold: float = 0.9) -> Tuple[Optional[Dict], float]:
         """Trouve un template similaire en utilisant TF-IDF et cosine similarity"""
+        candidates = self.find_similar_templates(question, k=1, threshold=threshold)
+        if candidates:
+            _key, template, score = candidates[0]
+            return template, score
+        return None, 0.0
+
+    def find_similar_templates(self, question: str, k: int = 5,
+                               threshold: float = 0.0) -> List[Tuple[str, Dict, float]]:
+        """Les k templates les plus proches : [(clé, template, score)] par score décroissant"""
         if not self.cache:
-            return None, 0.0
+            return []
             
         norm_question = self._normalize_template(question)
         
         try:
-            question_vec = self.vectorizer.transform([norm_question])
-            similarities = cosine_similarity(question_vec, self.template_vectors)[0]
-            best_idx = np.argmax(similarities)
-            best_score = similarities[best_idx]
-            
-            if best_score >= threshold:
-                cache_key = list(self.cache.keys())[best_idx]
-                return self.cache[cache_key], best_score
+            return [
+                (cache_key, self.cache[cache_key], score)
+                for cache_key, score in self.index.search(norm_question, k=k, threshold=threshold)
+                if cache_key in self.cache
+            ]
         except Exception as e:
             print(f"⚠️ Erreur lors de la recherche de template similaire: {str(e)}")
         
-        return None, 0.0
+        return []
 
     def _generate_cache_key(self, question: str) -> str:
         """Génère une clé basée sur la question normalisée"""
@@ -448,6 +499,7 @@ class CacheManager:
 
     def get_cached_query(self, question: str) -> Optional[Tuple[str, Dict[str, str]]]:
         """Version compatible avec la détection automatique"""
+        self._sync_from_store()
         # D'abord essayer la correspondance exacte
         normalized_question, variables = self._extract_parameters(question)
         key = self._generate_cache_key(normalized_question)
@@ -486,8 +538,9 @@ class CacheManager:
         norm_sql = self._normalize_sql(sql_query, vars_question)
         
         key = hashlib.md5(norm_question.encode()).hexdigest()
-        self.cache[key] = {
-            'question_template': norm_question,
-            'sql_template': norm_sql
-        }
-        self._save_cache()
\ No newline at end of file
+        with self._lock:
+            self.cache[key] = {
+                'question_template': norm_question,
+                'sql_template': norm_sql
+            }
+        self._save_entry(key)
\ No newline at end of file
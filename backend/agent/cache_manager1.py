@@ -4,17 +4,24 @@ from typing import Dict, Any, Optional, Tuple, List
 import hashlib
 import re
 from collections import defaultdict
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
+import sqlite3
+import threading
 from config.database import get_db
+from agent.cache_store import SQLiteCacheStore
+from agent.similarity_index import SimilarityIndex
+from agent.parameter_extractor import ParameterExtractor
+from agent.question_parser import ParsedQuestion
+from agent.children_directory import get_children_directory
 import traceback
 
 logger = logging.getLogger(__name__)
 class CacheManager1:
     def __init__(self, cache_file: str = "sql_query_cache1.json"):
         self.cache_file = Path(cache_file)
+        self.store = SQLiteCacheStore("sql_query_cache1", legacy_json=cache_file)
+        self._lock = threading.Lock()
+        self.index = SimilarityIndex()
         self.cache = self._load_cache()
         
         # Patterns de base pour les valeurs structurées
@@ -105,33 +112,79 @@ class CacheManager1:
             r'\b(jour)\b'  # Pour les questions génériques sur les jours
         ]
         self.discovered_patterns = defaultdict(list)
+
+        # Extraction des paramètres en un seul passage (motifs précompilés)
+        self.extractor = ParameterExtractor(
+            self.matiere_patterns, self.evaluation_patterns, self.trimestre_mapping,
+            self.auto_patterns, self.jour_patterns, self.jour_mapping,
+            normalize_evaluation=self._normalize_evaluation_type,
+            is_id_number=self._is_context_sensitive_number
+        )
             
-            # Initialisation du vectorizer TF-IDF
-        self.vectorizer = TfidfVectorizer()
-        self.template_vectors = None
+            # Index de similarité (vecteurs persistés avec le cache)
         self._init_similarity_search()
 
     def _init_similarity_search(self):
-        """Initialise le système de recherche de similarité"""
-        if self.cache:
-            templates = [self._normalize_template(item['question_template']) 
-                        for item in self.cache.values()]
-            self.vectorizer.fit(templates)
-            self.template_vectors = self.vectorizer.transform(templates)
+        """Charge l'index de similarité depuis les vecteurs persistés ; seuls les manquants sont calculés"""
+        try:
+            stored = self.store.load_features()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Erreur chargement de l'index {self.store.table}: {e}")
+            stored = {}
+
+        missing = {}
+        for key, (_normalized, features) in stored.items():
+            if key not in self.cache:
+                continue
+            if features is None:
+                normalized = self._normalize_template(self.cache[key]['question_template'])
+                counts = self.index.encode(normalized)
+                missing[key] = (normalized, self.index.serialize(counts))
+            else:
+                counts = self.index.deserialize(features)
+            self.index.add(key, counts)
+
+        if missing:
+            try:
+                self.store.save_features(missing)
+                logger.info(f"✅ {len(missing)} vecteurs de similarité calculés et persistés ({self.store.table})")
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Vecteurs de similarité non persistés ({self.store.table}): {e}")
+
+    def _vectorize(self, key: str):
+        return self.index.encode(self._normalize_template(self.cache[key]['question_template']))
 
     def _load_cache(self) -> Dict[str, Any]:
-        if not self.cache_file.exists():
-            return {}
         try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            return self.store.load_all()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Erreur chargement du cache {self.store.table}: {e}")
             return {}
 
-    def _save_cache(self):
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
-        self._init_similarity_search()  # Recharge les vecteurs après sauvegarde
+    def _save_entry(self, key: str):
+        """Écrit une seule entrée et son vecteur (O(1)), puis l'ajoute à l'index"""
+        normalized = self._normalize_template(self.cache[key]['question_template'])
+        counts = self.index.encode(normalized)
+        self.store.upsert(key, self.cache[key], normalized, self.index.serialize(counts))
+        self.index.add(key, counts)
+
+    def _sync_from_store(self):
+        """Intègre les entrées écrites par les autres workers depuis la dernière lecture"""
+        try:
+            changes = self.store.changes_since_last_sync()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Synchronisation du cache {self.store.table} impossible: {e}")
+            return
+        for key, record in changes.items():
+            with self._lock:
+                self.cache[key] = {
+                    'question_template': record['question_template'],
+                    'sql_template': record['sql_template']
+                }
+            if record['features'] is not None:
+                self.index.add(key, self.index.deserialize(record['features']))
+            else:
+                self.index.add(key, self._vectorize(key))
 
     def _extract_family_references(self, question: str) -> Dict[str, str]:
         """Détecte les références familiales et les normalise"""
@@ -281,7 +334,11 @@ class CacheManager1:
         return normalized_sql
     
     def _extract_parameters(self, text: str) -> Tuple[str, Dict[str, str]]:
-        """Détection intelligente des paramètres - VERSION CORRIGÉE"""
+        """Détection intelligente des paramètres (scan unique, voir ParameterExtractor)"""
+        return self.extractor.extract(text)
+
+    def _extract_parameters_legacy(self, text: str) -> Tuple[str, Dict[str, str]]:
+        """Ancienne extraction motif par motif, conservée comme référence (benchmarks/bench_parameter_extractor.py)"""
         variables = {}
         normalized = text
 
@@ -383,26 +440,36 @@ class CacheManager1:
         normalized = re.sub(r'\s+', ' ', normalized).lower().strip()
         return normalized
 
-    def find_similar_template(self, question: str, threshold: float = 0.85) -> Tuple[Optional[Dict], float]:
+    def find_similar_template(self, question: str, threshold: float = 0.85,
+                              normalized: Optional[str] = None) -> Tuple[Optional[Dict], float]:
         """Trouve un template similaire en utilisant TF-IDF et cosine similarity"""
+        candidates = self.find_similar_templates(question, k=1, threshold=threshold, normalized=normalized)
+        if candidates:
+            _key, template, score = candidates[0]
+            return template, score
+        return None, 0.0
+
+    def find_similar_templates(self, question: str, k: int = 5, threshold: float = 0.0,
+                               normalized: Optional[str] = None) -> List[Tuple[str, Dict, float]]:
+        """
+        Les k templates les plus proches : [(clé, template, score)] par score décroissant.
+        normalized : texte déjà normalisé (ParsedQuestion.similarity_text), évite une nouvelle extraction.
+        """
         if not self.cache:
-            return None, 0.0
+            return []
             
-        norm_question = self._normalize_template(question)
+        norm_question = normalized if normalized is not None else self._normalize_template(question)
         
         try:
-            question_vec = self.vectorizer.transform([norm_question])
-            similarities = cosine_similarity(question_vec, self.template_vectors)[0]
-            best_idx = np.argmax(similarities)
-            best_score = similarities[best_idx]
-            
-            if best_score >= threshold:
-                cache_key = list(self.cache.keys())[best_idx]
-                return self.cache[cache_key], best_score
+            return [
+                (cache_key, self.cache[cache_key], score)
+                for cache_key, score in self.index.search(norm_question, k=k, threshold=threshold)
+                if cache_key in self.cache
+            ]
         except Exception as e:
             print(f"⚠️ Erreur lors de la recherche de template similaire: {str(e)}")
         
-        return None, 0.0
+        return []
 
     def _generate_cache_key(self, question: str) -> str:
         """Génère une clé basée sur la question normalisée"""
@@ -571,97 +638,54 @@ class CacheManager1:
         return any(keyword in question_lower for keyword in family_keywords)
 
     def get_user_children_ids(self, user_id: int) -> List[int]:
-        """Récupère les IDs des enfants d'un parent avec gestion robuste des connexions"""
-        connection = None
-        cursor = None
-        children_ids = []
+        """Récupère les IDs des enfants d'un parent (annuaire partagé avec l'assistant)"""
+        return get_children_directory().get_children_ids(user_id)
 
-        try:
-            query = """
-            SELECT DISTINCT pe.id AS id_enfant
-            FROM personne p
-            JOIN parent pa ON p.id = pa.Personne
-            JOIN parenteleve pev ON pa.id = pev.Parent
-            JOIN eleve e ON pev.Eleve = e.id
-            JOIN personne pe ON e.IdPersonne = pe.id
-            WHERE p.id = %s
-            """
-            
-            # Get connection
-            connection = get_db()
-            cursor = connection.cursor()
-            
-            # Execute query
-            cursor.execute(query, (user_id,))
-            users = cursor.fetchall()
-            
-            # Process results
-            if users:
-                children_ids = [user['id_enfant'] for user in users]
-                logger.info(f"✅ Found {len(children_ids)} children for parent {user_id}")
-            
-            return children_ids
-        except Exception as e:
-            logger.error(f"❌ Error getting children for parent {user_id}: {str(e)}")
-            logger.error(traceback.format_exc())
-            return []
-        finally:
-            # Only close if we created a direct connection
-            try:
-                if cursor:
-                    cursor.close()
-                
-                # Check if this is a Flask-managed connection
-                from flask import current_app
-                is_flask_connection = current_app and hasattr(current_app, 'extensions') and 'mysql' in current_app.extensions and connection == current_app.extensions['mysql'].connection
-                
-                if connection and not is_flask_connection:
-                    connection.close()
-                    logger.debug("🔌 Closed direct MySQL connection")
-            except Exception as close_error:
-                logger.warning(f"⚠️ Error during cleanup: {str(close_error)}")
-
-
-    def cache_query(self, question: str, sql_query: str):
+    def cache_query(self, question: str, sql_query: str, parsed: Optional[ParsedQuestion] = None):
         """Version finale de mise en cache avec vérification des références familiales"""
         if not self._has_family_reference(question):
             print("⚠️ Question non mise en cache car elle ne contient pas de référence familiale")
             return
             
-        norm_question, vars_question = self._extract_parameters(question)
+        if parsed is not None:
+            norm_question, vars_question = parsed.template, parsed.variables
+        else:
+            norm_question, vars_question = self._extract_parameters(question)
         norm_sql = self._normalize_sql(sql_query, vars_question)
         
         key = hashlib.md5(norm_question.encode()).hexdigest()
-        self.cache[key] = {
-            'question_template': norm_question,
-            'sql_template': norm_sql
-        }
-        self._save_cache()
-
-    def get_cached_query(self, question: str, current_user_id: int) -> Optional[Tuple[str, Dict[str, str]]]:
-        """Version modifiée qui gère le remplacement direct de l'ID enfant dans le SQL"""
+        with self._lock:
+            self.cache[key] = {
+                'question_template': norm_question,
+                'sql_template': norm_sql
+            }
+        self._save_entry(key)
+
+    def get_cached_query(self, question: str, current_user_id: int,
+                         parsed: Optional[ParsedQuestion] = None) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Retourne (sql_template, variables) à lier avec sql_params.bind_template :
+        id_personne contient la liste des IDs enfants, le jour est une valeur brute.
+        parsed : analyse de la question déjà faite par l'appelant (une seule extraction par requête).
+        """
+        self._sync_from_store()
         
-        normalized_question, variables = self._extract_parameters(question)
-        key = self._generate_cache_key(normalized_question)
+        if parsed is not None:
+            normalized_question, variables = parsed.template, parsed.variables
+        else:
+            normalized_question, variables = self._extract_parameters(question)
+        # Même clé que cache_query : hash de la question normalisée une seule fois
+        key = hashlib.md5(normalized_question.encode('utf-8')).hexdigest()
         
         if key in self.cache:
             cached = self.cache[key]
             sql_template = cached['sql_template']
             
-            # Remplacer directement {id_personne} ou {{id_personne}} dans le SQL par les vrais IDs
-            if '{id_personne}' in sql_template or '{{id_personne}}' in sql_template:
+            # {id_personne} reste un paramètre : la liste des IDs enfants est liée à l'exécution
+            sql_template = sql_template.replace('{{id_personne}}', '{id_personne}')
+            children_ids = None
+            if '{id_personne}' in sql_template:
                 children_ids = self.get_user_children_ids(current_user_id)
-                if children_ids:
-                    # Construire la valeur de remplacement selon le contexte
-                    if len(children_ids) == 1:
-                        id_replacement = str(children_ids[0])
-                    else:
-                        id_replacement = ','.join(str(id) for id in children_ids)
-                    
-                    # Remplacer les deux formats possibles
-                    sql_template = sql_template.replace('{{id_personne}}', id_replacement)
-                    sql_template = sql_template.replace('{id_personne}', id_replacement)
-            # Dans get_cached_query, après avoir géré id_personne
             if '{type_evaluation_column}' in sql_template:
                 sql_template = sql_template.replace('{type_evaluation_column}', variables['type_evaluation_column'])
             # Gérer les autres variables normalement
@@ -669,36 +693,31 @@ class CacheManager1:
             for param in re.findall(r'\{(\w+)\}', sql_template):
                 if param in variables:
                     current_vars[param] = variables[param]
-            if 'jour' in current_vars:
-                if current_vars['jour'].lower() in ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']:
-                    current_vars['jour'] = f"'{current_vars['jour']}'"
+            if children_ids:
+                current_vars['id_personne'] = list(children_ids)
             return sql_template, current_vars
         
         # Si pas de correspondance exacte, chercher un template similaire
-        similar_template, score = self.find_similar_template(question)
+        similar_template, score = self.find_similar_template(
+            question, normalized=self.extractor.whitespace.sub(' ', normalized_question).lower().strip()
+        )
         if similar_template:
             print(f"🔍 Template similaire trouvé (score: {score:.2f})")
             sql_template = similar_template['sql_template']
             
-            # Remplacer directement {id_personne} ou {{id_personne}} dans le SQL par les vrais IDs
-            if '{id_personne}' in sql_template or '{{id_personne}}' in sql_template:
+            # {id_personne} reste un paramètre : la liste des IDs enfants est liée à l'exécution
+            sql_template = sql_template.replace('{{id_personne}}', '{id_personne}')
+            children_ids = None
+            if '{id_personne}' in sql_template:
                 children_ids = self.get_user_children_ids(current_user_id)
-                if children_ids:
-                    # Construire la valeur de remplacement selon le contexte
-                    if len(children_ids) == 1:
-                        id_replacement = str(children_ids[0])
-                    else:
-                        id_replacement = ','.join(str(id) for id in children_ids)
-                    
-                    # Remplacer les deux formats possibles
-                    sql_template = sql_template.replace('{{id_personne}}', id_replacement)
-                    sql_template = sql_template.replace('{id_personne}', id_replacement)
             
             if '{type_evaluation_column}' in sql_template:
                 sql_template = sql_template.replace('{type_evaluation_column}', variables['type_evaluation_column'])
             # Gérer les autres variables
             current_vars = {}
             for param in re.findall(r'\{(\w+)\}', sql_template):
+                if param == 'id_personne':
+                    continue
                 if param in variables:
                     current_vars[param] = variables[param]
                 else:
@@ -709,9 +728,8 @@ class CacheManager1:
                             value = match.group(1) if len(match.groups()) > 0 else match.group(0)
                             current_vars[param] = value
                             break
-            if 'jour' in current_vars:
-                if current_vars['jour'].lower() in ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi', 'dimanche']:
-                    current_vars['jour'] = f"'{current_vars['jour']}'"
+            if children_ids:
+                current_vars['id_personne'] = list(children_ids)
             return sql_template, current_vars
         
         return None
@@ -721,16 +739,16 @@ class CacheManager1:
         """Nettoie le cache en remplaçant {{id_personne}} par {id_personne}"""
         updated = False
         
-        for key, item in self.cache.items():
+        for key, item in list(self.cache.items()):
             sql_template = item.get("sql_template", "")
             if "{{id_personne}}" in sql_template:
                 # Remplacer les doubles accolades par des simples
                 item["sql_template"] = sql_template.replace("{{id_personne}}", "{id_personne}")
+                self._save_entry(key)
                 updated = True
                 logger.info(f"✅ Nettoyé les doubles accolades dans le template: {key}")
         
         if updated:
-            self._save_cache()
             logger.info("✅ Cache nettoyé et sauvegardé")
         else:
             logger.info("ℹ️ Aucune double accolade trouvée dans le cache")
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Base SQLite partagée par les caches de requêtes (CacheManager, CacheManager1)
+SQL_CACHE_DB_PATH = os.getenv(
+    "SQL_CACHE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'sql_query_cache.db')
+)
+
+
+class SQLiteCacheStore:
+    """
+    Stockage transactionnel d'un cache de requêtes {clé: {question_template, sql_template}}.
+    SQLite en mode WAL : insertion en O(1), accès concurrent sûr entre processus,
+    et détection des écritures des autres workers via un numéro de séquence.
+    Le fichier JSON historique est importé une seule fois.
+    """
+
+    def __init__(self, table: str, legacy_json: Optional[str] = None, db_path: str = SQL_CACHE_DB_PATH):
+        if not table.isidentifier():
+            raise ValueError(f"Nom de table invalide: {table}")
+        self.table = table
+        self.db_path = db_path
+        self.last_seq = 0
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    question_template TEXT NOT NULL,
+                    sql_template TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    normalized TEXT,
+                    features BLOB
+                )
+            ''')
+            # Bases créées avant l'index de similarité persistant
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info({self.table})')}
+            for column, column_type in (('normalized', 'TEXT'), ('features', 'BLOB')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE {self.table} ADD COLUMN {column} {column_type}')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_seq ON {self.table}(seq)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_migrations (
+                    name TEXT PRIMARY KEY,
+                    migrated_at REAL NOT NULL,
+                    entries INTEGER NOT NULL
+                )
+            ''')
+
+        if legacy_json:
+            self._migrate_json(Path(legacy_json))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Une connexion par thread (sqlite3 n'autorise pas le partage par défaut)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    # ================================
+    # MIGRATION
+    # ================================
+
+    def _migrate_json(self, json_path: Path):
+        """Import unique du fichier JSON historique (ignoré s'il a déjà été importé)"""
+        conn = self._connection()
+        migration = f"{self.table}:{json_path.name}"
+        if conn.execute('SELECT 1 FROM cache_migrations WHERE name = ?', (migration,)).fetchone():
+            return
+
+        entries = {}
+        if json_path.exists():
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.warning(f"⚠️ Cache JSON illisible, migration ignorée ({json_path}): {e}")
+                entries = {}
+
+        now = time.time()
+        # BEGIN IMMEDIATE : un seul worker importe, les autres voient la migration déjà enregistrée
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM cache_migrations WHERE name = ?', (migration,)).fetchone():
+                conn.rollback()
+                return
+            seq = self._max_seq(conn)
+            for key, item in entries.items():
+                seq += 1
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {self.table} (key, question_template, sql_template, seq, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, item.get('question_template', ''), item.get('sql_template', ''), seq, now))
+            conn.execute('INSERT INTO cache_migrations (name, migrated_at, entries) VALUES (?, ?, ?)',
+                         (migration, now, len(entries)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if entries:
+            logger.info(f"✅ Cache {json_path.name} migré vers SQLite ({len(entries)} entrées)")
+
+    # ================================
+    # LECTURE / ÉCRITURE
+    # ================================
+
+    def _max_seq(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(f'SELECT COALESCE(MAX(seq), 0) FROM {self.table}').fetchone()[0]
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        rows = self._connection().execute(
+            f'SELECT key, question_template, sql_template, seq FROM {self.table} ORDER BY seq'
+        ).fetchall()
+        self.last_seq = max((row[3] for row in rows), default=0)
+        return {key: {'question_template': question, 'sql_template': sql} for key, question, sql, _ in rows}
+
+    def load_features(self) -> Dict[str, Tuple[Optional[str], Optional[bytes]]]:
+        """Texte normalisé et vecteur persistés de chaque entrée (None si pas encore calculés)"""
+        rows = self._connection().execute(
+            f'SELECT key, normalized, features FROM {self.table} ORDER BY seq'
+        ).fetchall()
+        return {key: (normalized, features) for key, normalized, features in rows}
+
+    def changes_since_last_sync(self) -> Dict[str, Dict[str, Any]]:
+        """Entrées écrites (par ce processus ou un autre) depuis la dernière lecture, avec leur vecteur"""
+        rows = self._connection().execute(
+            f'''SELECT key, question_template, sql_template, normalized, features, seq
+                FROM {self.table} WHERE seq > ? ORDER BY seq''',
+            (self.last_seq,)
+        ).fetchall()
+        if rows:
+            self.last_seq = rows[-1][5]
+        return {
+            key: {'question_template': question, 'sql_template': sql,
+                  'normalized': normalized, 'features': features}
+            for key, question, sql, normalized, features, _ in rows
+        }
+
+    def upsert(self, key: str, item: Dict[str, Any], normalized: Optional[str] = None,
+               features: Optional[bytes] = None) -> int:
+        """Insère ou remplace une entrée en une transaction ; retourne son numéro de séquence"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            seq = self._max_seq(conn) + 1
+            conn.execute(f'''
+                INSERT INTO {self.table} (key, question_template, sql_template, seq, updated_at, normalized, features)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    question_template = excluded.question_template,
+                    sql_template = excluded.sql_template,
+                    seq = excluded.seq,
+                    updated_at = excluded.updated_at,
+                    normalized = excluded.normalized,
+                    features = excluded.features
+            ''', (key, item['question_template'], item['sql_template'], seq, time.time(), normalized, features))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return seq
+
+    def save_features(self, entries: Dict[str, Tuple[str, bytes]]):
+        """Complète les vecteurs manquants (entrées migrées) sans les signaler comme modifiées"""
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f'UPDATE {self.table} SET normalized = ?, features = ? WHERE key = ?',
+                [(normalized, features, key) for key, (normalized, features) in entries.items()]
+            )
+
+    def __len__(self) -> int:
+        return self._connection().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
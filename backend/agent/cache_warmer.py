@@ -0,0 +1,336 @@
+"""
+Préchauffage des caches SQL (admin et parent) à partir de l'historique des conversations.
+
+Les questions les plus fréquentes des derniers jours sont regroupées par question normalisée
+(même normalisation que les caches) ; la plus récente requête SQL ayant abouti qui passe EXPLAIN est
+mise en cache : les premières questions du matin ne passent plus par le LLM.
+
+Usage (depuis backend/) : python -m agent.cache_warmer [--top 100] [--days 30] [--min-count 2] [--dry-run]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config.database import get_db
+from agent.result_cache import READ_PATTERN
+from security.roles import is_parent, is_super_admin
+
+logger = logging.getLogger(__name__)
+
+CONVERSATIONS_DB_PATH = os.getenv(
+    "CONVERSATIONS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'conversations.db')
+)
+CACHE_WARMER_TOP_N = int(os.getenv("CACHE_WARMER_TOP_N", "100"))
+CACHE_WARMER_LOOKBACK_DAYS = int(os.getenv("CACHE_WARMER_LOOKBACK_DAYS", "30"))
+CACHE_WARMER_MIN_COUNT = int(os.getenv("CACHE_WARMER_MIN_COUNT", "2"))
+# Requêtes distinctes essayées par question normalisée (des plus récentes aux plus anciennes)
+CACHE_WARMER_CANDIDATES = int(os.getenv("CACHE_WARMER_CANDIDATES", "5"))
+# Exécution quotidienne avant l'affluence du matin (désactivée par défaut)
+CACHE_WARMER_SCHEDULE = os.getenv("CACHE_WARMER_SCHEDULE", "0") == "1"
+CACHE_WARMER_TIME = os.getenv("CACHE_WARMER_TIME", "06:30")
+
+# Questions suivies de leur réponse assistant (message suivant de la même conversation), avec leur auteur
+HISTORY_QUERY = '''
+    SELECT q.content AS question, a.sql_query AS sql_query, a.created_at AS created_at, c.user_id AS user_id
+    FROM conversation_messages q
+    JOIN conversations c ON c.id = q.conversation_id AND c.is_deleted = 0
+    JOIN conversation_messages a ON a.id = (
+        SELECT MIN(n.id) FROM conversation_messages n
+        WHERE n.conversation_id = q.conversation_id AND n.id > q.id
+    )
+    WHERE q.message_type = 'user'
+      AND a.message_type = 'assistant'
+      AND a.sql_query IS NOT NULL AND a.sql_query != ''
+      AND a.content NOT LIKE '❌%'
+      AND q.created_at >= ?
+    ORDER BY a.id DESC
+'''
+
+
+class CacheWarmer:
+    """
+    Remplit les caches admin (CacheManager) et parent (CacheManager1) avec les requêtes
+    des questions les plus fréquentes de l'historique.
+    Le cache est choisi selon le rôle réel de l'auteur de la conversation (table user) : admin pour
+    ROLE_SUPER_ADMIN, parent pour ROLE_PARENT ; les autres conversations sont ignorées.
+    Les questions déjà en cache sont ignorées.
+    regenerate(question) (optionnel, admin uniquement) remplace une requête historique
+    qui ne passe plus EXPLAIN (schéma modifié).
+    user_roles(user_ids) -> {user_id: rôles} (par défaut : lecture de la table user).
+    """
+
+    def __init__(self, admin_cache, parent_cache, history_db_path: str = CONVERSATIONS_DB_PATH,
+                 regenerate: Optional[Callable[[str], str]] = None,
+                 user_roles: Optional[Callable[[List[int]], Dict[int, List[str]]]] = None):
+        self.admin_cache = admin_cache
+        self.parent_cache = parent_cache
+        self.history_db_path = history_db_path
+        self.regenerate = regenerate
+        self.user_roles = user_roles or self.load_user_roles
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_assistant(cls, assistant) -> "CacheWarmer":
+        return cls(assistant.cache, assistant.cache1, assistant.conversation_manager.db_path,
+                   regenerate=assistant.generate_sql_with_ai)
+
+    # ================================
+    # EXTRACTION DE L'HISTORIQUE
+    # ================================
+
+    def _history(self, days: int) -> List[sqlite3.Row]:
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        with sqlite3.connect(self.history_db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return conn.execute(HISTORY_QUERY, (since,)).fetchall()
+
+    @staticmethod
+    def _parse_roles(raw_roles) -> List[str]:
+        """Colonne user.roles : liste JSON (["ROLE_PARENT"]) ou rôle seul"""
+        if not raw_roles:
+            return []
+        if isinstance(raw_roles, bytes):
+            raw_roles = raw_roles.decode('utf-8', 'replace')
+        try:
+            parsed = json.loads(raw_roles)
+        except (TypeError, ValueError):
+            return [str(raw_roles)]
+        return [str(role) for role in parsed] if isinstance(parsed, list) else [str(parsed)]
+
+    @classmethod
+    def load_user_roles(cls, user_ids: List[int]) -> Dict[int, List[str]]:
+        """Rôles des auteurs des conversations, en une requête sur la table user"""
+        if not user_ids:
+            return {}
+        connection = get_db()
+        if connection is None:
+            raise ConnectionError("Connexion à la base de données indisponible")
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"SELECT idpersonne, roles FROM user WHERE idpersonne IN ({', '.join(['%s'] * len(user_ids))})",
+                tuple(user_ids)
+            )
+            return {int(row['idpersonne']): cls._parse_roles(row['roles']) for row in cursor.fetchall()}
+        finally:
+            if cursor:
+                cursor.close()
+            if hasattr(connection, '_direct_connection'):
+                connection.close()
+
+    @staticmethod
+    def _role_for(roles: List[str]) -> Optional[str]:
+        """Même aiguillage que ask_question : super admin d'abord, puis parent"""
+        if is_super_admin(roles):
+            return "admin"
+        if is_parent(roles):
+            return "parent"
+        return None
+
+    def frequent_questions(self, top_n: int = CACHE_WARMER_TOP_N, days: int = CACHE_WARMER_LOOKBACK_DAYS,
+                           min_count: int = CACHE_WARMER_MIN_COUNT) -> List[Dict[str, Any]]:
+        """
+        Questions normalisées les plus fréquentes : [{"role", "template", "count", "candidates"}],
+        candidates = [(question, requête)] distinctes, de la plus récente à la plus ancienne.
+        """
+        rows = self._history(days)
+        user_ids = sorted({int(row['user_id']) for row in rows if row['user_id'] is not None})
+        roles_by_user = self.user_roles(user_ids)
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        skipped = 0
+        for row in rows:
+            question, sql_query = row['question'].strip(), row['sql_query'].strip()
+            if not question or not READ_PATTERN.match(sql_query):
+                continue
+            user_id = row['user_id']
+            role = self._role_for(roles_by_user.get(int(user_id), []) if user_id is not None else [])
+            if role is None:
+                skipped += 1
+                continue
+            cache = self.parent_cache if role == "parent" else self.admin_cache
+            template, _ = cache._extract_parameters(question)
+            group = groups.setdefault((role, template), {"role": role, "template": template, "count": 0,
+                                                         "candidates": []})
+            group["count"] += 1
+            # Lignes triées de la plus récente à la plus ancienne
+            candidates = group["candidates"]
+            if len(candidates) < CACHE_WARMER_CANDIDATES and all(sql != sql_query for _, sql in candidates):
+                candidates.append((question, sql_query))
+
+        if skipped:
+            logger.info(f"🔥 Préchauffage: {skipped} question(s) ignorée(s), auteur ni super admin ni parent")
+        frequent = [group for group in groups.values() if group["count"] >= min_count]
+        frequent.sort(key=lambda group: group["count"], reverse=True)
+        return frequent[:top_n]
+
+    # ================================
+    # VALIDATION ET MISE EN CACHE
+    # ================================
+
+    @staticmethod
+    def explain(sql_query: str) -> Optional[str]:
+        """None si MySQL accepte la requête (EXPLAIN), sinon le message d'erreur"""
+        connection = None
+        cursor = None
+        try:
+            connection = get_db()
+            if connection is None:
+                return "Connexion à la base de données indisponible"
+            cursor = connection.cursor()
+            cursor.execute(f"EXPLAIN {sql_query}")
+            cursor.fetchall()
+            return None
+        except Exception as e:
+            return str(e)
+        finally:
+            if cursor:
+                cursor.close()
+            if connection and hasattr(connection, '_direct_connection'):
+                connection.close()
+
+    @staticmethod
+    def _is_cached(cache, template: str) -> bool:
+        """Même clé que cache_query : hash de la question normalisée"""
+        cache._sync_from_store()
+        return hashlib.md5(template.encode('utf-8')).hexdigest() in cache.cache
+
+    def warm(self, top_n: int = CACHE_WARMER_TOP_N, days: int = CACHE_WARMER_LOOKBACK_DAYS,
+             min_count: int = CACHE_WARMER_MIN_COUNT, dry_run: bool = False) -> Dict[str, Any]:
+        """Préchauffe les caches ; retourne le rapport (aussi gardé dans last_report)"""
+        if not self._run_lock.acquire(blocking=False):
+            return {"status": "already_running"}
+        try:
+            started = time.time()
+            report = {"status": "ok", "candidates": 0, "cached": 0, "already_cached": 0,
+                      "regenerated": 0, "invalid": 0, "dry_run": dry_run, "entries": []}
+            for group in self.frequent_questions(top_n, days, min_count):
+                report["candidates"] += 1
+                report["entries"].append(self._warm_group(group, dry_run, report))
+            report["duration"] = round(time.time() - started, 2)
+            report["finished_at"] = datetime.now().isoformat()
+            self.last_report = report
+            logger.info(f"🔥 Préchauffage des caches SQL: {report['cached']} ajoutée(s), "
+                        f"{report['already_cached']} déjà en cache, {report['invalid']} invalide(s) "
+                        f"sur {report['candidates']} question(s) fréquente(s)")
+            return report
+        finally:
+            self._run_lock.release()
+
+    def _warm_group(self, group: Dict[str, Any], dry_run: bool, report: Dict[str, Any]) -> Dict[str, Any]:
+        role = group["role"]
+        cache = self.parent_cache if role == "parent" else self.admin_cache
+        entry = {"role": role, "question": group["candidates"][0][0], "count": group["count"]}
+
+        if self._is_cached(cache, group["template"]):
+            report["already_cached"] += 1
+            entry["status"] = "already_cached"
+            return entry
+
+        error = None
+        for question, sql_query in group["candidates"]:
+            error = self._candidate_error(cache, role, question, sql_query)
+            if error is None:
+                break
+        else:
+            question, sql_query = group["candidates"][0]
+            if role == "admin" and self.regenerate:
+                try:
+                    regenerated = self.regenerate(question)
+                    if regenerated and self.explain(regenerated) is None:
+                        sql_query, error = regenerated, None
+                        report["regenerated"] += 1
+                except Exception as e:
+                    logger.warning(f"⚠️ Régénération impossible pour '{question[:50]}': {e}")
+        if error:
+            report["invalid"] += 1
+            entry.update(status="invalid", error=error)
+            return entry
+
+        if not dry_run:
+            cache.cache_query(question, sql_query)
+        report["cached"] += 1
+        entry.update(status="cached", question=question)
+        return entry
+
+    def _candidate_error(self, cache, role: str, question: str, sql_query: str) -> Optional[str]:
+        """None si la requête peut être mise en cache pour cette question, sinon la raison"""
+        if role == "parent":
+            # Même condition que cache_query (sinon la mise en cache serait ignorée)
+            if not cache._has_family_reference(question):
+                return "Question sans référence familiale"
+            # Le filtre enfant doit devenir {id_personne}, sinon la requête d'un parent serait servie à d'autres
+            _, variables = cache._extract_parameters(question)
+            if '{id_personne}' not in cache._normalize_sql(sql_query, variables):
+                return "Filtre enfant non paramétrable"
+        return self.explain(sql_query)
+
+    # ================================
+    # PLANIFICATION
+    # ================================
+
+    @staticmethod
+    def seconds_until(time_of_day: str, now: Optional[datetime] = None) -> float:
+        """Secondes avant la prochaine occurrence de HH:MM"""
+        now = now or datetime.now()
+        hour, minute = (int(part) for part in time_of_day.split(':'))
+        target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    def start_schedule(self, time_of_day: str = CACHE_WARMER_TIME):
+        """Préchauffage quotidien à HH:MM dans un thread de fond (sans effet si déjà démarré)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._scheduled, args=(time_of_day,),
+                                        name="cache-warmer", daemon=True)
+        self._thread.start()
+        logger.info(f"⏰ Préchauffage des caches SQL planifié chaque jour à {time_of_day}")
+
+    def stop_schedule(self):
+        self._stop.set()
+
+    def _scheduled(self, time_of_day: str):
+        while not self._stop.wait(self.seconds_until(time_of_day)):
+            try:
+                self.warm()
+            except Exception as e:
+                logger.error(f"❌ Préchauffage planifié des caches SQL: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Préchauffe les caches SQL depuis l'historique des conversations")
+    parser.add_argument("--top", type=int, default=CACHE_WARMER_TOP_N)
+    parser.add_argument("--days", type=int, default=CACHE_WARMER_LOOKBACK_DAYS)
+    parser.add_argument("--min-count", type=int, default=CACHE_WARMER_MIN_COUNT)
+    parser.add_argument("--history", default=CONVERSATIONS_DB_PATH, help="chemin de conversations.db")
+    parser.add_argument("--dry-run", action="store_true", help="valide sans écrire dans les caches")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from agent.cache_manager import CacheManager
+    from agent.cache_manager1 import CacheManager1
+
+    warmer = CacheWarmer(CacheManager(), CacheManager1(), args.history)
+    report = warmer.warm(args.top, args.days, args.min_count, dry_run=args.dry_run)
+    for entry in report.get("entries", []):
+        print(f"{entry['status']:>15}  {entry['role']:<6} x{entry['count']:<4} {entry['question'][:80]}")
+    return 0 if report.get("status") == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Année scolaire courante (inscriptions prises en compte)
+SCHOOL_YEAR = os.getenv("SCHOOL_YEAR", "2024/2025")
+# Durée de validité d'une famille en cache (secondes) ; une famille sans enfant est revérifiée plus tôt
+CHILDREN_DIRECTORY_TTL = int(os.getenv("CHILDREN_DIRECTORY_TTL", str(6 * 3600)))
+CHILDREN_DIRECTORY_EMPTY_TTL = int(os.getenv("CHILDREN_DIRECTORY_EMPTY_TTL", "300"))
+# Préchargement de toutes les familles inscrites au démarrage
+CHILDREN_DIRECTORY_WARMUP = os.getenv("CHILDREN_DIRECTORY_WARMUP", "1") == "1"
+
+CHILDREN_COLUMNS = """
+    pe.id AS id_enfant,
+    pe.PrenomFr AS prenom,
+    pe.NomFr AS nom,
+    e.DateNaissance AS date_naissance,
+    YEAR(CURDATE()) - YEAR(e.DateNaissance) AS age,
+    c.CODECLASSEFR AS classe,
+    n.NOMNIVAR AS niveau,
+    CASE
+        WHEN pe.Civilite = 1 THEN 'M'
+        WHEN pe.Civilite = 2 THEN 'F'
+        ELSE 'Inconnu'
+    END AS genre
+"""
+
+CHILDREN_JOINS = """
+FROM personne p
+JOIN parent pa ON p.id = pa.Personne
+JOIN parenteleve pev ON pa.id = pev.Parent
+JOIN eleve e ON pev.Eleve = e.id
+JOIN personne pe ON e.IdPersonne = pe.id
+JOIN inscriptioneleve ie ON e.id = ie.Eleve
+JOIN classe c ON ie.Classe = c.id
+JOIN niveau n ON c.IDNIV = n.id
+JOIN anneescolaire a ON ie.AnneeScolaire = a.id
+"""
+
+PARENT_CHILDREN_QUERY = f"""
+SELECT DISTINCT {CHILDREN_COLUMNS}
+{CHILDREN_JOINS}
+WHERE p.id = %s AND a.AnneeScolaire = %s
+ORDER BY e.DateNaissance ASC
+"""
+
+ALL_FAMILIES_QUERY = f"""
+SELECT DISTINCT p.id AS id_parent, {CHILDREN_COLUMNS}
+{CHILDREN_JOINS}
+WHERE a.AnneeScolaire = %s
+ORDER BY p.id, e.DateNaissance ASC
+"""
+
+
+class ChildrenDirectory:
+    """
+    Annuaire parent -> enfants inscrits, partagé par l'assistant et le cache parent.
+    Une seule requête détaillée par (parent, année scolaire), gardée CHILDREN_DIRECTORY_TTL secondes ;
+    les IDs et prénoms en sont dérivés. warm_up() précharge toutes les familles en une requête.
+    Les erreurs de base ne sont jamais mises en cache.
+    """
+
+    def __init__(self, school_year: str = SCHOOL_YEAR, ttl: int = CHILDREN_DIRECTORY_TTL,
+                 empty_ttl: int = CHILDREN_DIRECTORY_EMPTY_TTL):
+        self.school_year = school_year
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        # (parent, année) -> (enfants, expiration)
+        self._entries: Dict[Tuple[int, str], Tuple[List[Dict[str, Any]], float]] = {}
+        self._lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._stats = {"hits": 0, "misses": 0, "errors": 0, "warmups": 0, "warmed_families": 0,
+                       "invalidations": 0}
+
+    # ================================
+    # LECTURE
+    # ================================
+
+    def get_children(self, parent_id: int, school_year: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Enfants inscrits du parent (id_enfant, prenom, nom, date_naissance, age, classe, niveau, genre)"""
+        key = (int(parent_id), school_year or self.school_year)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= time.time():
+                self._stats["hits"] += 1
+                return [dict(child) for child in entry[0]]
+            self._stats["misses"] += 1
+
+        children = self._fetch_parent(*key)
+        if children is None:
+            return []
+        self._store(key, children)
+        return [dict(child) for child in children]
+
+    def get_children_ids(self, parent_id: int, school_year: Optional[str] = None) -> List[int]:
+        return [child['id_enfant'] for child in self.get_children(parent_id, school_year)]
+
+    def get_children_ids_and_names(self, parent_id: int,
+                                   school_year: Optional[str] = None) -> Tuple[List[int], List[str]]:
+        children = self.get_children(parent_id, school_year)
+        return [child['id_enfant'] for child in children], [child['prenom'] for child in children]
+
+    def _store(self, key: Tuple[int, str], children: List[Dict[str, Any]], now: Optional[float] = None):
+        ttl = self.ttl if children else self.empty_ttl
+        with self._lock:
+            self._entries[key] = (children, (now or time.time()) + ttl)
+
+    # ================================
+    # REQUÊTES
+    # ================================
+
+    def _query(self, sql: str, params: tuple) -> Optional[List[Dict[str, Any]]]:
+        """Lignes de la requête, ou None en cas d'erreur"""
+        connection = None
+        cursor = None
+        try:
+            connection = get_db()
+            if connection is None:
+                raise ConnectionError("Connexion à la base de données indisponible")
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            return list(cursor.fetchall())
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"❌ Erreur annuaire des enfants: {e}")
+            return None
+        finally:
+            try:
+                if cursor:
+                    cursor.close()
+                if connection and hasattr(connection, '_direct_connection'):
+                    connection.close()
+            except Exception as close_error:
+                logger.warning(f"⚠️ Erreur lors du nettoyage: {str(close_error)}")
+
+    def _fetch_parent(self, parent_id: int, school_year: str) -> Optional[List[Dict[str, Any]]]:
+        children = self._query(PARENT_CHILDREN_QUERY, (parent_id, school_year))
+        if children:
+            logger.info(f"✅ Trouvé {len(children)} enfants pour le parent {parent_id}")
+        return children
+
+    def warm_up(self, school_year: Optional[str] = None) -> int:
+        """Précharge toutes les familles ayant un enfant inscrit ; retourne le nombre de familles"""
+        school_year = school_year or self.school_year
+        started = time.time()
+        rows = self._query(ALL_FAMILIES_QUERY, (school_year,))
+        if rows is None:
+            return 0
+
+        families: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            row = dict(row)
+            families.setdefault(int(row.pop('id_parent')), []).append(row)
+        now = time.time()
+        for parent_id, children in families.items():
+            self._store((parent_id, school_year), children, now)
+
+        with self._lock:
+            self._stats["warmups"] += 1
+            self._stats["warmed_families"] = len(families)
+        logger.info(f"✅ Annuaire des enfants préchargé: {len(families)} familles ({time.time() - started:.2f}s)")
+        return len(families)
+
+    def warm_up_async(self):
+        """Préchargement dans un thread de fond (sans effet si déjà en cours)"""
+        if self._warmup_thread and self._warmup_thread.is_alive():
+            return
+        self._warmup_thread = threading.Thread(target=self.warm_up, name="children-directory-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    # ================================
+    # INVALIDATION
+    # ================================
+
+    def invalidate(self, parent_id: Optional[int] = None, school_year: Optional[str] = None) -> int:
+        """Oublie un parent (toutes années ou une seule), ou tout l'annuaire sans parent_id"""
+        with self._lock:
+            if parent_id is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries
+                        if key[0] == int(parent_id) and (school_year is None or key[1] == school_year)]
+            for key in keys:
+                del self._entries[key]
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["families"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["school_year"] = self.school_year
+        stats["ttl"] = self.ttl
+        return stats
+
+
+_directory: Optional[ChildrenDirectory] = None
+_directory_lock = threading.Lock()
+
+
+def get_children_directory() -> ChildrenDirectory:
+    """Annuaire partagé par tout le processus"""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = ChildrenDirectory()
+    return _directory
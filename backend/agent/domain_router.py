@@ -0,0 +1,168 @@
+import os
+import re
+import logging
+import unicodedata
+from typing import Dict, List, Optional, Callable, Tuple
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+# Seuils du routeur, surchargeables via l'environnement
+DOMAIN_ROUTER_MIN_SCORE = float(os.getenv("DOMAIN_ROUTER_MIN_SCORE", "0.25"))
+DOMAIN_ROUTER_RELATIVE_CUTOFF = float(os.getenv("DOMAIN_ROUTER_RELATIVE_CUTOFF", "0.6"))
+DOMAIN_ROUTER_MAX_DOMAINS = int(os.getenv("DOMAIN_ROUTER_MAX_DOMAINS", "3"))
+DOMAIN_ROUTER_KEYWORD_WEIGHT = float(os.getenv("DOMAIN_ROUTER_KEYWORD_WEIGHT", "0.35"))
+
+
+class DomainRouter:
+    """
+    Classifieur local des domaines d'une question (TF-IDF + mots-clés).
+    Le LLM n'est sollicité que si le score de confiance est sous le seuil.
+    """
+
+    # Mots-clés (sans accents) → domaines, repris et complétés de get_relevant_domains_improved
+    KEYWORD_DOMAINS = {
+        'section': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'civilite': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'nationalite': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'niveau': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'classe': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'localite': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'gouvernorat': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'etablissement': ['GENERAL_ADMINISTRATION_CONFIG'],
+        'eleve': ['ELEVES_INSCRIPTIONS'],
+        'inscri': ['ELEVES_INSCRIPTIONS'],
+        'preinscri': ['ELEVES_INSCRIPTIONS'],
+        'note': ['SUIVI_SCOLARITE'],
+        'moyenne': ['SUIVI_SCOLARITE'],
+        'absence': ['SUIVI_SCOLARITE'],
+        'absent': ['SUIVI_SCOLARITE'],
+        'retard': ['SUIVI_SCOLARITE'],
+        'sanction': ['SUIVI_SCOLARITE'],
+        'blame': ['SUIVI_SCOLARITE'],
+        'avertissement': ['SUIVI_SCOLARITE'],
+        'examen': ['SUIVI_SCOLARITE'],
+        'devoir': ['SUIVI_SCOLARITE'],
+        'bulletin': ['SUIVI_SCOLARITE'],
+        'parent': ['PARENTS'],
+        'pere': ['PARENTS'],
+        'mere': ['PARENTS'],
+        'tuteur': ['PARENTS'],
+        'cantine': ['CANTINE'],
+        'repas': ['CANTINE'],
+        'menu': ['CANTINE'],
+        'enseignant': ['PERSONNEL_ENSEIGNEMENT'],
+        'professeur': ['PERSONNEL_ENSEIGNEMENT'],
+        'prof': ['PERSONNEL_ENSEIGNEMENT'],
+        'surveillant': ['PERSONNEL_ENSEIGNEMENT'],
+        'personnel': ['PERSONNEL_ENSEIGNEMENT'],
+        'paiement': ['FINANCES_PAIEMENTS'],
+        'paye': ['FINANCES_PAIEMENTS'],
+        'reglement': ['FINANCES_PAIEMENTS'],
+        'frais': ['FINANCES_PAIEMENTS'],
+        'tranche': ['FINANCES_PAIEMENTS'],
+        'impaye': ['FINANCES_PAIEMENTS'],
+        'montant': ['FINANCES_PAIEMENTS'],
+        'emploi du temps': ['EMPLOIS_DU_TEMPS'],
+        'seance': ['EMPLOIS_DU_TEMPS'],
+        'horaire': ['EMPLOIS_DU_TEMPS'],
+        'salle': ['EMPLOIS_DU_TEMPS'],
+        'cours': ['EMPLOIS_DU_TEMPS'],
+    }
+
+    def __init__(self, domain_descriptions: Dict[str, str],
+                 domain_to_tables: Dict[str, List[str]],
+                 llm_fallback: Optional[Callable[[str], List[str]]] = None,
+                 min_score: float = DOMAIN_ROUTER_MIN_SCORE,
+                 relative_cutoff: float = DOMAIN_ROUTER_RELATIVE_CUTOFF,
+                 max_domains: int = DOMAIN_ROUTER_MAX_DOMAINS):
+        self.domain_descriptions = domain_descriptions or {}
+        self.domain_to_tables = domain_to_tables or {}
+        self.llm_fallback = llm_fallback
+        self.min_score = min_score
+        self.relative_cutoff = relative_cutoff
+        self.max_domains = max_domains
+
+        self.domains = list(self.domain_descriptions.keys())
+        self.keyword_patterns = [
+            (re.compile(r'\b' + re.escape(keyword)), domains)
+            for keyword, domains in self.KEYWORD_DOMAINS.items()
+        ]
+
+        # N-grammes de caractères : les noms de tables sont des mots accolés (eleveinscri, ...)
+        self.vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), sublinear_tf=True)
+        self.domain_vectors = None
+        if self.domains:
+            self.domain_vectors = self.vectorizer.fit_transform(
+                [self._domain_document(domain) for domain in self.domains]
+            )
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """Minuscules, sans accents ni balises markdown"""
+        text = unicodedata.normalize('NFKD', text.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        return re.sub(r'[*_]+', ' ', text)
+
+    def _domain_document(self, domain: str) -> str:
+        parts = [
+            domain.replace('_', ' '),
+            self.domain_descriptions.get(domain, ''),
+            ' '.join(self.domain_to_tables.get(domain, []))
+        ]
+        return self._normalize(' '.join(parts))
+
+    def score(self, question: str) -> Dict[str, float]:
+        """Score de chaque domaine : similarité TF-IDF + bonus par mot-clé trouvé"""
+        if self.domain_vectors is None:
+            return {}
+
+        normalized = self._normalize(question)
+        similarities = cosine_similarity(
+            self.vectorizer.transform([normalized]), self.domain_vectors
+        )[0]
+        scores = {domain: float(sim) for domain, sim in zip(self.domains, similarities)}
+
+        for pattern, domains in self.keyword_patterns:
+            if pattern.search(normalized):
+                for domain in domains:
+                    if domain in scores:
+                        scores[domain] += DOMAIN_ROUTER_KEYWORD_WEIGHT
+        return scores
+
+    def route(self, question: str) -> Tuple[List[str], float, str]:
+        """
+        Retourne (domaines, score, source) où source vaut 'local' ou 'llm'.
+        Une liste vide signifie qu'aucun domaine n'a pu être déterminé (schéma complet) :
+        c'est le cas si le LLM, consulté faute de confiance locale, n'en trouve aucun.
+        Les candidats locaux peu sûrs ne sont gardés qu'en l'absence de repli LLM.
+        """
+        scores = self.score(question)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        top_score = ranked[0][1] if ranked else 0.0
+
+        candidates = [
+            domain for domain, value in ranked
+            if value > 0 and value >= top_score * self.relative_cutoff
+        ][:self.max_domains]
+
+        if top_score >= self.min_score and candidates:
+            logger.info(f"🧭 Domaines (local): {candidates} | score={top_score:.3f}")
+            return candidates, top_score, 'local'
+
+        if self.llm_fallback:
+            logger.info(
+                f"🧭 Confiance locale insuffisante (score={top_score:.3f} < {self.min_score}), "
+                f"recours au LLM"
+            )
+            llm_domains = [d for d in self.llm_fallback(question) if d in self.domain_descriptions]
+            if llm_domains:
+                logger.info(f"🧭 Domaines (llm): {llm_domains}")
+                return llm_domains, top_score, 'llm'
+            logger.info("🧭 Aucun domaine identifié par le LLM, schéma complet")
+            return [], top_score, 'llm'
+
+        logger.info(f"🧭 Domaines (local, faible confiance): {candidates} | score={top_score:.3f}")
+        return candidates, top_score, 'local'
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Base SQLite de la file de tâches (partagée par les workers de tous les processus)
+JOB_QUEUE_DB_PATH = os.getenv(
+    "JOB_QUEUE_DB_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'jobs.db')
+)
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "4"))
+# Tâches en attente au-delà desquelles une nouvelle soumission est refusée
+JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", "200"))
+# Conservation d'un résultat terminé (secondes)
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# Attente maximale d'une consultation longue (GET /jobs/<id>?wait=)
+JOB_WAIT_MAX = float(os.getenv("JOB_WAIT_MAX", "30"))
+# Une tâche toujours "running" après ce délai est considérée interrompue (processus arrêté)
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "900"))
+# Scrutation de la file pour les tâches soumises par d'autres processus (secondes)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+FINISHED_STATUSES = ("done", "error")
+
+
+class JobQueueFullError(RuntimeError):
+    """Trop de tâches en attente : la requête doit être réessayée plus tard"""
+
+
+class JobQueue:
+    """
+    File de tâches longues (attestations, questions sans cache) : la requête HTTP reçoit un identifiant
+    immédiatement, un pool de threads exécute la tâche et le résultat JSON est gardé JOB_RESULT_TTL secondes.
+    Les tâches sont persistées en SQLite (WAL) ; chaque worker prend la plus ancienne tâche en attente
+    d'un type qu'il sait traiter (register), y compris celles soumises par un autre processus.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_DB_PATH, workers: int = JOB_QUEUE_WORKERS,
+                 result_ttl: int = JOB_RESULT_TTL, max_pending: int = JOB_QUEUE_MAX_PENDING,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.db_path = db_path
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._local = threading.local()
+        self._threads: List[threading.Thread] = []
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        # Un jeton par tâche soumise localement : réveil immédiat d'un worker
+        self._submitted = threading.Semaphore(0)
+        # Signalé à chaque fin de tâche locale (consultations longues)
+        self._finished = threading.Condition()
+        self._last_purge = 0.0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    owner TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    expires_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Une connexion par thread (sqlite3 n'autorise pas le partage par défaut)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    # ================================
+    # WORKERS
+    # ================================
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Any]):
+        """handler(payload) -> résultat sérialisable en JSON ; une exception marque la tâche en erreur"""
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Démarre le pool de workers (sans effet s'il tourne déjà)"""
+        with self._threads_lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            self._stop.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"✅ File de tâches démarrée ({self.workers} workers, types: {', '.join(self._handlers)})")
+
+    def stop(self):
+        self._stop.set()
+        for _ in self._threads:
+            self._submitted.release()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._purge()
+                    self._submitted.acquire(timeout=self.poll_interval)
+                    continue
+                self._run(job['id'], job['kind'], job['payload'])
+            except Exception as e:
+                logger.error(f"❌ Erreur worker de la file de tâches: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Passe la plus ancienne tâche en attente à "running" (BEGIN IMMEDIATE : un seul worker la prend)"""
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            job = conn.execute(f'''
+                SELECT id, kind, payload FROM jobs
+                WHERE status = 'queued' AND kind IN ({', '.join('?' * len(kinds))})
+                ORDER BY created_at LIMIT 1
+            ''', kinds).fetchone()
+            if job is not None:
+                conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                             (time.time(), job['id']))
+            conn.commit()
+            return job
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _run(self, job_id: str, kind: str, payload: str):
+        started = time.time()
+        try:
+            result = self._handlers[kind](json.loads(payload))
+            self._finish(job_id, "done", result=json.dumps(result, ensure_ascii=False, default=str))
+            self._count("completed")
+            logger.info(f"✅ Tâche {kind} {job_id[:8]} terminée ({time.time() - started:.2f}s)")
+        except Exception as e:
+            self._finish(job_id, "error", error=str(e))
+            self._count("failed")
+            logger.error(f"❌ Tâche {kind} {job_id[:8]} en échec: {e}")
+        finally:
+            with self._finished:
+                self._finished.notify_all()
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?
+                WHERE id = ?
+            ''', (status, result, error, now, now + self.result_ttl, job_id))
+
+    def _purge(self, now: Optional[float] = None):
+        """Supprime les résultats expirés et clôt les tâches interrompues (au plus une fois par minute)"""
+        now = now or time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        with self._connection() as conn:
+            expired = conn.execute('DELETE FROM jobs WHERE expires_at < ?', (now,)).rowcount
+            stale = conn.execute('''
+                UPDATE jobs SET status = 'error', error = 'Tâche interrompue', finished_at = ?, expires_at = ?
+                WHERE status = 'running' AND started_at < ?
+            ''', (now, now + self.result_ttl, now - JOB_STALE_AFTER)).rowcount
+        if expired or stale:
+            logger.info(f"🧹 File de tâches: {expired} résultat(s) expiré(s), {stale} tâche(s) interrompue(s)")
+
+    # ================================
+    # SOUMISSION ET SUIVI
+    # ================================
+
+    def submit(self, kind: str, payload: Dict[str, Any], owner: Optional[Any] = None) -> str:
+        """Enregistre la tâche et retourne son identifiant ; JobQueueFullError si la file est pleine"""
+        if kind not in self._handlers:
+            raise ValueError(f"Type de tâche inconnu: {kind}")
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        # Comptage et insertion dans la même transaction d'écriture (BEGIN IMMEDIATE, comme _claim) :
+        # des soumissions simultanées, y compris d'autres processus, ne dépassent pas max_pending
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            pending = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if pending >= self.max_pending:
+                conn.rollback()
+                self._count("rejected")
+                raise JobQueueFullError(f"File de tâches pleine ({pending} en attente)")
+            conn.execute('''
+                INSERT INTO jobs (id, kind, status, payload, owner, created_at)
+                VALUES (?, ?, 'queued', ?, ?, ?)
+            ''', (job_id, kind, json.dumps(payload, ensure_ascii=False, default=str),
+                  None if owner is None else str(owner), time.time()))
+            conn.commit()
+        except JobQueueFullError:
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        self._count("submitted")
+        self.start()
+        self._submitted.release()
+        return job_id
+
+    def get(self, job_id: str, owner: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """État de la tâche, ou None si elle est inconnue, expirée ou appartient à un autre utilisateur"""
+        job = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if job is None or job['owner'] != (None if owner is None else str(owner)):
+            return None
+        if job['expires_at'] is not None and job['expires_at'] < time.time():
+            return None
+        return self._describe(job)
+
+    def wait(self, job_id: str, timeout: float, owner: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Comme get(), en attendant la fin de la tâche au plus timeout secondes (borné à JOB_WAIT_MAX)"""
+        deadline = time.time() + max(0.0, min(timeout, JOB_WAIT_MAX))
+        while True:
+            job = self.get(job_id, owner)
+            remaining = deadline - time.time()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            # Réveil à la fin d'une tâche locale, sinon scrutation (tâche prise par un autre processus)
+            with self._finished:
+                self._finished.wait(min(remaining, self.poll_interval))
+
+    @staticmethod
+    def _describe(job: sqlite3.Row) -> Dict[str, Any]:
+        def iso(timestamp: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+        return {
+            "job_id": job['id'],
+            "kind": job['kind'],
+            "status": job['status'],
+            "created_at": iso(job['created_at']),
+            "started_at": iso(job['started_at']),
+            "finished_at": iso(job['finished_at']),
+            "expires_at": iso(job['expires_at']),
+            "result": json.loads(job['result']) if job['result'] else None,
+            "error": job['error']
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict(self._connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({status: counts.get(status, 0) for status in ("queued", "running", "done", "error")})
+        stats["workers"] = sum(thread.is_alive() for thread in self._threads)
+        stats["kinds"] = list(self._handlers)
+        stats["result_ttl"] = self.result_ttl
+        return stats
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """File de tâches partagée par tout le processus"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
@@ -1,35 +1,448 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import httpx
 import os
+import json
+import time
+import sqlite3
+import hashlib
 import logging
+import threading
+from collections import OrderedDict, defaultdict
+from typing import List, Dict, Optional, Any, Iterator
 
 logger = logging.getLogger(__name__)
 
-def ask_llm(prompt: str) -> str:
-    try:
+# Configuration du pool de connexions HTTP vers l'API OpenAI
+LLM_DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+LLM_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "100"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+# Configuration du cache des réponses LLM
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # memory | sqlite | none
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'llm_cache.db')
+)
+# TTL par point d'appel (secondes), surchargeables via LLM_CACHE_TTL_<SITE>
+LLM_CACHE_TTLS = {
+    "default": 3600,
+    "domains": 8 * 3600,
+    "format": 3600
+}
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+_async_client: Optional[AsyncOpenAI] = None
+
+
+def get_llm_client() -> OpenAI:
+    """Retourne le client OpenAI partagé par tout le processus (connexions keep-alive)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    logger.error("❌ OPENAI_API_KEY non définie dans les variables d'environnement")
+                    raise ValueError("Clé API OpenAI manquante")
+
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=LLM_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                    ),
+                    timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+                )
+                _client = OpenAI(
+                    api_key=api_key,
+                    http_client=http_client,
+                    max_retries=LLM_MAX_RETRIES
+                )
+                logger.info(
+                    f"✅ Client LLM initialisé (pool: {LLM_POOL_MAX_CONNECTIONS} connexions, "
+                    f"keep-alive: {LLM_POOL_MAX_KEEPALIVE})"
+                )
+    return _client
+
+
+def close_llm_client():
+    """Ferme le client partagé et libère les connexions du pool"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Erreur fermeture client LLM: {e}")
+            _client = None
+
+
+def get_async_llm_client() -> AsyncOpenAI:
+    """
+    Client asynchrone partagé (mode ASGI) : les requêtes en attente du LLM
+    ne mobilisent pas de thread. À créer et utiliser depuis la boucle d'événements.
+    """
+    global _async_client
+    if _async_client is None:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             logger.error("❌ OPENAI_API_KEY non définie dans les variables d'environnement")
             raise ValueError("Clé API OpenAI manquante")
-        
-        client = OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        )
+        _async_client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=LLM_MAX_RETRIES
+        )
+        logger.info("✅ Client LLM asynchrone initialisé")
+    return _async_client
+
+
+async def close_async_llm_client():
+    """Ferme le client asynchrone (arrêt du serveur ASGI)"""
+    global _async_client
+    if _async_client is not None:
+        try:
+            await _async_client.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Erreur fermeture client LLM asynchrone: {e}")
+        _async_client = None
+
+
+# ================================
+# CACHE DES RÉPONSES LLM
+# ================================
+
+class MemoryLRUBackend:
+    """Backend en mémoire avec éviction LRU et expiration par entrée"""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Backend persistant SQLite, partagé entre les workers d'une même machine"""
+
+    EVICTION_INTERVAL = 50
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)')
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int):
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key, value, now + ttl, now))
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                conn.execute('DELETE FROM llm_cache WHERE expires_at < ?', (now,))
+                conn.execute('''
+                    DELETE FROM llm_cache WHERE key NOT IN (
+                        SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT ?
+                    )
+                ''', (self.max_entries,))
+
+    def clear(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('DELETE FROM llm_cache')
+
+    def __len__(self) -> int:
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+
+
+class LLMResponseCache:
+    """Cache déterministe des réponses LLM, clé = hash(prompt et paramètres de génération)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, messages: List[Dict[str, str]]) -> str:
+        """Tout paramètre qui change la réponse (max_tokens tronque) fait partie de la clé ; timeout non"""
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "max_tokens": max_tokens, "messages": messages},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def ttl_for(site: str) -> int:
+        env_ttl = os.getenv(f"LLM_CACHE_TTL_{site.upper()}")
+        if env_ttl:
+            return int(env_ttl)
+        return LLM_CACHE_TTLS.get(site, LLM_CACHE_TTLS["default"])
+
+    def get(self, site: str, key: str) -> Optional[str]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture cache LLM impossible: {e}")
+            value = None
+        with self._stats_lock:
+            self._stats[site]["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, site: str, key: str, value: str):
+        try:
+            self.backend.set(key, value, self.ttl_for(site))
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture cache LLM impossible: {e}")
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            sites = {site: dict(counters) for site, counters in self._stats.items()}
+        hits = sum(c["hits"] for c in sites.values())
+        misses = sum(c["misses"] for c in sites.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "sites": sites
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Retourne le cache partagé, ou None si désactivé (LLM_CACHE_BACKEND=none)"""
+    global _cache
+    if _cache is None and LLM_CACHE_BACKEND != "none":
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    if LLM_CACHE_BACKEND == "sqlite":
+                        backend = SQLiteBackend()
+                    else:
+                        backend = MemoryLRUBackend()
+                    _cache = LLMResponseCache(backend)
+                    logger.info(f"✅ Cache LLM initialisé ({type(backend).__name__})")
+                except Exception as e:
+                    logger.error(f"❌ Erreur initialisation cache LLM: {e}")
+                    return None
+    return _cache
+
+
+def chat_completion(messages: List[Dict[str, str]], model: str = None,
+                    temperature: float = 0.1, max_tokens: int = 2048,
+                    timeout: Optional[float] = None, cache_site: Optional[str] = None) -> str:
+    """
+    Point d'entrée unique pour les appels chat.completions.
+    Si cache_site est fourni, la réponse est mise en cache avec le TTL de ce point d'appel.
+    """
+    model = model or LLM_DEFAULT_MODEL
+    cache = get_llm_cache() if cache_site else None
+    cache_key = None
+    if cache:
+        cache_key = LLMResponseCache.make_key(model, temperature, max_tokens, messages)
+        cached = cache.get(cache_site, cache_key)
+        if cached is not None:
+            logger.debug(f"⚡ Réponse LLM servie depuis le cache ({cache_site})")
+            return cached
+
+    client = get_llm_client()
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout or LLM_TIMEOUT
+    )
+    result = response.choices[0].message.content
+
+    if cache and result and result.strip():
+        cache.set(cache_site, cache_key, result)
+    return result
+
+
+def chat_completion_stream(messages: List[Dict[str, str]], model: str = None,
+                           temperature: float = 0.1, max_tokens: int = 2048,
+                           timeout: Optional[float] = None,
+                           cache_site: Optional[str] = None) -> Iterator[str]:
+    """
+    Variante streaming de chat_completion : produit les fragments de texte au fil de l'eau.
+    Une réponse en cache est produite en un seul fragment ; une réponse complète est mise en cache.
+    """
+    model = model or LLM_DEFAULT_MODEL
+    cache = get_llm_cache() if cache_site else None
+    cache_key = None
+    if cache:
+        cache_key = LLMResponseCache.make_key(model, temperature, max_tokens, messages)
+        cached = cache.get(cache_site, cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    client = get_llm_client()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout or LLM_TIMEOUT,
+        stream=True
+    )
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    finally:
+        stream.close()
+
+    result = "".join(parts)
+    if cache and result.strip():
+        cache.set(cache_site, cache_key, result)
+
+
+def ask_llm(prompt: str, cache_site: Optional[str] = None) -> str:
+    try:
+        result = chat_completion(
+            [{"role": "user", "content": prompt}],
             temperature=0.1,
             max_tokens=2048,
-            timeout=100  
+            cache_site=cache_site
         )
-        
-        result = response.choices[0].message.content
         if not result or result.strip() == "":
             raise ValueError("Réponse vide de l'IA")
-            
+
         return result
-        
+
     except Exception as e:
         error_msg = f"❌ Erreur LLM: {str(e)}"
         logger.error(error_msg)
         print(error_msg)
-        
-        raise ConnectionError(f"Service IA indisponible: {str(e)}")
\ No newline at end of file
+
+        raise ConnectionError(f"Service IA indisponible: {str(e)}")
+
+
+async def achat_completion(messages: List[Dict[str, str]], model: str = None,
+                           temperature: float = 0.1, max_tokens: int = 2048,
+                           timeout: Optional[float] = None,
+                           cache_site: Optional[str] = None) -> str:
+    """Équivalent asynchrone de chat_completion (même cache, même clé)"""
+    model = model or LLM_DEFAULT_MODEL
+    cache = get_llm_cache() if cache_site else None
+    cache_key = None
+    if cache:
+        cache_key = LLMResponseCache.make_key(model, temperature, max_tokens, messages)
+        cached = cache.get(cache_site, cache_key)
+        if cached is not None:
+            return cached
+
+    response = await get_async_llm_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout or LLM_TIMEOUT
+    )
+    result = response.choices[0].message.content
+
+    if cache and result and result.strip():
+        cache.set(cache_site, cache_key, result)
+    return result
+
+
+async def aask_llm(prompt: str, cache_site: Optional[str] = None) -> str:
+    """Équivalent asynchrone de ask_llm"""
+    try:
+        result = await achat_completion(
+            [{"role": "user", "content": prompt}],
+            temperature=0.1,
+            max_tokens=2048,
+            cache_site=cache_site
+        )
+        if not result or result.strip() == "":
+            raise ValueError("Réponse vide de l'IA")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"❌ Erreur LLM: {str(e)}")
+        raise ConnectionError(f"Service IA indisponible: {str(e)}")
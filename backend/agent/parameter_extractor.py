@@ -0,0 +1,212 @@
+import re
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Référence familiale détectée / remplacée par {family_relation}
+FAMILY_DETECTION_PATTERNS = [
+    r'\b(?:mon|ma|mes)\s+(enfant|fille|fils|enfants|enfnt|fill|fil|garçon|garcon|file)\b',
+    r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(enfant|fille|fils|enfants)\b',
+    r'\bmon\s+enfant\b',
+    r'\bma\s+fille\b',
+    r'\bmon\s+fils\b',
+    r'\bmes\s+enfants\b'
+]
+FAMILY_REPLACEMENT_PATTERNS = [
+    r'\b(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b',
+    r'\b(?:de|du|d\')\s*(?:mon|ma|mes)\s+(?:enfant|fille|fils|enfants)\b'
+]
+
+# Slot typé trouvé par le scan : type, rang du motif dans sa liste, position et texte
+Slot = namedtuple('Slot', ['type', 'index', 'start', 'end', 'text'])
+
+
+class ParameterExtractor:
+    """
+    Extraction des paramètres d'une question parent en un seul passage.
+    Une regex unique à groupes nommés (un groupe par motif, insensible à la casse par groupe)
+    repère tous les slots typés ; seules les étapes dont un slot a été trouvé sont ensuite
+    appliquées, avec des motifs précompilés et les mêmes règles de priorité que
+    CacheManager1._extract_parameters_legacy (résultat identique, donc mêmes clés de cache).
+    """
+
+    # Types de slots repérés par le scan, dans l'ordre historique des étapes
+    SCANNED_SLOTS = ['family', 'matiere', 'evaluation', 'jour']
+
+    def __init__(self, matiere_patterns: List[str], evaluation_patterns: List[str],
+                 trimestre_mapping: Dict[str, int], auto_patterns: Dict[str, str],
+                 jour_patterns: List[str], jour_mapping: Dict[str, object],
+                 normalize_evaluation: Callable[[str], str],
+                 is_id_number: Callable[[str, int, str], bool]):
+        self.trimestre_mapping = trimestre_mapping
+        self.jour_mapping = jour_mapping
+        self.normalize_evaluation = normalize_evaluation
+        self.is_id_number = is_id_number
+
+        self.patterns = {
+            'family': FAMILY_DETECTION_PATTERNS,
+            'matiere': matiere_patterns,
+            'evaluation': evaluation_patterns,
+            'jour': jour_patterns,
+        }
+        self.compiled = {
+            slot: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for slot, patterns in self.patterns.items()
+        }
+        self.family_replacements = [re.compile(p, re.IGNORECASE) for p in FAMILY_REPLACEMENT_PATTERNS]
+        self.auto_patterns = [(re.compile(pattern), param_type) for pattern, param_type in auto_patterns.items()]
+        self.number_pattern = re.compile(r'\b(\d{4,})\b')
+        self.quoted_pattern = re.compile(r"['\"]([^'\"]+)['\"]")
+        self.whitespace = re.compile(r'\s+')
+
+        # Regex combinée : (?P<family_0>...)|(?P<matiere_0>...)|...
+        # Si tous les motifs commencent sur un début de mot, le garde (?=\w)\b écarte
+        # les autres positions avant d'essayer les alternatives.
+        self._group_slots = {}
+        alternatives = []
+        for slot in self.SCANNED_SLOTS:
+            for index, pattern in enumerate(self.patterns[slot]):
+                name = f"{slot}_{index}"
+                self._group_slots[name] = (slot, index)
+                alternatives.append((name, pattern))
+        guard = r'(?=\w)\b' if all(pattern.startswith(r'\b') for _, pattern in alternatives) else ''
+        # Chemin rapide : texte et motifs en minuscules, sans IGNORECASE (bien plus lent en Unicode)
+        self.scanner = re.compile(guard + '(?:' + '|'.join(
+            f"(?P<{name}>{self._lowercase_literals(pattern)})" for name, pattern in alternatives
+        ) + ')')
+        # Repli si la mise en minuscules change la longueur du texte (positions décalées)
+        self.scanner_ignorecase = re.compile(guard + '(?:' + '|'.join(
+            f"(?P<{name}>{pattern})" for name, pattern in alternatives
+        ) + ')', re.IGNORECASE)
+
+    @staticmethod
+    def _lowercase_literals(pattern: str) -> str:
+        """Met en minuscules les lettres littérales d'un motif (les séquences \\X sont conservées)"""
+        return re.sub(r'\\.|[^\\]+', lambda m: m.group(0) if m.group(0).startswith('\\') else m.group(0).lower(),
+                      pattern)
+
+    # ================================
+    # SCAN
+    # ================================
+
+    def scan(self, text: str) -> List[Slot]:
+        """Slots typés de la question (un seul passage de la regex combinée)"""
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            matches = self.scanner.finditer(lowered)
+        else:
+            matches = self.scanner_ignorecase.finditer(text)
+        slots = []
+        for match in matches:
+            slot, index = self._group_slots[match.lastgroup]
+            slots.append(Slot(slot, index, match.start(), match.end(), text[match.start():match.end()]))
+        return slots
+
+    def _first_matching(self, slot: str, found: List[int], text: str) -> Optional[Tuple[int, 're.Match']]:
+        """
+        Premier motif (dans l'ordre de la liste) qui correspond au texte, comme la boucle historique.
+        Le scan donne le rang minimal trouvé ; les motifs de rang inférieur sont revérifiés
+        au cas où leur correspondance aurait été masquée par un slot chevauchant.
+        """
+        best = min(found)
+        for index in range(best + 1):
+            match = self.compiled[slot][index].search(text)
+            if match:
+                return index, match
+        return None
+
+    # ================================
+    # EXTRACTION
+    # ================================
+
+    def extract(self, text: str) -> Tuple[str, Dict[str, str]]:
+        """Retourne (question normalisée avec {placeholders}, variables)"""
+        normalized, variables, _slots = self.extract_with_slots(text)
+        return normalized, variables
+
+    def extract_with_slots(self, text: str) -> Tuple[str, Dict[str, str], List[Slot]]:
+        """Comme extract, avec en plus les slots typés trouvés par le scan"""
+        variables = {}
+        normalized = text
+
+        slots = self.scan(text)
+        found: Dict[str, List[int]] = {}
+        for slot in slots:
+            found.setdefault(slot.type, []).append(slot.index)
+
+        # 1. Références familiales
+        if 'family' in found:
+            for pattern in self.family_replacements:
+                normalized = pattern.sub('{family_relation}', normalized)
+            variables['id_personne'] = 'id_personne'
+
+        # 2. Matières
+        if 'matiere' in found:
+            first = self._first_matching('matiere', found['matiere'], normalized)
+            if first:
+                index, match = first
+                normalized = self.compiled['matiere'][index].sub('{matiere}', normalized)
+                variables['matiere'] = match.group(0).lower()
+
+        # 3. Types d'évaluations
+        if 'evaluation' in found:
+            first = self._first_matching('evaluation', found['evaluation'], normalized)
+            if first:
+                index, match = first
+                normalized = self.compiled['evaluation'][index].sub('{type_evaluation}', normalized)
+                variables['type_evaluation'] = self.normalize_evaluation(match.group(0))
+
+        # 4. Trimestres (tous les libellés contiennent « trimestre »)
+        lowered = normalized.lower()
+        if 'trimestre' in lowered:
+            for term, code in self.trimestre_mapping.items():
+                if term in lowered:
+                    normalized = normalized.replace(term, "{codeperiexam}")
+                    variables["codeperiexam"] = str(code)
+                    break
+
+        # 5. Motifs structurés (sensibles à la casse)
+        for pattern, param_type in self.auto_patterns:
+            for match in reversed(list(pattern.finditer(normalized))):
+                full_match = match.group(0)
+                if param_type == 'NomPrenom':
+                    nom, prenom = match.groups()
+                    normalized = normalized.replace(full_match, "{NomFr} {PrenomFr}")
+                    variables.update({"NomFr": nom, "PrenomFr": prenom})
+                else:
+                    value = match.group(1) if len(match.groups()) > 0 else full_match
+                    normalized = normalized.replace(full_match, f"{{{param_type}}}")
+                    variables[param_type] = value
+
+        # 6. Jours : premier motif dont la valeur est un jour connu
+        if 'jour' in found:
+            for pattern in self.compiled['jour']:
+                match = pattern.search(normalized)
+                if match:
+                    jour_found = match.group(1).lower()
+                    if jour_found in self.jour_mapping:
+                        normalized = pattern.sub('{jour}', normalized)
+                        variables['jour'] = jour_found.capitalize()
+                        break
+
+        # 7. Nombres isolés (identifiants probables)
+        for match in reversed(list(self.number_pattern.finditer(normalized))):
+            number = match.group(1)
+            if self.is_id_number(normalized, match.start(), number):
+                normalized = normalized.replace(number, '{IDPersonne}')
+                variables['IDPersonne'] = number
+
+        # 8. Valeurs entre quotes
+        if "'" in normalized or '"' in normalized:
+            for val in self.quoted_pattern.findall(normalized):
+                if val not in variables.values():
+                    if val.isupper() and len(val.split()) == 1:
+                        param_name = "NomFr" if "nom" in normalized.lower() else "Valeur"
+                        normalized = normalized.replace(f"'{val}'", f"'{{{param_name}}}'")
+                        variables[param_name] = val
+
+        return normalized, variables, slots
+
+    def normalize_template(self, text: str) -> str:
+        """Question normalisée pour la recherche de similarité"""
+        normalized, _ = self.extract(text)
+        return self.whitespace.sub(' ', normalized).lower().strip()
@@ -0,0 +1,324 @@
+import os
+import re
+import logging
+import threading
+import unicodedata
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import tiktoken
+from langchain.prompts import PromptTemplate
+
+from agent.llm_utils import LLM_DEFAULT_MODEL
+from agent.prompts.templates import STATIC_PREFIXES
+from config.schema_catalog import get_schema_catalog
+
+logger = logging.getLogger(__name__)
+
+# Budget total (en tokens) du prompt de génération SQL, par rôle
+PROMPT_TOKEN_BUDGETS = {
+    "admin": int(os.getenv("PROMPT_TOKEN_BUDGET_ADMIN", "9000")),
+    "parent": int(os.getenv("PROMPT_TOKEN_BUDGET_PARENT", "9000")),
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET_DEFAULT", "9000"))
+# Place minimale réservée au schéma, même si les règles fixes dépassent le budget
+PROMPT_MIN_SCHEMA_TOKENS = int(os.getenv("PROMPT_MIN_SCHEMA_TOKENS", "600"))
+# Nombre de tables « pivots » retenues et profondeur maximale d'un chemin de jointure
+PROMPT_MAX_SEED_TABLES = int(os.getenv("PROMPT_MAX_SEED_TABLES", "6"))
+PROMPT_JOIN_MAX_DEPTH = int(os.getenv("PROMPT_JOIN_MAX_DEPTH", "3"))
+# Colonnes gardées pour une table sans colonne pertinente (en plus des clés)
+PROMPT_FALLBACK_COLUMNS = int(os.getenv("PROMPT_FALLBACK_COLUMNS", "4"))
+
+# Mots de la question sans intérêt pour le choix des tables
+STOP_WORDS = {
+    'les', 'des', 'une', 'pour', 'par', 'dans', 'avec', 'sur', 'sans', 'qui', 'que', 'quoi',
+    'quel', 'quels', 'quelle', 'quelles', 'est', 'sont', 'ont', 'liste', 'lister', 'donne',
+    'donner', 'moi', 'nombre', 'combien', 'total', 'tous', 'toutes', 'tout', 'chaque', 'afficher',
+    'affiche', 'montre', 'cette', 'ces', 'mon', 'mes', 'son', 'ses', 'leur', 'leurs', 'annee',
+    'entre', 'plus', 'moins', 'aux', 'fait', 'faire', 'quand', 'comment', 'elle', 'ils',
+}
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Encodage tiktoken du modèle (None si indisponible, ex: fichiers BPE non téléchargeables)"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    _encoding = tiktoken.encoding_for_model(LLM_DEFAULT_MODEL)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning(f"⚠️ Tokenizer indisponible, estimation approchée des tokens: {e}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens d'un texte (≈ 4 caractères par token si tiktoken est indisponible)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PromptBuilder:
+    """
+    Assemblage des prompts de génération SQL sous budget de tokens.
+    Les tables candidates (issues des domaines) sont classées selon leur pertinence
+    pour la question ; seules les tables pivots, les tables nécessaires aux jointures
+    (graphe des clés étrangères) et les colonnes utiles sont conservées.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = budgets or PROMPT_TOKEN_BUDGETS
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._totals = {"prompts": 0, "tokens": 0, "max_tokens": 0, "pruned": 0, "over_budget": 0,
+                        "prefix_mismatch": 0}
+        self._prefix_tokens: Dict[str, int] = {}
+
+    # ================================
+    # ASSEMBLAGE
+    # ================================
+
+    def build(self, template: PromptTemplate, role: str, question: str,
+              candidate_tables: Optional[List[str]] = None, **fields) -> str:
+        """
+        Formate le template en remplissant {table_info} avec un schéma réduit au budget du rôle.
+        candidate_tables=None signifie « tout le schéma ».
+        """
+        budget = self.budgets.get(role, DEFAULT_PROMPT_TOKEN_BUDGET)
+        fixed_tokens = count_tokens(template.format(table_info="", **fields))
+        schema_budget = max(PROMPT_MIN_SCHEMA_TOKENS, budget - fixed_tokens)
+
+        table_info, schema_stats = self.select_table_info(question, candidate_tables, schema_budget)
+        prompt = template.format(table_info=table_info, **fields)
+
+        stats = dict(schema_stats, role=role, budget=budget, fixed_tokens=fixed_tokens,
+                     prompt_tokens=count_tokens(prompt), prefix_tokens=self._prefix_size(role, prompt))
+        self._record(stats)
+        logger.info(
+            f"📏 Prompt {role}: {stats['prompt_tokens']} tokens (budget {budget}, règles {fixed_tokens}, "
+            f"schéma {stats['schema_tokens']}, préfixe statique {stats['prefix_tokens']}) "
+            f"| tables {stats['tables_kept']}/{stats['tables_candidate']}"
+        )
+        return prompt
+
+    def select_table_info(self, question: str, candidate_tables: Optional[List[str]],
+                          budget: int) -> Tuple[str, Dict[str, Any]]:
+        """Retourne (table_info, statistiques) tenant dans le budget de tokens donné"""
+        catalog = get_schema_catalog()
+        catalog.refresh()
+
+        if candidate_tables is None:
+            candidates = list(catalog.columns.keys())
+        else:
+            candidates = []
+            for table in candidate_tables:
+                resolved = catalog.resolve_table(table)
+                if resolved and resolved not in candidates:
+                    candidates.append(resolved)
+
+        terms = self._question_terms(question)
+        scores = {table: self._table_score(catalog, table, terms) for table in candidates}
+        ranked = sorted(candidates, key=lambda t: (-scores[t], t))
+
+        candidate_seeds = [table for table in ranked if scores[table] > 0][:PROMPT_MAX_SEED_TABLES]
+
+        # 1) tables en version réduite
+        pruned: Dict[str, str] = {}
+        costs: Dict[str, int] = {}
+
+        def cost(table: str) -> int:
+            if table not in costs:
+                pruned[table] = catalog.render_table(table, self._relevant_columns(catalog, table, terms))
+                costs[table] = count_tokens(pruned[table]) + 1
+            return costs[table]
+
+        # Chaque table pivot entre avec les tables de jointure qui la relient aux précédentes,
+        # par pertinence décroissante ; une table pivot qui ne tient pas est retirée avec son chemin
+        seeds: List[str] = []
+        join_tables: List[str] = []
+        used = 0
+        for seed in candidate_seeds:
+            if seed in join_tables:
+                # Déjà sur le chemin d'une table plus pertinente : sans coût supplémentaire
+                seeds.append(seed)
+                continue
+            path = self._path_to(catalog, seed, set(seeds) | set(join_tables)) if seeds else []
+            group_cost = cost(seed) + sum(cost(t) for t in path)
+            if seeds and used + group_cost > budget:
+                continue
+            seeds.append(seed)
+            join_tables.extend(path)
+            used += group_cost
+        join_tables = [t for t in join_tables if t not in seeds]
+        selected = seeds + join_tables
+
+        # Sans table pivot, on garde l'ordre des candidats dans la limite du budget
+        if not selected:
+            selected = ranked
+            while len(selected) > 1 and sum(cost(t) for t in selected) > budget:
+                selected = selected[:-1]
+            for table in selected:
+                cost(table)
+            used = sum(costs[t] for t in selected)
+
+        # 2) les tables pivots repassent en version complète tant que le budget le permet
+        rendered = {table: pruned[table] for table in selected}
+        for table in seeds:
+            if table not in rendered:
+                continue
+            full = catalog.snippets.get(table, "")
+            extra = count_tokens(full) + 1 - costs[table]
+            if extra > 0 and used + extra <= budget:
+                rendered[table] = full
+                used += extra
+
+        table_info = "\n\n".join(rendered[t] for t in selected) if selected else "Aucune table trouvée"
+        stats = {
+            "tables_candidate": len(candidates),
+            "tables_kept": len(selected),
+            "join_tables": join_tables,
+            "pruned": len(selected) < len(candidates) or any(rendered[t] != catalog.snippets.get(t) for t in selected),
+            "schema_tokens": count_tokens(table_info),
+            "schema_budget": budget,
+        }
+        return table_info, stats
+
+    def _prefix_size(self, role: str, prompt: str) -> int:
+        """Taille du préfixe statique (réutilisable par le cache de préfixe du fournisseur), 0 si absent"""
+        prefix = STATIC_PREFIXES.get(role)
+        if prefix is None:
+            return 0
+        if not prompt.startswith(prefix):
+            logger.error(f"❌ Le prompt {role} ne commence pas par son préfixe statique (cache de préfixe perdu)")
+            with self._stats_lock:
+                self._totals["prefix_mismatch"] += 1
+            return 0
+        if role not in self._prefix_tokens:
+            self._prefix_tokens[role] = count_tokens(prefix)
+        return self._prefix_tokens[role]
+
+    # ================================
+    # PERTINENCE
+    # ================================
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        text = unicodedata.normalize('NFKD', text.lower())
+        return ''.join(c for c in text if not unicodedata.combining(c))
+
+    def _question_terms(self, question: str) -> Set[str]:
+        """Mots significatifs de la question, sans accents ni pluriel"""
+        terms = set()
+        for word in re.findall(r'[a-z0-9]+', self._normalize(question)):
+            if len(word) < 3 or word in STOP_WORDS or word.isdigit():
+                continue
+            if len(word) > 4 and word[-1] in 'sx':
+                word = word[:-1]
+            terms.add(word)
+        return terms
+
+    @staticmethod
+    def _name_matches(name: str, terms: Set[str]) -> int:
+        name = name.lower()
+        return sum(1 for term in terms if term in name or (len(name) >= 4 and name in term))
+
+    def _table_score(self, catalog, table: str, terms: Set[str]) -> float:
+        """Nom de table cité : 3 points ; chaque colonne citée : 1 point"""
+        if not terms:
+            return 0.0
+        score = 3.0 * self._name_matches(table, terms)
+        score += sum(self._name_matches(column['name'], terms) for column in catalog.columns.get(table, []))
+        return score
+
+    def _relevant_columns(self, catalog, table: str, terms: Set[str]) -> List[str]:
+        """Clés primaires/étrangères + colonnes citées dans la question"""
+        table_columns = catalog.columns.get(table, [])
+        keys = [c['name'] for c in table_columns
+                if c['key'] in ('PRI', 'MUL', 'UNI') or (table, c['name']) in catalog.references]
+        matched = [c['name'] for c in table_columns if self._name_matches(c['name'], terms)]
+        columns = keys + [name for name in matched if name not in keys]
+        if len(columns) <= len(keys):
+            columns += [c['name'] for c in table_columns if c['name'] not in columns][:PROMPT_FALLBACK_COLUMNS]
+        return columns
+
+    @staticmethod
+    def _path_to(catalog, seed: str, connected: Set[str]) -> List[str]:
+        """
+        Tables intermédiaires du plus court chemin (BFS sur les clés étrangères) reliant seed
+        aux tables déjà retenues ; [] si seed y est directement reliée ou si aucun chemin n'existe.
+        """
+        if seed in connected:
+            return []
+        parents = {seed: None}
+        queue = deque([(seed, 0)])
+        found = None
+        while queue:
+            table, depth = queue.popleft()
+            if table in connected:
+                found = table
+                break
+            if depth >= PROMPT_JOIN_MAX_DEPTH:
+                continue
+            for neighbor in sorted(catalog.neighbors.get(table, ())):
+                if neighbor not in parents:
+                    parents[neighbor] = table
+                    queue.append((neighbor, depth + 1))
+
+        # Remontée du chemin trouvé ; une table pivot reste retenue même sans chemin
+        path: List[str] = []
+        node = parents.get(found) if found else None
+        while node is not None and node != seed:
+            path.append(node)
+            node = parents[node]
+        return path
+
+    # ================================
+    # STATISTIQUES
+    # ================================
+
+    def _record(self, stats: Dict[str, Any]):
+        self._local.last_stats = stats
+        with self._stats_lock:
+            self._totals["prompts"] += 1
+            self._totals["tokens"] += stats["prompt_tokens"]
+            self._totals["max_tokens"] = max(self._totals["max_tokens"], stats["prompt_tokens"])
+            self._totals["pruned"] += int(stats["pruned"])
+            self._totals["over_budget"] += int(stats["prompt_tokens"] > stats["budget"])
+
+    @property
+    def last_stats(self) -> Optional[Dict[str, Any]]:
+        """Statistiques du dernier prompt construit par le thread courant"""
+        return getattr(self._local, "last_stats", None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            totals = dict(self._totals)
+        totals["avg_tokens"] = round(totals["tokens"] / totals["prompts"]) if totals["prompts"] else 0
+        totals["budgets"] = dict(self.budgets)
+        return totals
+
+
+_builder: Optional[PromptBuilder] = None
+_builder_lock = threading.Lock()
+
+
+def get_prompt_builder() -> PromptBuilder:
+    """Constructeur de prompts partagé par tout le processus"""
+    global _builder
+    if _builder is None:
+        with _builder_lock:
+            if _builder is None:
+                _builder = PromptBuilder()
+    return _builder
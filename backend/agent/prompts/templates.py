@@ -1,9 +1,11 @@
 from langchain.prompts import PromptTemplate
 
-# Template pour les super admins (accès complet)
-ADMIN_PROMPT_TEMPLATE = PromptTemplate(
-    input_variables=["input", "table_info", "relevant_domain_descriptions"],
-    template=f"""
+# Les prompts de génération SQL sont découpés en un préfixe statique (règles, exemples,
+# instructions) identique octet pour octet d'une requête à l'autre, suivi des parties
+# variables (schéma, domaines, contexte parent, question). Le fournisseur peut ainsi
+# réutiliser son cache de préfixe. Le préfixe ne doit contenir aucune variable ni accolade.
+
+ADMIN_STATIC_PREFIX = """
 [SYSTEM] Vous êtes un assistant SQL expert pour une base de données scolaire.
 
 RÈGLES STRICTES DE GÉNÉRATION SQL:
@@ -105,26 +107,32 @@ INSCRIPTION ET PREINSCRIPTIONS:
 **la décision d'acceptation consernent seulement les nouveaux eleves inscrits a l'ecole.
 ** on applique le filtre annuler=0 pour calculer le nombre des eleves par délégation , par localité ...  
 
-
-
-Voici la structure détaillée des tables pertinentes pour votre tâche (nom des tables, colonnes et leurs types) :
-{{table_info}}
-
----
-**Description des domaines pertinents pour cette question :**
-{{relevant_domain_descriptions}}
-
----
 **Instructions pour la génération SQL :**
 1.  Répondez UNIQUEMENT par une requête SQL MySQL valide et correcte.
 2.  Ne mettez AUCUN texte explicatif ou commentaire avant ou après la requête SQL. La réponse doit être purement la requête.
 3.  **Sécurité :** Générez des requêtes `SELECT` uniquement. Ne générez **JAMAIS** de requêtes `INSERT`, `UPDATE`, `DELETE`, `DROP`, `ALTER`, `TRUNCATE` ou toute autre commande de modification/suppression de données.
 4.  **Gestion de l'Année Scolaire :** Si l'utilisateur mentionne une année au format 'YYYY-YYYY' (ex: '2023-2024'), interprétez-la comme équivalente à 'YYYY/YYYY' et utilisez ce format pour la comparaison sur la colonne `Annee` de `anneescolaire` ou pour trouver l'ID correspondant.
 5.  **Robustesse aux Erreurs et Synonymes :** Le modèle doit être tolérant aux petites fautes de frappe et aux variations de langage. Il doit s'efforcer de comprendre l'intention de l'utilisateur même si les termes ne correspondent pas exactement aux noms de colonnes ou de tables. Par exemple, "eleves" ou "étudiants" devraient être mappés à la table `eleve`. "Moyenne" ou "résultat" devraient faire référence à `dossierscolaire.moyenne_general` ou `edumoymati`.
+"""
 
-Question : {{input}}
+ADMIN_VARIABLE_SUFFIX = """
+---
+Voici la structure détaillée des tables pertinentes pour votre tâche (nom des tables, colonnes et leurs types) :
+{table_info}
+
+---
+**Description des domaines pertinents pour cette question :**
+{relevant_domain_descriptions}
+
+---
+Question : {input}
 Requête SQL :
 """
+
+# Template pour les super admins (accès complet)
+ADMIN_PROMPT_TEMPLATE = PromptTemplate(
+    input_variables=["input", "table_info", "relevant_domain_descriptions"],
+    template=ADMIN_STATIC_PREFIX + ADMIN_VARIABLE_SUFFIX
 )
 # Template pour les admins (accès étendu)
 ADMIN_EXTENDED_PROMPT_TEMPLATE = PromptTemplate(
@@ -172,40 +180,37 @@ Requête SQL :
 """
 )
 
-# Template pour les parents (accès restreint aux enfants)
-PARENT_PROMPT_TEMPLATE = PromptTemplate(
-    input_variables=["input", "table_info", "relevant_domain_descriptions", "user_id", "children_ids","children_names"],
-    template=f"""
+PARENT_STATIC_PREFIX = """
 [SYSTEM] Vous êtes un assistant SQL expert pour une base de données scolaire.
 Votre rôle est de traduire des questions en français en requêtes SQL MySQL.
 ACCÈS: PARENT - Accès limité aux données de vos enfants uniquement.
 
 RESTRICTIONS DE SÉCURITÉ:
 
-- VOUS NE POUVEZ ACCÉDER QU'AUX DONNÉES DES ÉLÈVES AVEC LES IDs: {{children_ids}}
-- VOTRE ID PARENT EST: {{user_id}}
-- LES NOMS DES ENFANTS DE CE PARENT SONT: {{children_names}}
+- VOUS NE POUVEZ ACCÉDER QU'AUX DONNÉES DES ÉLÈVES DONT LES IDs SONT DONNÉS DANS LE CONTEXTE PARENT (children_ids)
+- VOTRE ID PARENT EST DONNÉ DANS LE CONTEXTE PARENT (user_id)
+- LES NOMS DES ENFANTS DE CE PARENT SONT DONNÉS DANS LE CONTEXTE PARENT (children_names)
 - TOUTE REQUÊTE DOIT INCLURE UN FILTRE SUR CES IDs D'ÉLÈVES
 - VOUS NE POUVEZ PAS VOIR LES DONNÉES D'AUTRES ÉLÈVES OU PARENTS
 -VOUS NE POUVEZ PAS DEMANDE L'ATTESTATION
 
 🎯 CONTEXTE ENFANT:
-- Si {{children_ids}} contient UN SEUL ID: filtrez UNIQUEMENT pour cet enfant spécifique
-- Si {{children_ids}} contient PLUSIEURS IDs: la question a déjà été clarifiée en amont
-- Si un PRÉNOM SPÉCIFIQUE est mentionné dans {{children_names}}, ajoutez: AND personne.PrenomFr = '[PRÉNOM]'
+- Si children_ids contient UN SEUL ID: filtrez UNIQUEMENT pour cet enfant spécifique
+- Si children_ids contient PLUSIEURS IDs: la question a déjà été clarifiée en amont
+- Si un PRÉNOM SPÉCIFIQUE est mentionné dans children_names, ajoutez: AND personne.PrenomFr = '[PRÉNOM]'
 
 FILTRES OBLIGATOIRES À APPLIQUER:
-- Pour UN enfant: WHERE e.IdPersonne = {{children_ids}} (utiliser = au lieu de IN)
-- Pour PLUSIEURS enfants: WHERE e.IdPersonne IN ({{children_ids}})
-- Pour les inscriptions: WHERE ie.Eleve = (SELECT id FROM eleve WHERE IdPersonne = {{children_ids}}) [UN enfant]
-- Pour les inscriptions: WHERE ie.Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ({{children_ids}})) [PLUSIEURS enfants]
-- Pour les résultats: WHERE ed.idenelev = (SELECT idedusrv FROM eleve WHERE IdPersonne = {{children_ids}}) [UN enfant]
-- Pour les résultats: WHERE ed.idenelev IN (SELECT idedusrv FROM eleve WHERE IdPersonne IN ({{children_ids}})) [PLUSIEURS enfants]
+- Pour UN enfant: WHERE e.IdPersonne = [children_ids] (utiliser = au lieu de IN)
+- Pour PLUSIEURS enfants: WHERE e.IdPersonne IN ([children_ids])
+- Pour les inscriptions: WHERE ie.Eleve = (SELECT id FROM eleve WHERE IdPersonne = [children_ids]) [UN enfant]
+- Pour les inscriptions: WHERE ie.Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ([children_ids])) [PLUSIEURS enfants]
+- Pour les résultats: WHERE ed.idenelev = (SELECT idedusrv FROM eleve WHERE IdPersonne = [children_ids]) [UN enfant]
+- Pour les résultats: WHERE ed.idenelev IN (SELECT idedusrv FROM eleve WHERE IdPersonne IN ([children_ids])) [PLUSIEURS enfants]
 
 🚨 RÈGLES DE GÉNÉRATION SQL:
-1. Si {{children_ids}} est un seul nombre (ex: "7012"): utilisez = au lieu de IN
-2. Si {{children_ids}} contient plusieurs nombres (ex: "7012,7716"): utilisez IN
-3. TOUJOURS filtrer par l'ID/les IDs fourni(s) dans {{children_ids}}
+1. Si children_ids est un seul nombre (ex: "7012"): utilisez = au lieu de IN
+2. Si children_ids contient plusieurs nombres (ex: "7012,7716"): utilisez IN
+3. TOUJOURS filtrer par l'ID/les IDs fourni(s) dans children_ids
 4. NE JAMAIS générer de requête qui retourne des données d'autres élèves
 
 EXEMPLES DE FILTRES CORRECTS:
@@ -260,10 +265,10 @@ POUR L'EMPLOI DU TEMPS:
      jour j ON e.Jour = j.id AND j.libelleJourFr = 'Mercredi'
 JOIN
      classe c ON e.Classe = c.id AND c.CODECLASSEFR = '7B2'
-** lorsque on veut savoir l id de l'eleve :  eleve.Idpersonne = {{children_ids}} [UN enfant] OU eleve.Idpersonne IN ({{children_ids}}) [PLUSIEURS]
+** lorsque on veut savoir l id de l'eleve :  eleve.Idpersonne = [children_ids] [UN enfant] OU eleve.Idpersonne IN ([children_ids]) [PLUSIEURS]
 ** lorsque on veut chercher la classe de l'eleve on fait : 
-   - UN enfant: idClasse = (SELECT id FROM classe WHERE id = (SELECT Classe FROM inscriptioneleve WHERE Eleve = (SELECT id FROM eleve WHERE IdPersonne = {{children_ids}})))
-   - PLUSIEURS: idClasse IN (SELECT id FROM classe WHERE id IN (SELECT Classe FROM inscriptioneleve WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ({{children_ids}}))))
+   - UN enfant: idClasse = (SELECT id FROM classe WHERE id = (SELECT Classe FROM inscriptioneleve WHERE Eleve = (SELECT id FROM eleve WHERE IdPersonne = [children_ids])))
+   - PLUSIEURS: idClasse IN (SELECT id FROM classe WHERE id IN (SELECT Classe FROM inscriptioneleve WHERE Eleve IN (SELECT id FROM eleve WHERE IdPersonne IN ([children_ids]))))
 ** le nom de matière dans la table edumatiere est libematifr non pas NomMatiereFr .
 ** la matière mathématique s'appelle Maths dans la table matiere. 
 
@@ -288,25 +293,44 @@ WHERE n.id_inscription = (
     )
 );
 
-Voici la structure détaillée des tables pertinentes pour votre tâche (nom des tables, colonnes et leurs types) :
-{{table_info}}
-
----
-**Description des domaines pertinents pour cette question :**
-{{relevant_domain_descriptions}}
-
----
 **Instructions pour la génération SQL :**
 1.  Répondez UNIQUEMENT par une requête SQL MySQL valide et correcte.
 2.  Ne mettez AUCUN texte explicatif ou commentaire avant ou après la requête SQL. La réponse doit être purement la requête.
 3.  **Sécurité :** Générez des requêtes `SELECT` uniquement. Ne générez **JAMAIS** de requêtes `INSERT`, `UPDATE`, `DELETE`, `DROP`, `ALTER`, `TRUNCATE` ou toute autre commande de modification/suppression de données.
-4.  **SÉCURITÉ PARENT:** TOUTE REQUÊTE DOIT INCLURE UN FILTRE LIMITANT AUX ENFANTS AUTORISÉS ({{children_ids}})
+4.  **SÉCURITÉ PARENT:** TOUTE REQUÊTE DOIT INCLURE UN FILTRE LIMITANT AUX ENFANTS AUTORISÉS (children_ids du CONTEXTE PARENT)
 5.  **UN vs PLUSIEURS ENFANTS:** Utilisez = pour un seul enfant, IN pour plusieurs enfants
 6.  **Gestion de l'Année Scolaire :** Si l'utilisateur mentionne une année au format 'YYYY-YYYY' (ex: '2023-2024'), interprétez-la comme équivalente à 'YYYY/YYYY' et utilisez ce format pour la comparaison sur la colonne `Annee` de `anneescolaire` ou pour trouver l'ID correspondant.
 7.  **Robustesse aux Erreurs et Synonymes :** Le modèle doit être tolérant aux petites fautes de frappe et aux variations de langage.
+"""
 
-Question : {{input}}
+PARENT_VARIABLE_SUFFIX = """
+---
+🎯 CONTEXTE PARENT:
+- user_id (ID PARENT): {user_id}
+- children_ids (IDs DES ENFANTS AUTORISÉS): {children_ids}
+- children_names (NOMS DES ENFANTS): {children_names}
+
+---
+Voici la structure détaillée des tables pertinentes pour votre tâche (nom des tables, colonnes et leurs types) :
+{table_info}
+
+---
+**Description des domaines pertinents pour cette question :**
+{relevant_domain_descriptions}
+
+---
+Question : {input}
 Requête SQL :
 """
+
+# Template pour les parents (accès restreint aux enfants)
+PARENT_PROMPT_TEMPLATE = PromptTemplate(
+    input_variables=["input", "table_info", "relevant_domain_descriptions", "user_id", "children_ids","children_names"],
+    template=PARENT_STATIC_PREFIX + PARENT_VARIABLE_SUFFIX
 )
 
+# Préfixe statique de chaque template de génération SQL, par rôle
+STATIC_PREFIXES = {
+    "admin": ADMIN_STATIC_PREFIX,
+    "parent": PARENT_STATIC_PREFIX,
+}
@@ -0,0 +1,96 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from agent.parameter_extractor import ParameterExtractor, Slot
+
+# Demandes de documents officiels (attestations, certificats)
+PDF_REQUEST_PATTERNS = [
+    re.compile(r'attestation\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)', re.IGNORECASE),
+    re.compile(r'certificat\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)', re.IGNORECASE),
+    re.compile(r'document\s+(de\s+|pour\s+)?([A-Za-zÀ-ÿ\s]+)', re.IGNORECASE),
+]
+
+# Mots commençant par une majuscule (prénoms potentiels)
+NAME_PATTERN = re.compile(
+    r'\b[A-ZÀÁÂÃÄÅÆÇÈÉÊËÌÍÎÏÐÑÒÓÔÕÖØÙÚÛÜÝÞŸ][a-zàáâãäåæçèéêëìíîïðñòóôõöøùúûüýþÿ]+'
+)
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def strip_accents(text: str) -> str:
+    """Minuscules sans accents (é -> e, ç -> c)"""
+    text = unicodedata.normalize('NFD', text.lower())
+    return ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+
+
+def detect_pdf_request(question: str) -> Optional[Tuple[str, str]]:
+    """(nom de l'élève, type de document) si la question demande un document officiel"""
+    for pattern in PDF_REQUEST_PATTERNS:
+        match = pattern.search(question)
+        if match:
+            student_name = match.group(2).strip() if match.group(2) else "Étudiant"
+            return student_name, 'attestation'
+    return None
+
+
+@dataclass
+class ParsedQuestion:
+    """
+    Analyse d'une question calculée une seule fois par requête, puis transmise
+    à chaque étape du traitement parent (cache, contexte enfant, noms, contrôle d'accès).
+    """
+    text: str
+    lower: str
+    unaccented: str
+    tokens: List[str]
+    template: str                    # question normalisée du cache parent ({matiere}, {jour}...)
+    variables: Dict[str, str]        # valeurs extraites pour les placeholders du template
+    slots: List[Slot]
+    names: List[str]
+    pdf_request: Optional[Tuple[str, str]] = None
+
+    @property
+    def trimestre(self) -> Optional[str]:
+        return self.variables.get('codeperiexam')
+
+    @property
+    def matiere(self) -> Optional[str]:
+        return self.variables.get('matiere')
+
+    @property
+    def type_evaluation(self) -> Optional[str]:
+        return self.variables.get('type_evaluation')
+
+    @property
+    def jour(self) -> Optional[str]:
+        return self.variables.get('jour')
+
+    @property
+    def similarity_text(self) -> str:
+        """Texte utilisé par l'index de similarité du cache parent"""
+        return WHITESPACE_PATTERN.sub(' ', self.template).lower().strip()
+
+
+class QuestionParser:
+    """Construit le ParsedQuestion d'une question avec l'extracteur du cache parent"""
+
+    def __init__(self, extractor: ParameterExtractor):
+        self.extractor = extractor
+
+    def parse(self, question: str) -> ParsedQuestion:
+        template, variables, slots = self.extractor.extract_with_slots(question)
+        unaccented = strip_accents(question)
+        return ParsedQuestion(
+            text=question,
+            lower=question.lower(),
+            unaccented=unaccented,
+            tokens=TOKEN_PATTERN.findall(unaccented),
+            template=template,
+            variables=variables,
+            slots=slots,
+            names=NAME_PATTERN.findall(question),
+            pdf_request=detect_pdf_request(question)
+        )
@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration du cache des résultats SQL
+SQL_RESULT_CACHE_ENABLED = os.getenv("SQL_RESULT_CACHE_ENABLED", "1") == "1"
+SQL_RESULT_CACHE_MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Un résultat plus gros n'est pas mis en cache (évite de vider le cache pour une seule requête)
+SQL_RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+SQL_RESULT_CACHE_DEFAULT_TTL = int(os.getenv("SQL_RESULT_CACHE_DEFAULT_TTL", "120"))
+
+# TTL par table (secondes), surchargeables via SQL_RESULT_CACHE_TTL_<TABLE> ; 0 = jamais en cache.
+# Le TTL d'une requête est le plus petit TTL des tables qu'elle lit.
+REFERENCE_TABLES = [
+    "section", "edusection", "nationalite", "civilite", "niveau", "eduniveau", "pays", "gouvernorat",
+    "localite", "codepostal", "delegation", "anneescolaire", "jour", "jourfr", "trimestre", "eduperiexam",
+    "typepre", "edutypeepre", "matiere", "edumatiere", "naturematiere", "situationfamilliale", "grade",
+    "qualite", "diplome", "typeetablissement", "etablissement"
+]
+WEEKLY_TABLES = [
+    "classe", "educlasse", "salle", "seance", "semaine", "repartitionsemaine", "viewemploi",
+    "viewemploi_enligne", "groupe", "menu_cantine", "menu_cantine_jour", "matieresection",
+    "viewmatiereenseignant", "viewrepartitionenseignant", "enseingant", "viewenseignant"
+]
+VOLATILE_TABLES = [
+    "edumoymati", "edunoteelev", "noteseleve", "noteeleveview", "noteeleveparmatiere", "eduresultat",
+    "absence", "viewabsence", "retard", "viewretard", "viewgetretard", "viewgetretards",
+    "paiement", "paiementdetailscourete", "paiementextra", "reglementeleve", "caisse", "caissedetails",
+    "cantineparjour", "suivicantineparjour", "viewcantineparjour", "notification_queue", "notifications"
+]
+SQL_RESULT_CACHE_TTLS = {
+    **{table: 24 * 3600 for table in REFERENCE_TABLES},
+    **{table: 3600 for table in WEEKLY_TABLES},
+    **{table: 30 for table in VOLATILE_TABLES},
+}
+
+# Tables lues (FROM a, b / JOIN c) et écrites (INSERT INTO / UPDATE / DELETE FROM / REPLACE INTO)
+FROM_CLAUSE_PATTERN = re.compile(
+    r'\bFROM\s+(.+?)(?=\bWHERE\b|\bJOIN\b|\bLEFT\b|\bRIGHT\b|\bINNER\b|\bCROSS\b|\bNATURAL\b|\bSTRAIGHT_JOIN\b'
+    r'|\bGROUP\b|\bORDER\b|\bHAVING\b|\bLIMIT\b|\bUNION\b|\bON\b|\bUSING\b|[();]|$)',
+    re.IGNORECASE | re.DOTALL
+)
+JOIN_PATTERN = re.compile(r'\bJOIN\s+([`\w.]+)', re.IGNORECASE)
+WRITE_PATTERN = re.compile(r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+([`\w.]+)',
+                           re.IGNORECASE)
+READ_PATTERN = re.compile(r'^\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+# Résultats non reproductibles : jamais en cache
+NON_DETERMINISTIC_PATTERN = re.compile(r'\b(?:RAND|UUID|UUID_SHORT|SLEEP|CONNECTION_ID|LAST_INSERT_ID)\s*\(',
+                                       re.IGNORECASE)
+# Résultats dépendant de l'heure : TTL plafonné au TTL par défaut
+TIME_DEPENDENT_PATTERN = re.compile(r'\b(?:NOW|CURDATE|CURTIME|SYSDATE|CURRENT_DATE|CURRENT_TIME|'
+                                    r'CURRENT_TIMESTAMP|UNIX_TIMESTAMP|UTC_DATE|UTC_TIMESTAMP)\b', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_]\w*$')
+
+
+def _table_name(reference: str) -> Optional[str]:
+    """Nom de table sans quotes ni préfixe de base (`ecole`.`eleve` -> eleve)"""
+    name = reference.replace('`', '').split('.')[-1].strip().lower()
+    return name if IDENTIFIER_PATTERN.match(name) else None
+
+
+def tables_read(sql: str) -> Set[str]:
+    """Tables lues par une requête (sous-requêtes comprises)"""
+    tables = set()
+    for clause in FROM_CLAUSE_PATTERN.findall(sql):
+        for part in clause.split(','):
+            words = part.split()
+            if words:
+                name = _table_name(words[0])
+                if name:
+                    tables.add(name)
+    for reference in JOIN_PATTERN.findall(sql):
+        name = _table_name(reference)
+        if name:
+            tables.add(name)
+    return tables
+
+
+def tables_written(sql: str) -> Set[str]:
+    """Table modifiée par une requête d'écriture (vide pour une lecture)"""
+    match = WRITE_PATTERN.match(sql)
+    if not match:
+        return set()
+    name = _table_name(match.group(1))
+    return {name} if name else set()
+
+
+class SQLResultCache:
+    """
+    Cache des résultats de requêtes SQL en lecture, clé = hash(SQL normalisé, paramètres liés).
+    Chaque entrée expire selon la table la plus volatile qu'elle lit ; la taille totale
+    (résultats sérialisés en JSON) est bornée en octets avec éviction LRU.
+    Invalider une table supprime toutes les entrées qui la lisent.
+    """
+
+    def __init__(self, max_bytes: int = SQL_RESULT_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = SQL_RESULT_CACHE_MAX_ENTRY_BYTES,
+                 default_ttl: int = SQL_RESULT_CACHE_DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.default_ttl = default_ttl
+        # clé -> (résultat JSON, expiration, tables, taille)
+        self._entries: "OrderedDict[str, Tuple[str, float, Set[str], int]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0,
+                       "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    # ================================
+    # CLÉS ET TTL
+    # ================================
+
+    @staticmethod
+    def make_key(sql: str, params: Optional[Iterable[Any]] = None) -> str:
+        normalized = WHITESPACE_PATTERN.sub(' ', sql).strip().rstrip(';').strip()
+        payload = json.dumps([normalized, list(params or ())], ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def ttl_for_table(self, table: str) -> int:
+        env_ttl = os.getenv(f"SQL_RESULT_CACHE_TTL_{table.upper()}")
+        if env_ttl:
+            return int(env_ttl)
+        return SQL_RESULT_CACHE_TTLS.get(table, self.default_ttl)
+
+    def ttl_for(self, sql: str, tables: Set[str]) -> int:
+        """TTL d'une requête (0 = pas de mise en cache)"""
+        if not tables or not READ_PATTERN.match(sql) or NON_DETERMINISTIC_PATTERN.search(sql):
+            return 0
+        ttl = min(self.ttl_for_table(table) for table in tables)
+        if TIME_DEPENDENT_PATTERN.search(sql):
+            ttl = min(ttl, self.default_ttl)
+        return max(ttl, 0)
+
+    # ================================
+    # LECTURE / ÉCRITURE
+    # ================================
+
+    def get(self, sql: str, params: Optional[Iterable[Any]] = None) -> Optional[List[Dict[str, Any]]]:
+        """Lignes en cache (copie indépendante) ou None ; les requêtes non cacheables ne comptent pas"""
+        if self.ttl_for(sql, tables_read(sql)) <= 0:
+            return None
+        key = self.make_key(sql, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.time():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            payload = entry[0]
+        return json.loads(payload)
+
+    def set(self, sql: str, params: Optional[Iterable[Any]], rows: List[Dict[str, Any]]) -> bool:
+        """Met en cache les lignes d'une requête en lecture ; retourne False si non cacheable"""
+        tables = tables_read(sql)
+        ttl = self.ttl_for(sql, tables)
+        if ttl <= 0:
+            return False
+        try:
+            payload = json.dumps(rows, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            return False
+        size = len(payload.encode('utf-8'))
+        key = self.make_key(sql, params)
+
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._stats["skipped"] += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, time.time() + ttl, tables, size)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+        return True
+
+    def _remove(self, key: str):
+        """Supprime une entrée (verrou déjà pris)"""
+        _payload, _expires_at, tables, size = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    # ================================
+    # INVALIDATION
+    # ================================
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Supprime les entrées lisant l'une des tables ; retourne le nombre d'entrées supprimées"""
+        tables = [table.lower() for table in tables]
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    removed += 1
+            self._stats["invalidations"] += removed
+        if removed:
+            logger.info(f"🧹 {removed} résultat(s) SQL invalidé(s) ({', '.join(tables)})")
+        return removed
+
+    def invalidate_for(self, sql: str) -> int:
+        """Invalide les tables modifiées par une requête d'écriture"""
+        tables = tables_written(sql)
+        return self.invalidate_tables(tables) if tables else 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["tables"] = len(self._by_table)
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_bytes"] = self.max_bytes
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_cache: Optional[SQLResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[SQLResultCache]:
+    """Retourne le cache partagé, ou None si désactivé (SQL_RESULT_CACHE_ENABLED=0)"""
+    global _cache
+    if _cache is None and SQL_RESULT_CACHE_ENABLED:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLResultCache()
+                logger.info(f"✅ Cache des résultats SQL initialisé ({SQL_RESULT_CACHE_MAX_BYTES // (1024 * 1024)} Mo)")
+    return _cache
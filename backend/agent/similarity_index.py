@@ -0,0 +1,239 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+# Taille de l'espace de hachage des mots (collisions négligeables pour des questions courtes)
+SIMILARITY_N_FEATURES = int(os.getenv("SIMILARITY_N_FEATURES", str(2 ** 18)))
+# Recalcul complet de la matrice (IDF à jour) en tâche de fond après ce nombre d'ajouts...
+SIMILARITY_REFIT_ROWS = int(os.getenv("SIMILARITY_REFIT_ROWS", "64"))
+# ... ou quand le plus ancien ajout non intégré a ce nombre de secondes
+SIMILARITY_REFIT_INTERVAL = float(os.getenv("SIMILARITY_REFIT_INTERVAL", "30"))
+
+
+class _Snapshot(NamedTuple):
+    """Matrice TF-IDF normalisée, IDF et poids des requêtes, clé de chaque ligne : figés ensemble"""
+    matrix: sp.csr_matrix
+    idf: np.ndarray
+    query_weights: np.ndarray
+    keys: Tuple[str, ...]
+
+
+class _Pending(NamedTuple):
+    """Lignes ajoutées ou remplacées depuis le dernier recalcul, pondérées avec l'IDF du snapshot"""
+    matrix: Optional[sp.csr_matrix]
+    keys: Tuple[str, ...]
+    terms: np.ndarray  # mots (indices hachés) présents dans ces lignes
+    masked: np.ndarray  # lignes du snapshot remplacées par une ligne en attente
+
+
+_NO_PENDING = _Pending(None, (), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+
+
+class SimilarityIndex:
+    """
+    Index TF-IDF incrémental pour la recherche de templates similaires.
+    Les comptes de mots sont obtenus par hachage (pas de vocabulaire à réapprendre) :
+    un ajout met à jour les fréquences documentaires et pondère la nouvelle ligne avec l'IDF
+    du dernier recalcul ; les recherches combinent la matrice figée et ces lignes en attente.
+    La matrice est recalculée en tâche de fond (SIMILARITY_REFIT_ROWS ajouts ou
+    SIMILARITY_REFIT_INTERVAL secondes) en continuant de servir la précédente.
+    Après recalcul, les pondérations reproduisent TfidfVectorizer (smooth_idf, norme l2, mots inconnus ignorés).
+    """
+
+    def __init__(self, n_features: int = SIMILARITY_N_FEATURES, refit_rows: int = SIMILARITY_REFIT_ROWS,
+                 refit_interval: float = SIMILARITY_REFIT_INTERVAL):
+        self.n_features = n_features
+        self.refit_rows = refit_rows
+        self.refit_interval = refit_interval
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._counts: List[sp.csr_matrix] = []
+        self._df = np.zeros(n_features, dtype=np.float64)
+        self._snapshot: Optional[_Snapshot] = None
+        # Clé -> numéro d'ajout, pour les ajouts non intégrés au snapshot
+        self._pending_keys: Dict[str, int] = {}
+        self._pending = _NO_PENDING
+        self._pending_since: Optional[float] = None
+        self._sequence = 0
+        self._refitting = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # ================================
+    # VECTEURS
+    # ================================
+
+    def encode(self, normalized_text: str) -> sp.csr_matrix:
+        """Comptes de mots hachés d'un texte déjà normalisé (1 x n_features)"""
+        return self.vectorizer.transform([normalized_text]).tocsr()
+
+    @staticmethod
+    def serialize(counts: sp.csr_matrix) -> bytes:
+        """Format compact persistant : indices int32 suivis des comptes float32"""
+        indices = counts.indices.astype(np.int32)
+        values = counts.data.astype(np.float32)
+        return np.int32(len(indices)).tobytes() + indices.tobytes() + values.tobytes()
+
+    def deserialize(self, blob: bytes) -> sp.csr_matrix:
+        size = int(np.frombuffer(blob[:4], dtype=np.int32)[0])
+        indices = np.frombuffer(blob[4:4 + 4 * size], dtype=np.int32)
+        values = np.frombuffer(blob[4 + 4 * size:4 + 8 * size], dtype=np.float32).astype(np.float64)
+        return sp.csr_matrix((values, indices, [0, size]), shape=(1, self.n_features))
+
+    # ================================
+    # MISE À JOUR
+    # ================================
+
+    def add(self, key: str, counts: sp.csr_matrix):
+        """Ajoute ou remplace le vecteur d'une clé (la ligne d'une clé existante est conservée)"""
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._rows[key] = len(self.keys)
+                self.keys.append(key)
+                self._counts.append(counts)
+            else:
+                self._df[self._counts[row].indices] -= 1
+                self._counts[row] = counts
+            self._df[counts.indices] += 1
+            self._sequence += 1
+            self._pending_keys[key] = self._sequence
+            if self._snapshot is None:
+                # Pas encore de matrice (chargement initial) : construite à la première recherche
+                return
+            self._pending_since = self._pending_since or time.monotonic()
+            self._pending = self._build_pending(self._snapshot)
+        self._maybe_refit()
+
+    def row_of(self, key: str) -> Optional[int]:
+        return self._rows.get(key)
+
+    def _build_pending(self, snapshot: _Snapshot) -> _Pending:
+        """Lignes en attente pondérées avec l'IDF du snapshot (au plus refit_rows lignes : coût borné)"""
+        if not self._pending_keys:
+            return _NO_PENDING
+        keys = tuple(self._pending_keys)
+        counts = sp.vstack([self._counts[self._rows[key]] for key in keys], format='csr')
+        rows = [self._rows[key] for key in keys]
+        return _Pending(
+            matrix=normalize(counts.multiply(snapshot.idf).tocsr()),
+            keys=keys,
+            terms=np.unique(counts.indices),
+            masked=np.array([row for row in rows if row < len(snapshot.keys)], dtype=np.int64)
+        )
+
+    def _fit(self) -> Tuple[_Snapshot, int]:
+        """Matrice complète depuis les comptes (O(n)), hors verrou ; retourne aussi le dernier ajout intégré"""
+        with self._lock:
+            counts = list(self._counts)
+            df = self._df.copy()
+            keys = tuple(self.keys)
+            sequence = self._sequence
+        idf = np.log((1 + len(keys)) / (1 + df)) + 1
+        matrix = normalize(sp.vstack(counts, format='csr').multiply(idf).tocsr())
+        # Comme TfidfVectorizer : les mots absents du corpus n'entrent pas dans la norme de la requête
+        return _Snapshot(matrix, idf, idf * (df > 0), keys), sequence
+
+    def _install(self, snapshot: _Snapshot, sequence: int):
+        """Remplace le snapshot ; les ajouts survenus pendant le calcul restent en attente"""
+        with self._lock:
+            self._snapshot = snapshot
+            self._pending_keys = {key: seq for key, seq in self._pending_keys.items() if seq > sequence}
+            self._pending_since = time.monotonic() if self._pending_keys else None
+            self._pending = self._build_pending(snapshot)
+
+    def refit(self):
+        """Recalcul complet immédiat (IDF à jour pour toutes les lignes)"""
+        if self.keys:
+            self._install(*self._fit())
+
+    def _maybe_refit(self):
+        """Lance un recalcul en tâche de fond si assez d'ajouts sont en attente (un seul à la fois)"""
+        with self._lock:
+            due = self._pending_keys and (
+                len(self._pending_keys) >= self.refit_rows
+                or time.monotonic() - (self._pending_since or time.monotonic()) >= self.refit_interval
+            )
+            if not due or self._refitting:
+                return
+            self._refitting = True
+        threading.Thread(target=self._background_refit, name="similarity-refit", daemon=True).start()
+
+    def _background_refit(self):
+        started = time.time()
+        try:
+            self.refit()
+            logger.debug(f"🔁 Index de similarité recalculé ({len(self.keys)} lignes, {time.time() - started:.3f}s)")
+        except Exception as e:
+            logger.warning(f"⚠️ Recalcul de l'index de similarité impossible: {e}")
+        finally:
+            with self._lock:
+                self._refitting = False
+
+    def _current_snapshot(self) -> Tuple[Optional[_Snapshot], _Pending]:
+        """
+        Snapshot et lignes en attente lus ensemble : une recherche reste cohérente même si
+        l'index est modifié pendant son exécution. Seule la première recherche construit la matrice.
+        """
+        with self._lock:
+            snapshot, pending = self._snapshot, self._pending
+        if snapshot is None and self.keys:
+            self.refit()
+            with self._lock:
+                snapshot, pending = self._snapshot, self._pending
+        elif pending.keys:
+            self._maybe_refit()
+        return snapshot, pending
+
+    # ================================
+    # RECHERCHE
+    # ================================
+
+    def search(self, normalized_text: str, k: int = 5, threshold: float = 0.0) -> List[Tuple[str, float]]:
+        """Les k clés les plus proches avec leur score cosinus (> 0 et ≥ threshold), par score décroissant"""
+        snapshot, pending = self._current_snapshot()
+        if snapshot is None or k <= 0:
+            return []
+
+        query = self.encode(normalized_text)
+        weights = snapshot.query_weights[query.indices]
+        if pending.keys:
+            # Mots apparus dans les lignes en attente : pondérés comme dans ces lignes
+            new_terms = np.isin(query.indices, pending.terms)
+            weights[new_terms] = snapshot.idf[query.indices[new_terms]]
+        query = sp.csr_matrix((query.data * weights, query.indices, query.indptr), shape=query.shape)
+        query.eliminate_zeros()
+        if query.nnz == 0:
+            return []
+        query = normalize(query).T
+        similarities = (snapshot.matrix @ query).toarray().ravel()
+        keys = snapshot.keys
+        if pending.keys:
+            similarities[pending.masked] = 0.0
+            similarities = np.concatenate([similarities, (pending.matrix @ query).toarray().ravel()])
+            keys = keys + pending.keys
+
+        if k < len(similarities):
+            rows = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            rows = np.arange(len(similarities))
+        rows = rows[np.argsort(-similarities[rows], kind='stable')]
+        return [(keys[row], float(similarities[row])) for row in rows
+                if similarities[row] > 0 and similarities[row] >= threshold]
+
+    def most_similar(self, normalized_text: str) -> Optional[Tuple[str, float]]:
+        """Retourne (clé, score cosinus) du texte indexé le plus proche, None si aucun"""
+        results = self.search(normalized_text, k=1)
+        return results[0] if results else None
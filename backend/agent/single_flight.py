@@ -0,0 +1,79 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Attente maximale d'un appel partagé (secondes) ; au-delà, l'appelant exécute lui-même la fonction
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))
+
+
+class _Call:
+    """Appel en cours : résultat ou exception du premier appelant, signalé aux suivants"""
+
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Regroupement des appels identiques simultanés : pour une même clé, seul le premier
+    appelant exécute la fonction ; les suivants attendent son résultat (ou son exception).
+    Rien n'est conservé une fois l'appel terminé : ce n'est pas un cache.
+    """
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "shared": 0, "timeouts": 0, "errors": 0}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Retourne (résultat, partagé) ; partagé = True si le résultat vient d'un autre appelant"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                call.followers += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+                return call.result, False
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+                if call.followers:
+                    logger.info(f"🤝 Résultat partagé avec {call.followers} requête(s) identique(s)")
+
+        if not call.event.wait(self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            logger.warning("⏱️ Attente d'un appel identique trop longue, exécution indépendante")
+            return fn(*args, **kwargs), False
+        if call.error is not None:
+            raise call.error
+        with self._lock:
+            self._stats["shared"] += 1
+        return call.result, True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
@@ -0,0 +1,250 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Réutilisation des requêtes préparées côté serveur (PREPARE / EXECUTE), désactivée par défaut
+SQL_PREPARED_STATEMENTS = os.getenv("SQL_PREPARED_STATEMENTS", "0") == "1"
+# Nombre maximal de requêtes préparées gardées par connexion (les plus anciennes sont libérées)
+SQL_PREPARED_PER_CONNECTION = int(os.getenv("SQL_PREPARED_PER_CONNECTION", "64"))
+
+# {variable}, '{variable}', "{variable}" (et l'ancienne forme {{variable}})
+PLACEHOLDER_PATTERN = re.compile(r"""(['"]?)\{\{?(\w+)\}?\}\1""")
+# Variables insérées telles quelles (noms de colonnes), jamais liées comme valeurs
+IDENTIFIER_VARIABLES = {'type_evaluation_column'}
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_.]*$')
+INTEGER_PATTERN = re.compile(r'^-?\d+$')
+# Chaînes SQL ('...' ou "...", quotes doublées ou échappées) et placeholders qu'elles contiennent
+STRING_LITERAL_PATTERN = re.compile(r"'(?:[^'\\]|\\.|'')*'" r'|"(?:[^"\\]|\\.|"")*"')
+INNER_PLACEHOLDER_PATTERN = re.compile(r"\{\{?(\w+)\}?\}")
+
+
+class BoundQuery(NamedTuple):
+    """Requête au format MySQLdb (%s, % littéraux doublés) et valeurs typées à lier"""
+    sql: str
+    params: Tuple[Any, ...]
+
+
+def _typed(value: Any, quoted: bool) -> Any:
+    """Entier pour les valeurs numériques non quotées dans le template, texte sinon"""
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return str(value) if quoted else value
+    text = str(value)
+    if not quoted:
+        # Valeurs historiquement pré-quotées (ex: jour = "'Lundi'")
+        if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+            return text[1:-1]
+        if INTEGER_PATTERN.match(text.strip()):
+            return int(text.strip())
+    return text
+
+
+def _literal_text(value: Any) -> str:
+    """Valeur insérée dans une chaîne du template (listes jointes, quotes historiques retirées)"""
+    if isinstance(value, (list, tuple)):
+        return ', '.join(_literal_text(item) for item in value)
+    return str(_typed(value, False))
+
+
+def _bind_string_literals(sql_template: str, variables: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Chaînes contenant un placeholder parmi d'autres caractères (ex: LIKE '%{NomFr}%') : la chaîne complétée
+    devient une seule valeur liée ('{__literal_N}'). Si une variable de la chaîne est absente, les valeurs
+    connues y sont insérées comme texte (ancien comportement) et le reste est laissé tel quel.
+    """
+    literal_values: Dict[str, Any] = {}
+
+    def replace(match):
+        literal = match.group(0)
+        quote, content = literal[0], literal[1:-1]
+        names = INNER_PLACEHOLDER_PATTERN.findall(content)
+        if not names or INNER_PLACEHOLDER_PATTERN.fullmatch(content):
+            # Pas de placeholder, ou placeholder seul : traité par la boucle principale
+            return literal
+        if all(name in variables and name not in IDENTIFIER_VARIABLES for name in names):
+            content = content.replace(quote * 2, quote)
+            value = INNER_PLACEHOLDER_PATTERN.sub(lambda m: _literal_text(variables[m.group(1)]), content)
+            name = f"__literal_{len(literal_values)}"
+            literal_values[name] = value
+            return f"'{{{name}}}'"
+        return INNER_PLACEHOLDER_PATTERN.sub(
+            lambda m: _literal_text(variables[m.group(1)]).replace(quote, quote * 2)
+            if m.group(1) in variables else m.group(0),
+            literal
+        )
+
+    sql_template = STRING_LITERAL_PATTERN.sub(replace, sql_template)
+    return sql_template, {**variables, **literal_values}
+
+
+def bind_template(sql_template: str, variables: Dict[str, Any]) -> BoundQuery:
+    """
+    Remplace chaque placeholder connu par %s et collecte sa valeur (quotes du template retirées).
+    Une liste (ex: id_personne = [ids enfants]) devient %s, %s, ... ; les variables absentes
+    restent dans le texte comme auparavant. Une chaîne contenant un placeholder (LIKE '%{NomFr}%')
+    est liée comme une seule valeur.
+    """
+    sql_template, variables = _bind_string_literals(sql_template, variables)
+    params: List[Any] = []
+    parts: List[str] = []
+    last = 0
+    for match in PLACEHOLDER_PATTERN.finditer(sql_template):
+        quote, name = match.group(1), match.group(2)
+        if name not in variables:
+            continue
+        value = variables[name]
+        parts.append(sql_template[last:match.start()].replace('%', '%%'))
+        if name in IDENTIFIER_VARIABLES:
+            if not IDENTIFIER_PATTERN.match(str(value)):
+                raise ValueError(f"Identifiant SQL invalide pour {name}: {value!r}")
+            parts.append(f"{quote}{value}{quote}")
+        elif isinstance(value, (list, tuple)):
+            if not value:
+                raise ValueError(f"Liste vide pour la variable SQL {name}")
+            parts.append(', '.join(['%s'] * len(value)))
+            params.extend(_typed(item, bool(quote)) for item in value)
+        else:
+            parts.append('%s')
+            params.append(_typed(value, bool(quote)))
+        last = match.end()
+
+    if not params:
+        # Aucun paramètre : texte inchangé (les identifiants éventuels sont déjà insérés)
+        text = ''.join(part.replace('%%', '%') for part in parts) + sql_template[last:]
+        return BoundQuery(text, ())
+    parts.append(sql_template[last:].replace('%', '%%'))
+    return BoundQuery(''.join(parts), tuple(params))
+
+
+def sql_literal(value: Any) -> str:
+    """Littéral SQL d'une valeur (affichage, journalisation, mise en cache)"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    text = str(value).replace("\\", "\\\\").replace("'", "''")
+    return f"'{text}'"
+
+
+def render_sql(bound: BoundQuery) -> str:
+    """Texte SQL équivalent avec les valeurs insérées (jamais utilisé pour l'exécution)"""
+    if not bound.params:
+        return bound.sql
+    values = iter(bound.params)
+    return re.sub(r'%[s%]', lambda m: '%' if m.group(0) == '%%' else sql_literal(next(values)), bound.sql)
+
+
+# ================================
+# REQUÊTES PRÉPARÉES CÔTÉ SERVEUR
+# ================================
+
+class PreparedStatementRegistry:
+    """
+    Requêtes préparées (PREPARE ... FROM) de chaque connexion MySQL, réutilisées tant que
+    le texte de la requête est identique : seules les valeurs changent (id enfant, trimestre...).
+    Les connexions sont identifiées par (objet, thread_id serveur) ; un identifiant inconnu
+    du serveur (connexion recréée) provoque une nouvelle préparation.
+    """
+
+    MAX_CONNECTIONS = 256
+
+    def __init__(self, per_connection: int = SQL_PREPARED_PER_CONNECTION):
+        self.per_connection = per_connection
+        self._statements: "OrderedDict[Tuple[int, int], OrderedDict[str, str]]" = OrderedDict()
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._stats = {"prepared": 0, "reused": 0, "deallocated": 0}
+
+    @staticmethod
+    def _connection_key(connection) -> Tuple[int, int]:
+        raw = getattr(connection, '_raw', connection)
+        try:
+            thread_id = raw.thread_id()
+        except Exception:
+            thread_id = 0
+        return id(raw), thread_id
+
+    def execute(self, connection, cursor, bound: BoundQuery):
+        """Exécute la requête via EXECUTE ... USING (préparation au premier usage sur la connexion)"""
+        key = self._connection_key(connection)
+        with self._lock:
+            statements = self._statements.setdefault(key, OrderedDict())
+            self._statements.move_to_end(key)
+            while len(self._statements) > self.MAX_CONNECTIONS:
+                self._statements.popitem(last=False)
+            name = statements.get(bound.sql)
+            evicted = None
+            if name is None:
+                self._counter += 1
+                name = f"assistant_stmt_{self._counter}"
+                statements[bound.sql] = name
+                if len(statements) > self.per_connection:
+                    _sql, evicted = statements.popitem(last=False)
+                self._stats["prepared"] += 1
+                must_prepare = True
+            else:
+                statements.move_to_end(bound.sql)
+                self._stats["reused"] += 1
+                must_prepare = False
+
+        if evicted:
+            cursor.execute(f"DEALLOCATE PREPARE {evicted}")
+            self._stats["deallocated"] += 1
+        if must_prepare:
+            # Marqueurs ? de MySQL à la place du format %s de MySQLdb
+            statement = re.sub(r'%[s%]', lambda m: '%' if m.group(0) == '%%' else '?', bound.sql)
+            cursor.execute(f"PREPARE {name} FROM %s", (statement,))
+
+        variables = [f"@{name}_{i}" for i in range(len(bound.params))]
+        if variables:
+            cursor.execute("SET " + ", ".join(f"{variable} = %s" for variable in variables), bound.params)
+            cursor.execute(f"EXECUTE {name} USING " + ", ".join(variables))
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+    def forget(self, connection):
+        """Oublie les requêtes d'une connexion (après une erreur « Unknown prepared statement »)"""
+        with self._lock:
+            self._statements.pop(self._connection_key(connection), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["connections"] = len(self._statements)
+            stats["statements"] = sum(len(s) for s in self._statements.values())
+        stats["enabled"] = SQL_PREPARED_STATEMENTS
+        return stats
+
+
+_registry: Optional[PreparedStatementRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_prepared_registry() -> PreparedStatementRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PreparedStatementRegistry()
+    return _registry
+
+
+def execute_bound(connection, cursor, bound: BoundQuery, prepared: bool = SQL_PREPARED_STATEMENTS):
+    """Exécute une requête liée : paramètres du curseur, ou requête préparée réutilisée si activé"""
+    if prepared and bound.params:
+        registry = get_prepared_registry()
+        try:
+            registry.execute(connection, cursor, bound)
+            return
+        except Exception as e:
+            # Requête préparée perdue (connexion recréée côté serveur) : on oublie et on exécute normalement
+            logger.warning(f"⚠️ Requête préparée indisponible, exécution directe: {e}")
+            registry.forget(connection)
+    cursor.execute(bound.sql, bound.params or None)
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration du pool et des délais par étape (secondes)
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "8"))
+STAGE_TIMEOUTS = {
+    "graph": float(os.getenv("STAGE_TIMEOUT_GRAPH", "15")),
+    "format": float(os.getenv("STAGE_TIMEOUT_FORMAT", "30")),
+    "children": float(os.getenv("STAGE_TIMEOUT_CHILDREN", "10")),
+}
+DEFAULT_STAGE_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_DEFAULT", "30"))
+
+
+class _StageStart(threading.Event):
+    """Démarrage effectif d'une étape (après l'attente d'un worker libre), signalé par _timed"""
+    at = 0.0
+
+
+class StageRunner:
+    """
+    Exécute en parallèle les étapes indépendantes du pipeline (graphique, formatage, ...)
+    sur un pool de threads partagé, avec un délai maximal par étape.
+    Le délai d'une étape court à partir de son démarrage effectif : l'attente d'un worker libre
+    n'est pas décomptée, mais une étape toujours en file après son délai est annulée.
+    Une étape en échec, hors délai ou annulée renvoie sa valeur de repli.
+    """
+
+    def __init__(self, max_workers: int = PIPELINE_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._stats = {"completed": 0, "timeouts": 0, "cancelled": 0, "failed": 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def timeout_for(stage: str) -> float:
+        return STAGE_TIMEOUTS.get(stage, DEFAULT_STAGE_TIMEOUT)
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def submit(self, stage: str, fn: Callable, *args, **kwargs) -> Future:
+        """Lance une étape en arrière-plan (ex: pré-chargement)"""
+        started = _StageStart()
+        future = self.executor.submit(self._timed, stage, started, fn, *args, **kwargs)
+        # Signalé par _timed au démarrage effectif de l'étape (après l'attente d'un worker)
+        future.stage_started = started
+        return future
+
+    def result(self, stage: str, future: Future, fallback: Any = None,
+               timeout: Optional[float] = None) -> Any:
+        """Attend le résultat d'une étape soumise, avec repli en cas d'échec ou de délai dépassé"""
+        outcome, value = self._wait(stage, future, timeout)
+        if outcome == "ok":
+            return value
+        return fallback() if callable(fallback) else fallback
+
+    def _wait(self, stage: str, future: Future, timeout: Optional[float] = None) -> Tuple[str, Any]:
+        """("ok", résultat), ("timeout", None), ("cancelled", None) ou ("error", exception)"""
+        timeout = self.timeout_for(stage) if timeout is None else timeout
+        started = getattr(future, "stage_started", None)
+        try:
+            if started is not None:
+                # Attente d'un worker libre bornée par le délai de l'étape ; au-delà l'étape est annulée
+                if not started.wait(timeout) and future.cancel():
+                    self._count("cancelled")
+                    logger.warning(f"⏱️ Étape '{stage}' non démarrée après {timeout:.0f}s (pool saturé), annulée")
+                    return "cancelled", None
+                timeout = max(0.0, timeout - (time.perf_counter() - started.at))
+            value = future.result(timeout=timeout)
+            self._count("completed")
+            return "ok", value
+        except FutureTimeoutError:
+            self._count("timeouts")
+            logger.warning(f"⏱️ Étape '{stage}' hors délai, valeur de repli utilisée")
+            return "timeout", None
+        except Exception as e:
+            self._count("failed")
+            logger.error(f"❌ Étape '{stage}' en échec: {e}")
+            return "error", e
+
+    def run_parallel(self, stages: Dict[str, Tuple[Callable, tuple, Any]]) -> Dict[str, Any]:
+        """
+        Exécute {nom: (fonction, args, repli)} en parallèle.
+        La latence totale est celle de l'étape la plus longue (bornée par son délai).
+        """
+        start = time.perf_counter()
+        futures = {name: self.submit(name, fn, *args) for name, (fn, args, _) in stages.items()}
+
+        results = {}
+        fallbacks = {}
+        for name, future in futures.items():
+            # Chaque délai court depuis le démarrage de l'étape, pas depuis la soumission
+            outcome, value = self._wait(name, future)
+            if outcome == "ok":
+                results[name] = value
+            else:
+                fallback = stages[name][2]
+                results[name] = fallback() if callable(fallback) else fallback
+                fallbacks[name] = outcome
+
+        elapsed = time.perf_counter() - start
+        if fallbacks:
+            logger.warning(f"⏱️ Étapes {list(stages)} en {elapsed:.2f}s, valeurs de repli pour: "
+                           + ", ".join(f"{name} ({outcome})" for name, outcome in fallbacks.items()))
+        else:
+            logger.debug(f"⚡ Étapes {list(stages)} terminées en {elapsed:.2f}s")
+        return results
+
+    @staticmethod
+    def _timed(stage: str, started: _StageStart, fn: Callable, *args, **kwargs) -> Any:
+        started.at = time.perf_counter()
+        started.set()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            logger.debug(f"⏱️ Étape '{stage}': {time.perf_counter() - started.at:.2f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["max_workers"] = self.max_workers
+        return stats
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def __enter__(self) -> "StageRunner":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+_runner: Optional[StageRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_stage_runner() -> StageRunner:
+    """Retourne le runner partagé par tout le processus"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = StageRunner()
+    return _runner
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Tuple, Any
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PATTERN = re.compile(r'\{(.+?)\}')
+
+
+class ExactTemplateMatcher:
+    """
+    Correspondance exacte question / template_question ({variable} = texte libre).
+    Les templates sont compilés une seule fois au chargement en une alternance unique
+    (un groupe nommé par template, dans l'ordre du fichier) : une question est testée
+    contre tous les templates en un seul fullmatch.
+    """
+
+    def __init__(self):
+        # (regex combinée, groupe du template -> (template, [(groupe, variable)]))
+        self._index: Optional[Tuple[re.Pattern, Dict[str, Tuple[Dict, List[Tuple[str, str]]]]]] = None
+
+    def load_templates(self, templates: List[Dict]):
+        """Compile les templates ; ceux dont les variables sont invalides sont ignorés"""
+        alternatives = []
+        groups = {}
+        for position, template in enumerate(templates):
+            compiled = self._compile_template(position, template.get("template_question", ""))
+            if compiled is None:
+                logger.warning(f"⚠️ Template ignoré pour la correspondance exacte: {template.get('template_question')}")
+                continue
+            group, pattern, variables = compiled
+            alternatives.append(f"(?P<{group}>{pattern})")
+            groups[group] = (template, variables)
+
+        # Remplacement atomique : une recherche en cours garde l'index précédent
+        if alternatives:
+            self._index = (re.compile('|'.join(alternatives), re.IGNORECASE), groups)
+        else:
+            self._index = None
+
+    @staticmethod
+    def _compile_template(position: int, template_question: str) -> Optional[Tuple[str, str, List[Tuple[str, str]]]]:
+        """Texte du template échappé, chaque {variable} devenant un groupe (.+?) renommé t<position>_<i>"""
+        group = f"t{position}"
+        parts = []
+        variables = []
+        last = 0
+        for i, match in enumerate(PLACEHOLDER_PATTERN.finditer(template_question)):
+            name = match.group(1)
+            if not name.isidentifier() or name in (variable for _, variable in variables):
+                return None
+            variable_group = f"{group}_{i}"
+            parts.append(re.escape(template_question[last:match.start()]))
+            parts.append(f"(?P<{variable_group}>.+?)")
+            variables.append((variable_group, name))
+            last = match.end()
+        parts.append(re.escape(template_question[last:]))
+        return group, ''.join(parts), variables
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """{"template", "variables"} du premier template correspondant à la question, sinon None"""
+        index = self._index
+        if index is None:
+            return None
+        pattern, groups = index
+
+        match = pattern.fullmatch(question.rstrip(' ?'))
+        if not match:
+            return None
+        template, variables = groups[match.lastgroup]
+        return {
+            "template": template,
+            "variables": {name: match.group(group).strip() for group, name in variables}
+        }
@@ -1,36 +1,76 @@
 from typing import Dict, List, Optional, Tuple, Any
 import re
 
+import numpy as np
+import scipy.sparse as sp
+
 class SemanticTemplateMatcher:
+    """
+    Recherche du template le plus proche d'une question (similarité de Jaccard sur les mots).
+    Les templates sont indexés au chargement dans une matrice d'incidence creuse
+    templates x mots : une recherche coûte un seul produit matrice-vecteur,
+    quel que soit le nombre de templates.
+    """
+
     def __init__(self):
         self.templates = []
+        # (matrice d'incidence, nombre de mots distincts par template, vocabulaire, templates)
+        self._index: Optional[Tuple[sp.csr_matrix, np.ndarray, Dict[str, int], List[Dict]]] = None
     
     def load_templates(self, templates: List[Dict]):
-        """Charge les templates"""
+        """Charge les templates et construit l'index"""
         self.templates = templates
+        # Remplacement atomique : une recherche en cours garde l'index précédent
+        self._index = self._build_index(templates)
         print(f"✅ {len(templates)} templates chargés dans le matcher")
-    
+
+    def _build_index(self, templates: List[Dict]) -> Tuple[sp.csr_matrix, np.ndarray, Dict[str, int], List[Dict]]:
+        vocabulary: Dict[str, int] = {}
+        rows, columns = [], []
+        for row, template in enumerate(templates):
+            words = set(self._normalize_text(template.get("template_question", "")).split())
+            for word in words:
+                rows.append(row)
+                columns.append(vocabulary.setdefault(word, len(vocabulary)))
+        incidence = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, columns)),
+            shape=(len(templates), max(len(vocabulary), 1))
+        )
+        sizes = np.asarray(incidence.sum(axis=1)).ravel()
+        return incidence, sizes, vocabulary, list(templates)
+
     def find_similar_template(self, question: str, threshold: float = 0.6) -> Tuple[Optional[Dict], float]:
-        """Trouve un template similaire en utilisant une comparaison simple"""
-        if not self.templates:
-            return None, 0.0
-        
-        question_normalized = self._normalize_text(question)
-        best_match = None
-        best_score = 0.0
-        
-        for template in self.templates:
-            template_text = template.get("template_question", "")
-            template_normalized = self._normalize_text(template_text)
-            
-            # Calcul de similarité basé sur les mots communs
-            similarity = self._calculate_similarity(question_normalized, template_normalized)
-            
-            if similarity > best_score and similarity >= threshold:
-                best_score = similarity
-                best_match = template
-        
-        return best_match, best_score
+        """Trouve le template le plus similaire (score ≥ threshold), ou (None, 0.0)"""
+        matches = self.find_similar_templates(question, k=1, threshold=threshold)
+        if matches:
+            return matches[0]
+        return None, 0.0
+
+    def find_similar_templates(self, question: str, k: int = 5,
+                               threshold: float = 0.0) -> List[Tuple[Dict, float]]:
+        """Les k templates les plus proches [(template, score)], par score décroissant (> 0 et ≥ threshold)"""
+        index = self._index
+        if index is None or k <= 0 or not index[3]:
+            return []
+        incidence, sizes, vocabulary, templates = index
+
+        words = set(self._normalize_text(question).split())
+        if not words:
+            return []
+        known = [vocabulary[word] for word in words if word in vocabulary]
+        if not known:
+            return []
+
+        query = np.zeros(incidence.shape[1], dtype=np.float64)
+        query[known] = 1.0
+        intersection = incidence @ query
+        union = sizes + len(words) - intersection
+        scores = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        # Tri stable : à score égal, le premier template chargé l'emporte (comme l'ancienne boucle)
+        rows = np.argsort(-scores, kind='stable')[:k]
+        return [(templates[row], float(scores[row])) for row in rows
+                if scores[row] > 0 and scores[row] >= threshold]
     
     def _normalize_text(self, text: str) -> str:
         """Normalise le texte pour la comparaison"""
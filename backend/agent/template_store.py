@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import logging
+import threading
+import weakref
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from agent.template_matcher.matcher import SemanticTemplateMatcher
+from agent.template_matcher.exact_matcher import ExactTemplateMatcher
+
+logger = logging.getLogger(__name__)
+
+AGENT_DIR = Path(__file__).parent
+TEMPLATES_QUESTIONS_PATH = AGENT_DIR / 'templates_questions.json'
+PROMPTS_DIR = AGENT_DIR / 'prompts'
+
+# Intervalle de vérification des fichiers surveillés (secondes, 0 = pas de surveillance)
+TEMPLATE_STORE_POLL_INTERVAL = float(os.getenv("TEMPLATE_STORE_POLL_INTERVAL", "2"))
+
+
+class TemplateSnapshot:
+    """Version figée des templates, de leurs matchers et des fichiers prompts/*.json"""
+
+    def __init__(self, version: int, templates: List[Dict], semantic_matcher: SemanticTemplateMatcher,
+                 exact_matcher: ExactTemplateMatcher, prompts: Dict[str, Any]):
+        self.version = version
+        self.templates = templates
+        self.semantic_matcher = semantic_matcher
+        self.exact_matcher = exact_matcher
+        self.prompts = prompts
+        self.loaded_at = time.time()
+
+    @property
+    def domain_descriptions(self) -> Dict[str, str]:
+        return self.prompts.get('domain_descriptions', {})
+
+    @property
+    def domain_to_tables_mapping(self) -> Dict[str, List[str]]:
+        return self.prompts.get('domain_tables_mapping', {})
+
+
+class TemplateStore:
+    """
+    Templates de questions et fichiers prompts/*.json, rechargés sans redémarrer l'assistant.
+    Un thread de fond compare les dates de modification ; en cas de changement, un nouveau
+    snapshot (templates validés, matchers compilés, JSON des prompts) est construit en arrière-plan
+    puis remplace l'ancien en une affectation : les lecteurs ne prennent aucun verrou et
+    les requêtes en cours gardent leur snapshot.
+    Un fichier illisible (écriture en cours) est ignoré jusqu'à sa prochaine modification.
+    """
+
+    def __init__(self, templates_path: Path = TEMPLATES_QUESTIONS_PATH, prompts_dir: Path = PROMPTS_DIR,
+                 poll_interval: float = TEMPLATE_STORE_POLL_INTERVAL):
+        self.templates_path = Path(templates_path)
+        self.prompts_dir = Path(prompts_dir)
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._listeners: List[weakref.WeakMethod] = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Dates relevées avant la lecture : une écriture pendant la construction sera revue au tour suivant
+        self._seen_mtimes = self._current_mtimes()
+        self._snapshot = self._build_snapshot(version=1, initial=True)
+
+    @property
+    def snapshot(self) -> TemplateSnapshot:
+        return self._snapshot
+
+    # ================================
+    # LECTURE DES FICHIERS
+    # ================================
+
+    def _watched_files(self) -> List[Path]:
+        return [self.templates_path] + sorted(self.prompts_dir.glob('*.json'))
+
+    def _current_mtimes(self) -> Dict[str, int]:
+        mtimes = {}
+        for path in self._watched_files():
+            try:
+                mtimes[str(path)] = path.stat().st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def _read_templates(self, initial: bool) -> List[Dict]:
+        """
+        Templates valides de templates_questions.json.
+        Au démarrage, un fichier absent, vide ou corrompu est (ré)initialisé comme auparavant ;
+        lors d'un rechargement, il lève une exception et le snapshot courant est conservé.
+        """
+        path = self.templates_path
+        if not path.exists():
+            if not initial:
+                raise FileNotFoundError(path)
+            logger.info(f"⚠️ Fichier non trouvé, création: {path}")
+            path.write_text('{"questions": []}', encoding='utf-8')
+            return []
+
+        content = path.read_text(encoding='utf-8').strip()
+        if not content:
+            if not initial:
+                raise ValueError(f"{path.name} vide (écriture en cours ?)")
+            logger.warning("⚠️ Fichier vide, réinitialisation")
+            path.write_text('{"questions": []}', encoding='utf-8')
+            return []
+
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            if not initial:
+                raise
+            logger.error(f"❌ Fichier JSON corrompu, réinitialisation. Erreur: {e}")
+            path.rename(path.with_suffix('.bak.json'))
+            path.write_text('{"questions": []}', encoding='utf-8')
+            return []
+
+        if not isinstance(data.get("questions", []), list):
+            raise ValueError("Format invalide: 'questions' doit être une liste")
+
+        valid_templates = []
+        for template in data["questions"]:
+            if all(key in template for key in ["template_question", "requete_template"]):
+                valid_templates.append(template)
+            else:
+                logger.warning(f"⚠️ Template incomplet ignoré: {template.get('description', 'sans description')}")
+        return valid_templates
+
+    def _read_prompts(self, initial: bool) -> Dict[str, Any]:
+        """Contenu de chaque prompts/<nom>.json, indexé par <nom>"""
+        prompts = {}
+        for path in sorted(self.prompts_dir.glob('*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    prompts[path.stem] = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                if not initial:
+                    raise
+                logger.error(f"❌ Erreur chargement {path.name}: {e}")
+                prompts[path.stem] = {}
+        for name in ('domain_descriptions', 'domain_tables_mapping'):
+            if name not in prompts:
+                logger.warning(f"⚠️ Fichier {name}.json non trouvé")
+        return prompts
+
+    def _build_snapshot(self, version: int, initial: bool = False) -> TemplateSnapshot:
+        if initial:
+            try:
+                templates = self._read_templates(initial)
+            except Exception as e:
+                logger.error(f"❌ Erreur critique lors du chargement: {e}")
+                templates = []
+        else:
+            templates = self._read_templates(initial)
+        prompts = self._read_prompts(initial)
+
+        semantic_matcher = SemanticTemplateMatcher()
+        semantic_matcher.load_templates(templates)
+        exact_matcher = ExactTemplateMatcher()
+        exact_matcher.load_templates(templates)
+        logger.info(f"✅ {len(templates)} templates chargés (version {version})")
+        return TemplateSnapshot(version, templates, semantic_matcher, exact_matcher, prompts)
+
+    # ================================
+    # RECHARGEMENT
+    # ================================
+
+    def reload(self, force: bool = False) -> bool:
+        """Reconstruit le snapshot si un fichier surveillé a changé (ou si force) ; retourne True si remplacé"""
+        with self._reload_lock:
+            current = self._snapshot
+            mtimes = self._current_mtimes()
+            if not force and mtimes == self._seen_mtimes:
+                return False
+            # Pas de nouvelle tentative avant la prochaine modification, même en cas d'échec
+            self._seen_mtimes = mtimes
+            try:
+                snapshot = self._build_snapshot(current.version + 1)
+            except Exception as e:
+                self.failed_reloads += 1
+                logger.warning(f"⚠️ Rechargement des templates ignoré, version {current.version} conservée: {e}")
+                return False
+            self._snapshot = snapshot
+            self.reloads += 1
+
+        logger.info(f"🔄 Templates et prompts rechargés (version {snapshot.version})")
+        self._notify(snapshot, current)
+        return True
+
+    def subscribe(self, callback: Callable[[TemplateSnapshot, TemplateSnapshot], None]):
+        """
+        callback(nouveau, ancien) est appelé dans le thread de rechargement après chaque remplacement.
+        Seule une référence faible est gardée : un assistant remplacé (/reinit) n'est plus notifié.
+        """
+        self._listeners.append(weakref.WeakMethod(callback))
+
+    def _notify(self, snapshot: TemplateSnapshot, previous: TemplateSnapshot):
+        alive = []
+        for reference in self._listeners:
+            callback = reference()
+            if callback is None:
+                continue
+            alive.append(reference)
+            try:
+                callback(snapshot, previous)
+            except Exception as e:
+                logger.error(f"❌ Erreur après rechargement des templates: {e}")
+        self._listeners = alive
+
+    # ================================
+    # SURVEILLANCE
+    # ================================
+
+    def start(self):
+        """Démarre la surveillance des fichiers (sans effet si déjà démarrée ou désactivée)"""
+        if self.poll_interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="template-store", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"❌ Surveillance des templates: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version,
+            "templates": len(snapshot.templates),
+            "prompt_files": sorted(snapshot.prompts),
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "watching": bool(self._thread and self._thread.is_alive())
+        }
+
+
+_store: Optional[TemplateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_template_store() -> TemplateStore:
+    """Store partagé par tout le processus, surveillance démarrée au premier accès"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TemplateStore()
+                _store.start()
+    return _store
@@ -115,7 +115,8 @@ def create_app():
                 cursor.close()
                 if hasattr(conn, '_direct_connection'):
                     conn.close()
-                return {"status": "OK", "database": "Connected", "test": result}
+                from config.database import get_pool
+                return {"status": "OK", "database": "Connected", "test": result, "pool": get_pool().stats()}
             else:
                 return {"status": "OK", "database": "Disconnected"}, 503
         except Exception as e:
@@ -0,0 +1,494 @@
+"""
+Mode de service asynchrone (ASGI) de l'assistant.
+
+Les routes longues (/api/ask, /api/clarify-child, /api/graph et l'historique des
+conversations) sont servies nativement en asyncio ; toutes les autres routes sont
+déléguées à l'application Flask existante.
+
+Lancement :
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from fastapi import FastAPI, Request, Header
+from fastapi.responses import JSONResponse
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from flask_jwt_extended import decode_token
+
+from app import create_app
+from routes import agent as agent_routes
+from routes import api_routes_history as history_routes
+from agent.async_pipeline import AsyncAssistantPipeline, run_blocking
+from agent.llm_utils import close_async_llm_client, close_llm_client
+
+logger = logging.getLogger(__name__)
+
+QUESTION_FIELDS = ['question', 'subject', 'query', 'text', 'message', 'prompt']
+
+# Application Flask existante : routes non migrées et contexte applicatif
+flask_app = create_app()
+
+_pipeline: Optional[AsyncAssistantPipeline] = None
+
+
+def get_pipeline() -> Optional[AsyncAssistantPipeline]:
+    """Pipeline lié à l'assistant courant (recréé après un /reinit)"""
+    global _pipeline
+    if not agent_routes.assistant:
+        agent_routes.initialize_assistant()
+    if not agent_routes.assistant:
+        return None
+    if _pipeline is None or _pipeline.assistant is not agent_routes.assistant:
+        _pipeline = AsyncAssistantPipeline(agent_routes.assistant)
+    return _pipeline
+
+
+def decode_user(authorization: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Décode le JWT émis par /api/login avec la configuration flask_jwt_extended de l'application
+    (clé, algorithme, expiration, claim d'identité) ; seuls les jetons d'accès sont acceptés.
+    """
+    header_type = flask_app.config.get('JWT_HEADER_TYPE', 'Bearer')
+    prefix = f"{header_type} " if header_type else ""
+    if not authorization or not authorization.startswith(prefix):
+        return None
+    try:
+        with flask_app.app_context():
+            claims = decode_token(authorization[len(prefix):])
+    except Exception as e:
+        logger.debug(f"Erreur JWT: {e}")
+        return None
+    # Comme verify_jwt_in_request() : un jeton de rafraîchissement ne donne pas accès aux routes
+    if claims.get('type') != 'access':
+        logger.debug(f"Jeton JWT refusé (type {claims.get('type')!r})")
+        return None
+
+    idpersonne = claims.get('idpersonne')
+    try:
+        idpersonne = int(idpersonne) if idpersonne is not None else None
+    except (ValueError, TypeError):
+        idpersonne = None
+
+    return {
+        'sub': claims.get(flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub')),
+        'idpersonne': idpersonne,
+        'roles': claims.get('roles', []),
+        'username': claims.get('username', '')
+    }
+
+
+async def read_json(request: Request) -> Optional[Dict[str, Any]]:
+    try:
+        data = await request.json()
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_async_llm_client()
+    close_llm_client()
+
+
+app = FastAPI(title="Assistant Scolaire", lifespan=lifespan)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"]
+)
+
+
+# ================================
+# ASSISTANT
+# ================================
+
+@app.post('/api/ask')
+async def ask_sql(request: Request, authorization: Optional[str] = Header(None)):
+    """Équivalent asynchrone de la route Flask /ask"""
+    current_user = decode_user(authorization)
+
+    data = await read_json(request)
+    if not data:
+        return JSONResponse({"error": "Corps de requête JSON vide"}, status_code=400)
+
+    question = next((str(data[field]).strip() for field in QUESTION_FIELDS
+                     if field in data and data[field] and str(data[field]).strip()), None)
+    if not question:
+        return JSONResponse({
+            "error": "Question manquante",
+            "expected_fields": QUESTION_FIELDS,
+            "received_fields": list(data.keys())
+        }, status_code=422)
+
+    pipeline = get_pipeline()
+    if not pipeline:
+        return JSONResponse({
+            "error": "Assistant non disponible",
+            "details": "Impossible d'initialiser l'assistant IA"
+        }, status_code=503)
+
+    # ⏳ Mode asynchrone : même file de tâches que la route Flask (suivi via /api/jobs/<id>)
+    if data.get("async") in (True, 1, "1", "true"):
+        payload, status_code = await pipeline.run_sync(
+            agent_routes.submit_job, "ask", {"question": question, "user": current_user}, current_user
+        )
+        return JSONResponse(payload, status_code=status_code)
+
+    # 🧾 Cas spécial : Attestation de présence (génération PDF, déportée en thread)
+    if "attestation" in question.lower():
+        payload = await pipeline.run_sync(_attestation_payload, question)
+        return JSONResponse(payload)
+
+    user_id = current_user.get('idpersonne') if current_user else None
+    roles = current_user.get('roles', []) if current_user else []
+
+    conversation_id = data.get('conversation_id')
+    if conversation_id is not None and not await pipeline.run_sync(
+            pipeline.assistant.is_conversation_owner, conversation_id, user_id or 0):
+        return JSONResponse({"error": "Conversation non trouvée ou accès refusé"}, status_code=404)
+
+    try:
+        sql_query, ai_response, graph_data, conversation_id = await pipeline.ask(
+            question, user_id, roles, conversation_id
+        )
+
+        if not sql_query and ai_response and "plusieurs enfants" in ai_response:
+            return JSONResponse({
+                "response": ai_response,
+                "status": "clarification_needed",
+                "question": question,
+                "user_action_required": True,
+                "timestamp": pd.Timestamp.now().isoformat()
+            })
+
+        if not sql_query:
+            return JSONResponse({
+                "error": "La requête générée est vide",
+                "response": ai_response,
+                "question": question,
+                "status": "error"
+            }, status_code=422)
+
+        result = {
+            "sql_query": sql_query,
+            "response": ai_response,
+            "status": "success",
+            "question": question,
+            "conversation_id": conversation_id,
+            "has_graph": graph_data is not None,
+            "timestamp": pd.Timestamp.now().isoformat()
+        }
+        if graph_data:
+            result["graph"] = graph_data
+        if current_user:
+            result["user"] = {
+                "id": current_user.get('idpersonne'),
+                "username": current_user.get('username'),
+                "roles": current_user.get('roles', [])
+            }
+        return JSONResponse(result)
+
+    except Exception as e:
+        logger.error(f"Erreur traitement question (async): {e}")
+        return JSONResponse({
+            "error": "Erreur de traitement",
+            "details": str(e),
+            "question": question,
+            "status": "error"
+        }, status_code=500)
+
+
+def _attestation_payload(question: str) -> Dict[str, Any]:
+    """Réutilise le traitement Flask des attestations hors requête Flask"""
+    with flask_app.app_context():
+        return agent_routes.handle_attestation_request(question).get_json()
+
+
+@app.post('/api/clarify-child')
+async def clarify_child_selection(request: Request, authorization: Optional[str] = Header(None)):
+    """Équivalent asynchrone de la route Flask /clarify-child"""
+    data = await read_json(request)
+    if not data:
+        return JSONResponse({"error": "Corps de requête JSON vide"}, status_code=400)
+
+    original_question = data.get('original_question', '')
+    child_specification = data.get('child_specification', '')
+    user_id = data.get('user_id')
+
+    if not all([original_question, child_specification, user_id]):
+        return JSONResponse({
+            "error": "Paramètres manquants",
+            "required": ["original_question", "child_specification", "user_id"]
+        }, status_code=422)
+
+    pipeline = get_pipeline()
+    if not pipeline:
+        return JSONResponse({"error": "Assistant non disponible"}, status_code=503)
+
+    clarified_question = f"{original_question} pour {child_specification}"
+    try:
+        sql_query, ai_response, graph_data, _ = await pipeline.ask(
+            clarified_question, user_id, ['ROLE_PARENT']
+        )
+        if not sql_query:
+            return JSONResponse({
+                "error": "Impossible de traiter la question clarifiée",
+                "clarified_question": clarified_question,
+                "status": "error"
+            }, status_code=422)
+
+        result = {
+            "sql_query": sql_query,
+            "response": ai_response,
+            "status": "success",
+            "original_question": original_question,
+            "clarified_question": clarified_question,
+            "child_specification": child_specification,
+            "has_graph": graph_data is not None,
+            "timestamp": pd.Timestamp.now().isoformat()
+        }
+        if graph_data:
+            result["graph"] = graph_data
+        return JSONResponse(result)
+
+    except Exception as e:
+        logger.error(f"Erreur clarification enfant (async): {e}")
+        return JSONResponse({
+            "error": "Erreur lors de la clarification",
+            "details": str(e),
+            "status": "error"
+        }, status_code=500)
+
+
+@app.post('/api/graph')
+async def generate_graph_only(request: Request):
+    """Équivalent asynchrone de la route Flask /graph"""
+    data = await read_json(request)
+    if not data or not isinstance(data.get('data'), list):
+        return JSONResponse({
+            "error": "Données manquantes",
+            "message": "Le champ 'data' contenant une liste est requis"
+        }, status_code=422)
+
+    if not data['data']:
+        return JSONResponse({
+            "error": "Données vides",
+            "message": "Impossible de créer un graphique avec des données vides"
+        }, status_code=422)
+
+    pipeline = get_pipeline()
+    if not pipeline:
+        return JSONResponse({"error": "Assistant non disponible"}, status_code=503)
+
+    graph_type = data.get('graph_type')
+    try:
+        graph_data = await pipeline.generate_graph(data['data'], graph_type)
+    except Exception as e:
+        logger.error(f"Erreur génération graphique (async): {e}")
+        return JSONResponse({
+            "error": "Erreur lors de la génération du graphique",
+            "details": str(e),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }, status_code=500)
+
+    if not graph_data:
+        return JSONResponse({
+            "error": "Impossible de générer le graphique",
+            "message": "Les données ne sont pas adaptées pour la génération de graphique"
+        }, status_code=422)
+
+    return JSONResponse({
+        "success": True,
+        "graph": graph_data,
+        "graph_type": graph_type or "auto-detected",
+        "data_points": len(data['data']),
+        "columns": list(pd.DataFrame(data['data']).columns),
+        "timestamp": pd.Timestamp.now().isoformat()
+    })
+
+
+# ================================
+# HISTORIQUE DES CONVERSATIONS
+# ================================
+
+def _history_guard(authorization: Optional[str]):
+    """Retourne (utilisateur, None) ou (None, réponse d'erreur)"""
+    if not history_routes.conversation_history:
+        return None, JSONResponse({
+            'success': False,
+            'error': 'Service d\'historique non disponible'
+        }, status_code=503)
+
+    current_user = decode_user(authorization)
+    if not current_user or current_user.get('idpersonne') is None:
+        return None, JSONResponse({
+            'success': False,
+            'error': 'Authentification invalide'
+        }, status_code=401)
+    return current_user, None
+
+
+@app.get('/api/conversations')
+async def get_user_conversations(limit: int = 50, authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    user_id = current_user['idpersonne']
+    limit = min(limit, 100)
+    conversations = await run_blocking(
+        history_routes.conversation_history.get_user_conversations, user_id, limit
+    )
+    return JSONResponse({
+        'success': True,
+        'conversations': conversations,
+        'total': len(conversations),
+        'user_id': user_id
+    })
+
+
+@app.get('/api/conversations/{conversation_id}/messages')
+async def get_conversation_messages(conversation_id: int, authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    messages = await run_blocking(
+        history_routes.conversation_history.get_conversation_messages,
+        conversation_id, current_user['idpersonne']
+    )
+    if messages is None:
+        return JSONResponse({
+            'success': False,
+            'error': 'Conversation non trouvée ou accès refusé'
+        }, status_code=404)
+
+    return JSONResponse({
+        'success': True,
+        'messages': messages,
+        'conversation_id': conversation_id,
+        'total': len(messages)
+    })
+
+
+@app.post('/api/conversations/create')
+async def create_conversation(request: Request, authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    data = await read_json(request) or {}
+    conversation_id = await run_blocking(
+        history_routes.conversation_history.create_conversation,
+        current_user['idpersonne'], data.get('first_message', '').strip()
+    )
+    if not conversation_id:
+        return JSONResponse({
+            'success': False,
+            'error': 'Erreur lors de la création de la conversation'
+        }, status_code=500)
+
+    return JSONResponse({
+        'success': True,
+        'conversation_id': conversation_id,
+        'message': 'Conversation créée avec succès'
+    }, status_code=201)
+
+
+@app.post('/api/conversations/{conversation_id}/messages')
+async def add_message_to_conversation(conversation_id: int, request: Request,
+                                      authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    data = await read_json(request)
+    if not data:
+        return JSONResponse({'success': False, 'error': 'Données JSON manquantes'}, status_code=400)
+
+    message_type = data.get('message_type', '').strip()
+    content = data.get('content', '').strip()
+    if not message_type or not content:
+        return JSONResponse({
+            'success': False,
+            'error': 'Champs requis manquants: message_type et content'
+        }, status_code=400)
+    if message_type not in ['user', 'assistant', 'system']:
+        return JSONResponse({
+            'success': False,
+            'error': f'Type de message invalide: {message_type}. Types autorisés: user, assistant, system'
+        }, status_code=400)
+
+    history = history_routes.conversation_history
+    if not await run_blocking(history.is_owner, conversation_id, current_user['idpersonne']):
+        return JSONResponse({
+            'success': False,
+            'error': 'Conversation non trouvée ou accès refusé'
+        }, status_code=404)
+
+    success = await run_blocking(
+        history.add_message, conversation_id, message_type, content,
+        data.get('sql_query'), data.get('graph_data')
+    )
+    if not success:
+        return JSONResponse({'success': False, 'error': 'Échec de l\'ajout du message'}, status_code=500)
+    return JSONResponse({'success': True, 'message': 'Message ajouté avec succès'}, status_code=201)
+
+
+@app.post('/api/conversations/{conversation_id}/delete')
+async def delete_conversation(conversation_id: int, authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    success = await run_blocking(
+        history_routes.conversation_history.delete_conversation,
+        conversation_id, current_user['idpersonne']
+    )
+    if not success:
+        return JSONResponse({
+            'success': False,
+            'error': 'Conversation non trouvée ou accès refusé'
+        }, status_code=404)
+    return JSONResponse({'success': True, 'message': 'Conversation supprimée avec succès'})
+
+
+@app.post('/api/conversations/start')
+async def start_conversation(request: Request, authorization: Optional[str] = Header(None)):
+    current_user, error = _history_guard(authorization)
+    if error:
+        return error
+
+    data = await read_json(request) or {}
+    history = history_routes.conversation_history
+    user_id = current_user['idpersonne']
+
+    last_conv = await run_blocking(history.get_last_active_conversation, user_id)
+    if last_conv:
+        conversation_id = last_conv['id']
+    else:
+        conversation_id = await run_blocking(
+            history.create_conversation, user_id, data.get('first_message', '')
+        )
+
+    if not conversation_id:
+        return JSONResponse({
+            'success': False,
+            'error': 'Impossible de créer/récupérer la conversation'
+        }, status_code=500)
+    return JSONResponse({
+        'success': True,
+        'conversation_id': conversation_id,
+        'is_new': last_conv is None
+    })
+
+
+# Toutes les autres routes (login, notifications, attestations, ...) restent servies par Flask
+app.mount("/", WSGIMiddleware(flask_app))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de l'extraction des paramètres de CacheManager1 :
+ancienne boucle motif par motif (_extract_parameters_legacy) contre le scan unique (ParameterExtractor).
+Vérifie aussi que les deux implémentations donnent exactement le même résultat (clés de cache inchangées).
+
+Usage (depuis backend/) : python benchmarks/bench_parameter_extractor.py [--repeat 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Cache SQLite jetable : le benchmark ne touche pas aux données réelles
+os.environ.setdefault("SQL_CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench_cache.db"))
+
+from agent.cache_manager1 import CacheManager1  # noqa: E402
+
+QUESTIONS = [
+    "Quelles sont les notes de mon enfant en mathématiques au 1er trimestre ?",
+    "Donne moi les notes du devoir de contrôle 1 de ma fille en physique",
+    "Quel est l'emploi du temps de mon fils lundi ?",
+    "Emploi du temps de mes enfants pour demain",
+    "Absences de mon enfant aujourd'hui",
+    "Moyenne de DUPONT MARIE en français pour le 2ème trimestre",
+    "Liste des élèves de la classe 7B1 en 2024/2025",
+    "Résultats du DS 2 d'anglais de mon fils au troisième trimestre",
+    "Quels sont les devoirs maison de svt de ma fille ?",
+    "Notes de l'élève 12345 en histoire géographie",
+    "Bulletin du trimestre 3 de mon enfant",
+    "Est-ce que mon enfant a un examen d'informatique vendredi ?",
+    "Sanctions de l'élève 'BENALI' cette année",
+    "Combien mon fils doit-il payer pour la cantine ?",
+    "Quelle est la moyenne générale de mes enfants ?",
+]
+
+
+def load_corpus() -> list:
+    """Questions types + templates du cache parent existant"""
+    corpus = list(QUESTIONS)
+    cache_file = BACKEND_DIR / "sql_query_cache1.json"
+    if cache_file.exists():
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            corpus.extend(item.get('question_template', '') for item in json.load(f).values())
+    return [question for question in corpus if question]
+
+
+def timed(function, corpus: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in corpus:
+            function(question)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    manager = CacheManager1(cache_file=str(Path(tempfile.mkdtemp()) / "absent.json"))
+    corpus = load_corpus()
+
+    mismatches = [
+        question for question in corpus
+        if manager._extract_parameters_legacy(question) != manager.extractor.extract(question)
+    ]
+    if mismatches:
+        for question in mismatches:
+            print(f"❌ Résultat différent: {question!r}")
+            print(f"   ancien  : {manager._extract_parameters_legacy(question)}")
+            print(f"   nouveau : {manager.extractor.extract(question)}")
+        sys.exit(1)
+
+    legacy = timed(manager._extract_parameters_legacy, corpus, args.repeat)
+    compiled = timed(manager.extractor.extract, corpus, args.repeat)
+    calls = len(corpus) * args.repeat
+    print(f"✅ {len(corpus)} questions, résultats identiques")
+    print(f"   ancien  : {legacy / calls * 1e6:8.1f} µs/question")
+    print(f"   nouveau : {compiled / calls * 1e6:8.1f} µs/question (x{legacy / compiled:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@ from langchain_community.utilities import SQLDatabase
 import MySQLdb
 from urllib.parse import quote_plus
 import os
+import time
 import logging
+import threading
+from collections import deque
 from dotenv import load_dotenv
 from contextlib import contextmanager
 
@@ -12,8 +15,17 @@ load_dotenv()
 mysql = MySQL()
 logger = logging.getLogger(__name__)
 
+# Configuration du pool de connexions MySQL
+MYSQL_POOL_MIN_SIZE = int(os.getenv('MYSQL_POOL_MIN_SIZE', '2'))
+MYSQL_POOL_MAX_SIZE = int(os.getenv('MYSQL_POOL_MAX_SIZE', '20'))
+MYSQL_POOL_MAX_LIFETIME = float(os.getenv('MYSQL_POOL_MAX_LIFETIME', '1800'))
+MYSQL_POOL_PING_AFTER = float(os.getenv('MYSQL_POOL_PING_AFTER', '30'))
+MYSQL_POOL_WAIT_TIMEOUT = float(os.getenv('MYSQL_POOL_WAIT_TIMEOUT', '10'))
+
 class CustomSQLDatabase(SQLDatabase):
     def execute_query(self, sql_query: str) -> dict:
+        connection = None
+        cursor = None
         try:
             connection = get_db()  
             cursor = connection.cursor()
@@ -30,9 +42,10 @@ class CustomSQLDatabase(SQLDatabase):
             return {"success": False, "error": str(e), "sql_query": sql_query}
 
         finally:
-            cursor.close()
-            # Ne ferme la connexion que si elle a été créée en direct
-            if hasattr(connection, '_direct_connection'):
+            if cursor:
+                cursor.close()
+            # Ne ferme la connexion que si elle a été créée en direct (ou empruntée au pool)
+            if connection and hasattr(connection, '_direct_connection'):
                 connection.close()
 
 
@@ -59,6 +72,7 @@ class CustomSQLDatabase(SQLDatabase):
     def get_table_info(self, table_names=None):
         """
         Récupère les informations des tables de la base de données
+        depuis le catalogue du schéma en mémoire (config/schema_catalog.py)
         
         Args:
             table_names (list, optional): Liste des noms de tables spécifiques. 
@@ -67,6 +81,15 @@ class CustomSQLDatabase(SQLDatabase):
         Returns:
             str: Description des tables au format texte
         """
+        try:
+            from config.schema_catalog import get_schema_catalog
+            return get_schema_catalog().get_table_info(table_names)
+        except Exception as e:
+            logger.warning(f"⚠️ Catalogue du schéma indisponible, lecture directe: {e}")
+            return self._describe_tables(table_names)
+
+    def _describe_tables(self, table_names=None):
+        """Lecture directe via SHOW TABLES + DESCRIBE (une requête par table)"""
         try:
             if table_names is None:
                 # Récupérer toutes les tables
@@ -128,8 +151,8 @@ def init_db(app):
         if missing_vars:
             logger.warning(f"⚠️ Variables manquantes: {missing_vars} - Utilisation des valeurs par défaut")
 
-        # Test de connexion directe uniquement
-        test_connection = create_direct_connection()
+        # Test de connexion et préchauffage du pool
+        test_connection = get_pool().acquire()
         if test_connection:
             test_connection.close()
             logger.info("✅ Configuration MySQL initialisée et testée")
@@ -163,26 +186,238 @@ def create_direct_connection():
         logger.error(f"❌ Erreur connexion MySQL directe: {e}")
         return None
 
-# ✅ Utilisation dans contexte Flask ou fallback direct
+# ================================
+# POOL DE CONNEXIONS
+# ================================
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion libérée dans le délai imparti"""
+
+
+class PooledConnection:
+    """
+    Connexion empruntée au pool. Se comporte comme la connexion MySQLdb sous-jacente ;
+    close() la rend au pool au lieu de la fermer.
+    """
+    # Les appelants existants ferment les connexions portant ce marqueur
+    _direct_connection = True
+
+    def __init__(self, pool, raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def cursor(self, cursorclass=None, dictionary=False):
+        # dictionary=True (API mysql-connector) : les connexions du pool utilisent déjà DictCursor
+        if cursorclass is not None:
+            return self._raw.cursor(cursorclass)
+        return self._raw.cursor()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, self._created_at)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Filet de sécurité : une connexion oubliée ne doit pas épuiser le pool
+        if not getattr(self, '_released', True):
+            self._released = True
+            self._pool.discard(self._raw)
+
+
+class ConnectionPool:
+    """
+    Pool de connexions MySQLdb borné et thread-safe.
+    - min_size connexions ouvertes au démarrage, max_size au plus
+    - ping uniquement pour les connexions inactives depuis plus de ping_after secondes
+    - recyclage des connexions plus anciennes que max_lifetime
+    - métriques d'attente (attente cumulée, maximale, délais dépassés)
+    """
+
+    def __init__(self, factory, min_size: int = MYSQL_POOL_MIN_SIZE, max_size: int = MYSQL_POOL_MAX_SIZE,
+                 max_lifetime: float = MYSQL_POOL_MAX_LIFETIME, ping_after: float = MYSQL_POOL_PING_AFTER,
+                 wait_timeout: float = MYSQL_POOL_WAIT_TIMEOUT):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.wait_timeout = wait_timeout
+
+        self._idle = deque()  # (connexion, créée_à, dernière_utilisation)
+        self._size = 0
+        self._cond = threading.Condition(threading.RLock())
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+            "failed_pings": 0,
+            "timeouts": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+
+    def warm_up(self):
+        """Ouvre les min_size premières connexions"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            raw = self._create()
+            if raw is None:
+                return
+            self.release(raw, time.monotonic())
+
+    def acquire(self, timeout: float = None) -> PooledConnection:
+        timeout = self.wait_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            must_create = False
+            with self._cond:
+                while entry is None and not must_create:
+                    if self._idle:
+                        entry = self._idle.pop()  # LIFO : la connexion la plus chaude
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        must_create = True
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolTimeoutError(
+                                f"Aucune connexion MySQL disponible après {timeout:.1f}s "
+                                f"({self.max_size} connexions en cours d'utilisation)"
+                            )
+                        self._cond.wait(remaining)
+
+            now = time.monotonic()
+            if must_create:
+                raw = self._create()
+                if raw is None:
+                    raise MySQLdb.OperationalError("Impossible d'ouvrir une connexion MySQL")
+                created_at = now
+            else:
+                raw, created_at, last_used = entry
+                if now - created_at > self.max_lifetime:
+                    self._close(raw, "recycled")
+                    continue
+                if now - last_used > self.ping_after and not self._ping(raw):
+                    self._close(raw, "failed_pings")
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_total"] += waited
+                self._stats["wait_max"] = max(self._stats["wait_max"], waited)
+            return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at: float):
+        """Rend une connexion au pool (ou la ferme si elle a dépassé sa durée de vie)"""
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            self._close(raw, "recycled")
+            return
+        with self._cond:
+            self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def discard(self, raw):
+        """Ferme une connexion qui ne doit pas revenir dans le pool"""
+        self._close(raw, "discarded")
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _, _ in idle:
+            self._close(raw, "discarded")
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(size=self._size, idle=len(self._idle), in_use=self._size - len(self._idle),
+                         max_size=self.max_size)
+        checkouts = stats["checkouts"]
+        stats["wait_avg_ms"] = round(stats["wait_total"] / checkouts * 1000, 2) if checkouts else 0.0
+        stats["wait_max_ms"] = round(stats.pop("wait_max") * 1000, 2)
+        stats.pop("wait_total")
+        return stats
+
+    def _create(self):
+        raw = None
+        try:
+            raw = self.factory()
+        finally:
+            with self._cond:
+                if raw is None:
+                    self._size -= 1
+                    self._cond.notify()
+                else:
+                    self._stats["created"] += 1
+        return raw
+
+    def _ping(self, raw) -> bool:
+        try:
+            raw.ping()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Connexion MySQL inactive invalide, remplacement: {e}")
+            return False
+
+    def _close(self, raw, reason: str):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats[reason] += 1
+            self._cond.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool partagé par tout le processus, créé et préchauffé au premier appel"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(create_direct_connection)
+                pool.warm_up()
+                _pool = pool
+                logger.info(
+                    f"✅ Pool MySQL initialisé (min: {pool.min_size}, max: {pool.max_size})"
+                )
+    return _pool
+
+
+# ✅ Connexion empruntée au pool
 def get_db():
+    """Emprunte une connexion au pool ; close() la rend au pool. Retourne None en cas d'échec."""
     try:
-        from flask import current_app
-        if current_app and hasattr(current_app, 'extensions') and 'mysql' in current_app.extensions:
-            mysql_connection = current_app.extensions['mysql'].connection
-            if mysql_connection:
-                try:
-                    cursor = mysql_connection.cursor()
-                    cursor.execute("SELECT 1")
-                    cursor.close()
-                    logger.debug("✅ Connexion Flask MySQL OK")
-                    return mysql_connection
-                except Exception as test_error:
-                    logger.warning(f"⚠️ Connexion Flask MySQL échouée: {test_error}")
+        return get_pool().acquire()
     except Exception as e:
-        logger.warning(f"⚠️ Contexte Flask indisponible: {e}")
-
-    logger.info("🔄 Utilisation de la connexion directe")
-    return create_direct_connection()
+        logger.error(f"❌ Impossible d'obtenir une connexion MySQL: {e}")
+        return None
 
 # ✅ Context manager pour les requêtes SQL
 @contextmanager
@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.database import get_db
+
+logger = logging.getLogger(__name__)
+
+# Intervalle minimal entre deux vérifications de la signature du schéma (secondes)
+SCHEMA_CHECK_INTERVAL = float(os.getenv('SCHEMA_CHECK_INTERVAL', '60'))
+
+COLUMNS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+FOREIGN_KEYS_QUERY = """
+    SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+    FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+"""
+
+SIGNATURE_QUERY = """
+    SELECT COUNT(*) AS nb_tables, MAX(CREATE_TIME) AS last_create, MAX(UPDATE_TIME) AS last_update
+    FROM INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+
+class SchemaCatalog:
+    """
+    Description du schéma en mémoire : colonnes, clés et clés étrangères chargées en une
+    requête INFORMATION_SCHEMA, texte de chaque table rendu une seule fois.
+    Rechargé uniquement si la signature de INFORMATION_SCHEMA.TABLES change
+    (vérifiée au plus toutes les SCHEMA_CHECK_INTERVAL secondes) ou sur demande (/reinit).
+    """
+
+    def __init__(self, check_interval: float = SCHEMA_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.columns: Dict[str, List[Dict]] = {}
+        self.foreign_keys: List[Tuple[str, str, str, str]] = []
+        self.snippets: Dict[str, str] = {}
+        self.references: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self.neighbors: Dict[str, Set[str]] = {}
+        self._lowercase_names: Dict[str, str] = {}
+        self._signature = None
+        self._last_check = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # ================================
+    # CHARGEMENT
+    # ================================
+
+    def refresh(self, force: bool = False) -> bool:
+        """Recharge le catalogue si le schéma a changé (ou si force) ; retourne True si rechargé"""
+        now = time.monotonic()
+        if not force and self._loaded and now - self._last_check < self.check_interval:
+            return False
+
+        with self._lock:
+            if not force and self._loaded and now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+
+            connection = get_db()
+            if connection is None:
+                raise ConnectionError("Connexion MySQL indisponible pour le catalogue du schéma")
+            cursor = None
+            try:
+                cursor = connection.cursor()
+                cursor.execute(SIGNATURE_QUERY)
+                signature = tuple(self._row_values(cursor.fetchone()))
+                if not force and self._loaded and signature == self._signature:
+                    return False
+
+                start = time.perf_counter()
+                cursor.execute(COLUMNS_QUERY)
+                column_rows = cursor.fetchall()
+                cursor.execute(FOREIGN_KEYS_QUERY)
+                fk_rows = cursor.fetchall()
+            finally:
+                if cursor:
+                    cursor.close()
+                connection.close()
+
+            self._build(column_rows, fk_rows)
+            self._signature = signature
+            self._loaded = True
+            logger.info(
+                f"✅ Catalogue du schéma chargé: {len(self.columns)} tables, "
+                f"{len(self.foreign_keys)} clés étrangères ({time.perf_counter() - start:.2f}s)"
+            )
+            return True
+
+    def invalidate(self):
+        """Force un rechargement au prochain accès"""
+        self._last_check = 0.0
+        self._signature = None
+
+    def _build(self, column_rows, fk_rows):
+        columns: Dict[str, List[Dict]] = {}
+        for row in column_rows:
+            table, name, col_type, nullable, key, default = self._row_values(row)
+            columns.setdefault(table, []).append({
+                "name": name,
+                "type": col_type,
+                "nullable": nullable == 'YES',
+                "key": key,
+                "default": default
+            })
+
+        foreign_keys = [tuple(self._row_values(row)) for row in fk_rows]
+        references = {(table, column): (ref_table, ref_column)
+                      for table, column, ref_table, ref_column in foreign_keys}
+
+        snippets = {
+            table: self._render_table(table, table_columns, references)
+            for table, table_columns in columns.items()
+        }
+
+        # Graphe non orienté des jointures déclarées (utilisé pour les chemins de jointure)
+        neighbors: Dict[str, Set[str]] = {}
+        for table, _column, ref_table, _ref_column in foreign_keys:
+            if table != ref_table:
+                neighbors.setdefault(table, set()).add(ref_table)
+                neighbors.setdefault(ref_table, set()).add(table)
+
+        # Remplacement atomique des structures (lecteurs sans verrou)
+        self.columns = columns
+        self.foreign_keys = foreign_keys
+        self.snippets = snippets
+        self.references = references
+        self.neighbors = neighbors
+        self._lowercase_names = {table.lower(): table for table in columns}
+
+    @staticmethod
+    def _row_values(row) -> list:
+        return list(row.values()) if isinstance(row, dict) else list(row)
+
+    @staticmethod
+    def _render_table(table: str, table_columns: List[Dict], references: Dict) -> str:
+        """Même format que l'ancien rendu SHOW TABLES + DESCRIBE, complété des clés étrangères"""
+        lines = []
+        for column in table_columns:
+            column_desc = f"  - {column['name']} ({column['type']})"
+            if not column['nullable']:
+                column_desc += " NOT NULL"
+            if column['key'] == 'PRI':
+                column_desc += " PRIMARY KEY"
+            if column['default']:
+                column_desc += f" DEFAULT {column['default']}"
+            reference = references.get((table, column['name']))
+            if reference:
+                column_desc += f" REFERENCES {reference[0]}({reference[1]})"
+            lines.append(column_desc)
+        return f"Table: {table}\n" + "\n".join(lines)
+
+    # ================================
+    # CONSULTATION
+    # ================================
+
+    def resolve_table(self, table_name: str) -> Optional[str]:
+        if table_name in self.snippets:
+            return table_name
+        return self._lowercase_names.get(table_name.lower())
+
+    def render_table(self, table: str, column_names: Optional[List[str]] = None) -> str:
+        """Rendu d'une table limité à certaines colonnes (toutes si None), avec le nombre de colonnes omises"""
+        table_columns = self.columns.get(table, [])
+        if column_names is None:
+            return self.snippets.get(table, "")
+        wanted = set(column_names)
+        kept = [column for column in table_columns if column['name'] in wanted]
+        text = self._render_table(table, kept, self.references)
+        omitted = len(table_columns) - len(kept)
+        if omitted:
+            text += f"\n  - ... ({omitted} autres colonnes)"
+        return text
+
+    def table_names(self) -> List[str]:
+        self.refresh()
+        return list(self.columns.keys())
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        self.refresh()
+        snippets = self.snippets
+        if table_names is None:
+            table_names = list(snippets.keys())
+
+        table_info = []
+        for table_name in table_names:
+            resolved = self.resolve_table(table_name)
+            if resolved is None:
+                logger.warning(f"Impossible de récupérer les infos pour la table {table_name}: table inconnue")
+                continue
+            table_info.append(snippets[resolved])
+
+        return "\n\n".join(table_info) if table_info else "Aucune table trouvée"
+
+
+_catalog: Optional[SchemaCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    """Catalogue partagé par tout le processus"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SchemaCatalog()
+    return _catalog
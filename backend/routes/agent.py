@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify,send_from_directory
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request, get_jwt
+from flask import Blueprint, request, jsonify,send_from_directory, Response, stream_with_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request, get_jwt, jwt_required
 import logging
+from functools import wraps
 import re
+import json
 import os
 from typing import List, Dict, Optional
 import fitz 
@@ -11,10 +13,19 @@ import io
 import base64
 
 from routes.auth import login
+from security.roles import is_super_admin
 from services.auth_service import AuthService
-from agent.assistant import SQLAssistant  
+from agent.assistant import SQLAssistant, ASK_BATCH_MAX_QUESTIONS
+from agent.llm_utils import get_llm_cache
 from agent.pdf_utils.attestation import PDFGenerator
-from config.database import init_db, get_db, get_db_connection
+from config.database import init_db, get_db, get_db_connection, get_pool
+from config.schema_catalog import get_schema_catalog
+from agent.template_store import get_template_store
+from agent.sql_params import get_prepared_registry
+from agent.result_cache import get_result_cache
+from agent.children_directory import CHILDREN_DIRECTORY_WARMUP, SCHOOL_YEAR, get_children_directory
+from agent.cache_warmer import CacheWarmer, CACHE_WARMER_SCHEDULE, CACHE_WARMER_TIME
+from agent.job_queue import JobQueueFullError, get_job_queue
 
 # Initialize PDF generator
 generator = PDFGenerator()
@@ -45,13 +56,29 @@ logger = logging.getLogger(__name__)
 
 # Global assistant instance
 assistant = None
+# Préchauffage des caches SQL depuis l'historique (lié à l'assistant courant)
+cache_warmer = None
 
 def initialize_assistant():
     """Initialize the unified SQL assistant"""
-    global assistant
+    global assistant, cache_warmer
     try:
         assistant = SQLAssistant()
+        if cache_warmer:
+            cache_warmer.stop_schedule()
+        cache_warmer = CacheWarmer.from_assistant(assistant)
         if assistant and assistant.db:
+            # Chargement du catalogue du schéma (une seule requête INFORMATION_SCHEMA)
+            try:
+                get_schema_catalog().refresh()
+            except Exception as catalog_error:
+                logger.warning(f"⚠️ Catalogue du schéma non chargé: {catalog_error}")
+            # Préchargement des familles en arrière-plan (une requête pour tous les parents)
+            if CHILDREN_DIRECTORY_WARMUP:
+                get_children_directory().warm_up_async()
+            # Préchauffage quotidien des caches SQL avant l'affluence du matin
+            if CACHE_WARMER_SCHEDULE:
+                cache_warmer.start_schedule(CACHE_WARMER_TIME)
             logger.info("✅ Assistant unifié initialisé avec succès")
             return True
         else:
@@ -67,15 +94,18 @@ initialize_assistant()
 
 # Ajout dans la route /ask du fichier agent.py
 
-@agent_bp.route('/ask', methods=['POST'])
-def ask_sql():
-    """
-    Route principale pour les questions SQL avec génération de graphiques
-    Utilise le nouvel assistant unifié qui combine SQL + IA + graphiques + gestion multi-enfants
-    """
-    jwt_valid = False
+def super_admin_required(view):
+    """Route d'administration (caches, préchauffage) : à placer sous @jwt_required()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_super_admin(get_jwt().get('roles', [])):
+            return jsonify({"error": "Accès réservé aux administrateurs"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def get_optional_current_user() -> Optional[Dict]:
+    """Identité JWT facultative : retourne l'utilisateur courant ou None"""
     current_user = None
-    jwt_error = None
 
     # 🔍 Authentification via JWT
     try:
@@ -95,7 +125,6 @@ def ask_sql():
                         'roles': jwt_claims.get('roles', []),
                         'username': jwt_claims.get('username', '')
                     }
-                    jwt_valid = True
 
             except Exception as jwt_exc:
                 jwt_error = str(jwt_exc)
@@ -105,6 +134,18 @@ def ask_sql():
         jwt_error = str(e)
         logger.debug(f"Erreur générale JWT: {jwt_error}")
 
+    return current_user
+
+
+@agent_bp.route('/ask', methods=['POST'])
+def ask_sql():
+    """
+    Route principale pour les questions SQL avec génération de graphiques
+    Utilise le nouvel assistant unifié qui combine SQL + IA + graphiques + gestion multi-enfants
+    {"async": true} : réponse 202 immédiate avec un identifiant de tâche (suivi via /jobs/<id>)
+    """
+    current_user = get_optional_current_user()
+
     # 🧠 Traitement de la question
     try:
         if not request.is_json:
@@ -139,84 +180,216 @@ def ask_sql():
                     "details": "Impossible d'initialiser l'assistant IA"
                 }), 503
 
-        # 🧾 Cas spécial : Attestation de présence
-        if "attestation" in question.lower():
-            return handle_attestation_request(question)
+        # ⏳ Mode asynchrone : la question est traitée par la file de tâches
+        if is_async_requested(data):
+            payload, status_code = submit_job("ask", {"question": question, "user": current_user}, current_user)
+            return jsonify(payload), status_code
 
-        
+        return process_question(question, current_user)
 
-        # 🤖 Traitement IA principal avec l'assistant unifié
-        try:
-            # 🎯 MODIFICATION : Récupération de 3 valeurs (sql, response, graph)
-            sql_query, ai_response, graph_data = assistant.ask_question(question, user_id, roles)
-            
-            # 🎯 NOUVELLE LOGIQUE : Vérifier si c'est une demande de clarification multi-enfants
-            if not sql_query and ai_response and "plusieurs enfants" in ai_response:
-                # C'est une demande de clarification, pas une erreur
-                return jsonify({
-                    "response": ai_response,
-                    "status": "clarification_needed",
-                    "question": question,
-                    "user_action_required": True,
-                    "timestamp": pd.Timestamp.now().isoformat()
-                }), 200
-            
-            if not sql_query:
-                return jsonify({
-                    "error": "La requête générée est vide",
-                    "question": question,
-                    "status": "error"
-                }), 422
-            
-            # Création de la réponse enrichie
-            result = {
-                "sql_query": sql_query,
+    except Exception as e:
+        logger.error(f"Erreur générale dans /ask: {e}")
+        return jsonify({
+            "error": "Erreur serveur interne",
+            "details": str(e),
+            "status": "error"
+        }), 500
+
+def process_question(question: str, current_user: Optional[Dict]):
+    """Traitement d'une question (synchrone ou depuis la file de tâches) : retourne la réponse Flask"""
+    jwt_valid = current_user is not None
+    user_id = current_user.get('idpersonne') if current_user else None
+    roles = current_user.get('roles', []) if current_user else []
+
+    # 🧾 Cas spécial : Attestation de présence
+    if "attestation" in question.lower():
+        return handle_attestation_request(question)
+
+    # 🤖 Traitement IA principal avec l'assistant unifié
+    try:
+        # 🎯 MODIFICATION : Récupération de 3 valeurs (sql, response, graph)
+        sql_query, ai_response, graph_data = assistant.ask_question(question, user_id, roles)
+        
+        # 🎯 NOUVELLE LOGIQUE : Vérifier si c'est une demande de clarification multi-enfants
+        if not sql_query and ai_response and "plusieurs enfants" in ai_response:
+            # C'est une demande de clarification, pas une erreur
+            return jsonify({
                 "response": ai_response,
-                "status": "success",
+                "status": "clarification_needed",
                 "question": question,
+                "user_action_required": True,
                 "timestamp": pd.Timestamp.now().isoformat()
-            }
-            
-            # 🎯 AJOUT : Inclure le graphique si généré
-            if graph_data:
-                result["graph"] = graph_data
-                result["has_graph"] = True
-                logger.info("📊 Graphique généré automatiquement")
-            else:
-                result["has_graph"] = False
-
-            # Ajouter les informations utilisateur si authentifié
-            if jwt_valid:
-                result["user"] = {
-                    "id": current_user.get('idpersonne'),
-                    "username": current_user.get('username'),
-                    "roles": current_user.get('roles', [])
-                }
-
-            # Nettoyage périodique de l'historique des conversations
-            if hasattr(assistant, 'cleanup_conversation_history'):
-                assistant.cleanup_conversation_history()
-
-            logger.info(f"✅ Question traitée avec succès: {question[:50]}...")
-            return jsonify(result), 200
-
-        except Exception as processing_error:
-            logger.error(f"Erreur traitement question: {processing_error}")
+            }), 200
+        
+        if not sql_query:
             return jsonify({
-                "error": "Erreur de traitement",
-                "details": str(processing_error),
+                "error": "La requête générée est vide",
                 "question": question,
                 "status": "error"
-            }), 500
+            }), 422
+        
+        # Création de la réponse enrichie
+        result = {
+            "sql_query": sql_query,
+            "response": ai_response,
+            "status": "success",
+            "question": question,
+            "timestamp": pd.Timestamp.now().isoformat()
+        }
+        
+        # 🎯 AJOUT : Inclure le graphique si généré
+        if graph_data:
+            result["graph"] = graph_data
+            result["has_graph"] = True
+            logger.info("📊 Graphique généré automatiquement")
+        else:
+            result["has_graph"] = False
+
+        # Ajouter les informations utilisateur si authentifié
+        if jwt_valid:
+            result["user"] = {
+                "id": current_user.get('idpersonne'),
+                "username": current_user.get('username'),
+                "roles": current_user.get('roles', [])
+            }
+
+        # Nettoyage périodique de l'historique des conversations
+        if hasattr(assistant, 'cleanup_conversation_history'):
+            assistant.cleanup_conversation_history()
+
+        logger.info(f"✅ Question traitée avec succès: {question[:50]}...")
+        return jsonify(result), 200
+
+    except Exception as processing_error:
+        logger.error(f"Erreur traitement question: {processing_error}")
+        return jsonify({
+            "error": "Erreur de traitement",
+            "details": str(processing_error),
+            "question": question,
+            "status": "error"
+        }), 500
+
+@agent_bp.route('/ask-batch', methods=['POST'])
+def ask_sql_batch():
+    """
+    Plusieurs questions en un appel : {"questions": [...], "conversation_id": optionnel}.
+    Authentification, historique et résolution partagés ; résultats dans l'ordre des questions.
+    """
+    current_user = get_optional_current_user()
+
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Content-Type application/json requis"}), 415
+
+        data = request.get_json(silent=True) or {}
+        questions = data.get("questions")
+        if not isinstance(questions, list) or not questions:
+            return jsonify({
+                "error": "Liste de questions manquante",
+                "expected_fields": ["questions"],
+                "received_fields": list(data.keys())
+            }), 422
+
+        questions = [str(question).strip() for question in questions]
+        if not all(questions):
+            return jsonify({"error": "Question vide dans le lot"}), 422
+        if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+            return jsonify({
+                "error": f"Trop de questions ({len(questions)}), maximum {ASK_BATCH_MAX_QUESTIONS}"
+            }), 413
+
+        user_id = current_user.get('idpersonne') if current_user else None
+        roles = current_user.get('roles', []) if current_user else []
+
+        if not assistant:
+            if not initialize_assistant():
+                return jsonify({
+                    "error": "Assistant non disponible",
+                    "details": "Impossible d'initialiser l'assistant IA"
+                }), 503
+
+        conversation_id = data.get("conversation_id")
+        if conversation_id is not None and not assistant.is_conversation_owner(conversation_id, user_id or 0):
+            return jsonify({"error": "Conversation non trouvée ou accès refusé"}), 404
+
+        results, conversation_id = assistant.ask_questions_batch(
+            questions, user_id, roles, conversation_id=conversation_id
+        )
+
+        if hasattr(assistant, 'cleanup_conversation_history'):
+            assistant.cleanup_conversation_history()
+
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "conversation_id": conversation_id,
+            "status": "success",
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 200
 
     except Exception as e:
-        logger.error(f"Erreur générale dans /ask: {e}")
+        logger.error(f"Erreur générale dans /ask-batch: {e}")
         return jsonify({
             "error": "Erreur serveur interne",
             "details": str(e),
             "status": "error"
         }), 500
 
+@agent_bp.route('/ask-stream', methods=['POST'])
+def ask_sql_stream():
+    """
+    Variante Server-Sent Events de /ask : la requête SQL, le nombre de lignes et un aperçu,
+    puis la réponse formatée token par token et enfin le graphique sont envoyés au fil de l'eau.
+    """
+    current_user = get_optional_current_user()
+
+    if not request.is_json:
+        return jsonify({"error": "Content-Type application/json requis"}), 415
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Corps de requête JSON vide"}), 400
+
+    question = next((str(data[field]).strip() for field in ['question', 'subject', 'query', 'text', 'message', 'prompt']
+                     if field in data and data[field] and str(data[field]).strip()), None)
+    if not question:
+        return jsonify({
+            "error": "Question manquante",
+            "expected_fields": ['question', 'subject', 'query', 'text', 'message', 'prompt'],
+            "received_fields": list(data.keys())
+        }), 422
+
+    if not assistant:
+        if not initialize_assistant():
+            return jsonify({
+                "error": "Assistant non disponible",
+                "details": "Impossible d'initialiser l'assistant IA"
+            }), 503
+
+    user_id = current_user.get('idpersonne') if current_user else None
+    roles = current_user.get('roles', []) if current_user else []
+    conversation_id = data.get('conversation_id')
+    if conversation_id is not None and not assistant.is_conversation_owner(conversation_id, user_id or 0):
+        return jsonify({"error": "Conversation non trouvée ou accès refusé"}), 404
+
+    def generate():
+        try:
+            for event in assistant.ask_question_stream(question, user_id, roles, conversation_id):
+                name = event.pop("event")
+                yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+        except Exception as e:
+            logger.error(f"Erreur dans /ask-stream: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': str(e)}, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 # Nouvelle route pour gérer les clarifications multi-enfants
 @agent_bp.route('/clarify-child', methods=['POST'])
 def clarify_child_selection():
@@ -369,7 +542,7 @@ def handle_attestation_request(question: str):
         # Préparation des données pour le PDF
         student_data['nom_complet'] = f"{student_data['NomFr']} {student_data['PrenomFr']}"
         student_data['lieu_naissance'] = student_data['lieu_de_naissance']
-        student_data['annee_scolaire'] = "2024/2025"
+        student_data['annee_scolaire'] = SCHOOL_YEAR
 
         # Génération du PDF
         pdf_result = generator.generate(student_data)
@@ -404,6 +577,13 @@ def handle_attestation_request(question: str):
 def reinitialize():
     """Réinitialise l'assistant unifié"""
     try:
+        # Relecture forcée du schéma, même si sa signature n'a pas changé
+        get_schema_catalog().invalidate()
+        get_template_store().reload(force=True)
+        result_cache = get_result_cache()
+        if result_cache:
+            result_cache.clear()
+        get_children_directory().invalidate()
         success = initialize_assistant()
         
         message = "Réinitialisation réussie" if success else "Échec de la réinitialisation"
@@ -414,6 +594,7 @@ def reinitialize():
             diagnostic_info = {
                 "db_connected": assistant.db is not None,
                 "schema_loaded": len(assistant.schema) > 0,
+                "schema_catalog_tables": len(get_schema_catalog().columns),
                 "templates_loaded": len(assistant.templates_questions),
                 "cache_available": assistant.cache is not None
             }
@@ -461,6 +642,24 @@ def get_assistant_status():
             "last_sql": assistant.last_generated_sql[:100] if assistant.last_generated_sql else None,
             "timestamp": pd.Timestamp.now().isoformat()
         }
+
+        llm_cache = get_llm_cache()
+        status_info["llm_cache"] = llm_cache.stats() if llm_cache else None
+        status_info["prompts"] = assistant.prompt_builder.stats()
+        status_info["templates"] = assistant.template_store.stats()
+        status_info["prepared_statements"] = get_prepared_registry().stats()
+        result_cache = get_result_cache()
+        status_info["result_cache"] = result_cache.stats() if result_cache else None
+        status_info["children_directory"] = get_children_directory().stats()
+        status_info["single_flight"] = assistant.single_flight.stats()
+        status_info["stages"] = assistant.stage_runner.stats()
+        last_warm = cache_warmer.last_report if cache_warmer else None
+        status_info["jobs"] = get_job_queue().stats()
+        status_info["cache_warmer"] = {
+            "scheduled": CACHE_WARMER_SCHEDULE,
+            "time": CACHE_WARMER_TIME,
+            "last_run": {k: v for k, v in last_warm.items() if k != "entries"} if last_warm else None
+        }
         
         return jsonify(status_info), 200
         
@@ -500,6 +699,185 @@ def clear_conversation_history():
             "timestamp": pd.Timestamp.now().isoformat()
         }), 500
 
+@agent_bp.route('/result-cache/invalidate', methods=['POST'])
+@jwt_required()
+@super_admin_required
+def invalidate_result_cache():
+    """Invalide les résultats SQL en cache : {"tables": [...]} ou tout le cache sans tables"""
+    try:
+        result_cache = get_result_cache()
+        if not result_cache:
+            return jsonify({
+                "success": False,
+                "message": "Cache des résultats SQL désactivé"
+            }), 503
+        
+        data = request.get_json(silent=True) or {}
+        tables = data.get("tables")
+        if tables:
+            removed = result_cache.invalidate_tables(tables)
+        else:
+            removed = result_cache.stats()["entries"]
+            result_cache.clear()
+        
+        return jsonify({
+            "success": True,
+            "removed": removed,
+            "stats": result_cache.stats(),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Erreur invalidation cache résultats: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 500
+
+@agent_bp.route('/children-directory/invalidate', methods=['POST'])
+@jwt_required()
+@super_admin_required
+def invalidate_children_directory():
+    """Oublie les enfants d'un parent ({"parent_id": ...}) ou de tous les parents ; {"warm_up": true} recharge tout"""
+    try:
+        data = request.get_json(silent=True) or {}
+        directory = get_children_directory()
+        removed = directory.invalidate(data.get("parent_id"), data.get("school_year"))
+        if data.get("warm_up") and data.get("parent_id") is None:
+            directory.warm_up_async()
+        
+        return jsonify({
+            "success": True,
+            "removed": removed,
+            "stats": directory.stats(),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Erreur invalidation annuaire des enfants: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 500
+
+@agent_bp.route('/cache/warm', methods=['POST'])
+@jwt_required()
+@super_admin_required
+def warm_sql_caches():
+    """Préchauffe les caches SQL depuis l'historique ({"top", "days", "min_count", "dry_run"} optionnels)"""
+    try:
+        if not cache_warmer:
+            return jsonify({"success": False, "error": "Assistant non disponible"}), 503
+        data = request.get_json(silent=True) or {}
+        options = {}
+        for key, option in (("top", "top_n"), ("days", "days"), ("min_count", "min_count")):
+            if data.get(key) is not None:
+                try:
+                    options[option] = int(data[key])
+                except (TypeError, ValueError):
+                    return jsonify({"success": False, "error": f"'{key}' doit être un entier"}), 422
+        report = cache_warmer.warm(dry_run=bool(data.get("dry_run")), **options)
+        if report["status"] == "already_running":
+            return jsonify({"success": False, "error": "Préchauffage déjà en cours"}), 409
+        
+        return jsonify({
+            "success": True,
+            "report": report,
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Erreur préchauffage des caches: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 500
+
+# ================================
+# TÂCHES ASYNCHRONES
+# ================================
+
+def is_async_requested(data: Optional[Dict] = None) -> bool:
+    """{"async": true} dans le corps JSON ou ?async=1 dans l'URL"""
+    if data and data.get("async") in (True, 1, "1", "true"):
+        return True
+    return request.args.get("async", "").lower() in ("1", "true")
+
+def job_owner(current_user: Optional[Dict]):
+    """Seul l'auteur d'une tâche peut en consulter le résultat (tâches anonymes entre elles)"""
+    if not current_user:
+        return None
+    return current_user.get('idpersonne') or current_user.get('sub')
+
+def submit_job(kind: str, payload: Dict, current_user: Optional[Dict]):
+    """Soumet une tâche : retourne (corps JSON, code HTTP) - 202 ou 503 si la file est pleine"""
+    try:
+        job_id = get_job_queue().submit(kind, payload, owner=job_owner(current_user))
+    except JobQueueFullError as e:
+        logger.warning(f"⚠️ {e}")
+        return {"error": "Trop de tâches en attente, réessayez plus tard", "status": "error"}, 503
+
+    logger.info(f"⏳ Tâche {kind} {job_id[:8]} en file d'attente")
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "timestamp": pd.Timestamp.now().isoformat()
+    }, 202
+
+def response_payload(response) -> Dict:
+    """Corps JSON et code HTTP d'une réponse de vue Flask (réponse seule ou tuple)"""
+    status_code = None
+    if isinstance(response, tuple):
+        response, status_code = response[0], response[1]
+    return {"status_code": status_code or response.status_code, "body": response.get_json()}
+
+@agent_bp.record_once
+def register_job_handlers(state):
+    """Les tâches réutilisent les vues synchrones dans le contexte de l'application"""
+    app = state.app
+
+    def run_in_app(view, *args):
+        with app.app_context():
+            return response_payload(view(*args))
+
+    job_queue = get_job_queue()
+    job_queue.register("ask", lambda payload: run_in_app(process_question, payload["question"], payload.get("user")))
+    job_queue.register("attestation", lambda payload: run_in_app(generate_attestation, payload["student_name"]))
+    job_queue.start()
+
+@agent_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """État d'une tâche ; ?wait=N attend sa fin au plus N secondes (borné à JOB_WAIT_MAX)"""
+    try:
+        owner = job_owner(get_optional_current_user())
+        job_queue = get_job_queue()
+        try:
+            wait = float(request.args.get("wait", 0))
+        except ValueError:
+            return jsonify({"error": "'wait' doit être un nombre de secondes"}), 422
+
+        job = job_queue.wait(job_id, wait, owner) if wait > 0 else job_queue.get(job_id, owner)
+        if job is None:
+            return jsonify({"error": "Tâche inconnue ou expirée", "job_id": job_id}), 404
+
+        # Résultat au même format que la route synchrone, avec son code HTTP
+        result = job.pop("result") or {}
+        job["result"] = result.get("body")
+        job["result_status_code"] = result.get("status_code")
+        job["timestamp"] = pd.Timestamp.now().isoformat()
+        return jsonify(job), 200
+
+    except Exception as e:
+        logger.error(f"Erreur suivi de tâche: {e}")
+        return jsonify({
+            "error": str(e),
+            "timestamp": pd.Timestamp.now().isoformat()
+        }), 500
+
 @agent_bp.route('/graph', methods=['POST'])
 def generate_graph_only():
     """
@@ -618,7 +996,17 @@ def serve_image(filename):
 # Endpoint pour générer des attestations
 @agent_bp.route('/generate-attestation/<student_name>', methods=['GET'])
 def generate_attestation_endpoint(student_name):
-    """Endpoint dédié pour générer des attestations"""
+    """Endpoint dédié pour générer des attestations (?async=1 : réponse 202 avec un identifiant de tâche)"""
+    if not assistant:
+        return jsonify({"error": "Assistant non disponible"}), 503
+    if is_async_requested():
+        current_user = get_optional_current_user()
+        payload, status_code = submit_job("attestation", {"student_name": student_name}, current_user)
+        return jsonify(payload), status_code
+    return generate_attestation(student_name)
+
+def generate_attestation(student_name: str):
+    """Génère l'attestation d'un élève (synchrone ou depuis la file de tâches) : retourne la réponse Flask"""
     try:
         if not assistant:
             return jsonify({"error": "Assistant non disponible"}), 503
@@ -632,7 +1020,7 @@ def generate_attestation_endpoint(student_name):
         student_data['nom_complet'] = f"{student_data['NomFr']} {student_data['PrenomFr']}"
         student_data['classe'] = student_data.get('classe', 'Classe non précisée')
         student_data['lieu_naissance'] = student_data.get('lieu_de_naissance', 'Non précisé')
-        student_data['annee_scolaire'] = "2024/2025"
+        student_data['annee_scolaire'] = SCHOOL_YEAR
         
         # Générer le PDF
         pdf_result = generator.generate(student_data)
@@ -686,6 +1074,11 @@ def health_check():
             except:
                 health_status["services"]["database"] = False
         
+        try:
+            health_status["db_pool"] = get_pool().stats()
+        except Exception as pool_error:
+            health_status["db_pool"] = {"error": str(pool_error)}
+        
         # Test du cache
         if assistant:
             health_status["services"]["cache"] = (
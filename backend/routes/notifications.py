@@ -1,6 +1,7 @@
 
 from flask import Blueprint, jsonify
 from config.database import get_db
+from agent.result_cache import get_result_cache
 import json
 from datetime import datetime
 import traceback
@@ -10,9 +11,13 @@ notifications_bp = Blueprint('notifications_bp', __name__)
 @notifications_bp.route('/check_notifications', methods=['GET'])
 def check_exam_notifications():
     conn = get_db()
-    cursor = conn.cursor(dictionary=True)
+    if conn is None:
+        return jsonify({"error": "Connexion à la base de données indisponible"}), 503
+    cursor = None
 
     try:
+        cursor = conn.cursor(dictionary=True)
+
         # --- 1. Sélection des examens à venir
         cursor.execute("""
             SELECT * FROM repartitionexamen
@@ -74,6 +79,11 @@ def check_exam_notifications():
             )
             conn.commit()
 
+        # Les réponses de l'assistant lisant notification_queue ne sont plus à jour
+        result_cache = get_result_cache()
+        if result_cache:
+            result_cache.invalidate_tables(["notification_queue"])
+
         return jsonify(messages)
 
     except Exception as e:
@@ -81,5 +91,6 @@ def check_exam_notifications():
         return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
 
     finally:
-        cursor.close()
+        if cursor:
+            cursor.close()
         conn.close()
@@ -81,3 +81,9 @@ class AuthService:
         except Exception as e:
             current_app.logger.error(f"❌ Erreur authentification: {str(e)}")
             return None
+
+        finally:
+            if cursor:
+                cursor.close()
+            if connection and hasattr(connection, '_direct_connection'):
+                connection.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Bases SQLite (caches de requêtes, file de tâches) isolées de backend/data pendant les tests
+_TEST_DATA_DIR = tempfile.mkdtemp(prefix="assistant-tests-")
+os.environ.setdefault("SQL_CACHE_DB_PATH", os.path.join(_TEST_DATA_DIR, "sql_query_cache.db"))
+os.environ.setdefault("JOB_QUEUE_DB_PATH", os.path.join(_TEST_DATA_DIR, "jobs.db"))
@@ -0,0 +1,53 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token
+
+from routes.agent import agent_bp
+
+ADMIN_ROUTES = [
+    ("/api/result-cache/invalidate", {"tables": ["eleve"]}),
+    ("/api/children-directory/invalidate", {"parent_id": 1001}),
+    ("/api/cache/warm", {"dry_run": True}),
+]
+
+
+@pytest.fixture(scope="module")
+def app():
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY="test-secret-key-with-enough-bytes", TESTING=True)
+    JWTManager(app)
+    app.register_blueprint(agent_bp, url_prefix='/api')
+    return app
+
+
+def _headers(app, roles=None, refresh=False):
+    with app.app_context():
+        if refresh:
+            token = create_refresh_token(identity="admin")
+        else:
+            token = create_access_token(identity="user", additional_claims={"roles": roles or []})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("path,body", ADMIN_ROUTES)
+def test_admin_routes_require_a_token(app, path, body):
+    assert app.test_client().post(path, json=body).status_code == 401
+
+
+@pytest.mark.parametrize("path,body", ADMIN_ROUTES)
+def test_admin_routes_refuse_refresh_tokens(app, path, body):
+    response = app.test_client().post(path, json=body, headers=_headers(app, refresh=True))
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("path,body", ADMIN_ROUTES)
+def test_admin_routes_refuse_parents(app, path, body):
+    response = app.test_client().post(path, json=body, headers=_headers(app, ["ROLE_PARENT"]))
+    assert response.status_code == 403
+
+
+def test_super_admin_can_invalidate_result_cache(app):
+    response = app.test_client().post("/api/result-cache/invalidate", json={"tables": ["eleve"]},
+                                      headers=_headers(app, ["ROLE_SUPER_ADMIN"]))
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
@@ -0,0 +1,178 @@
+import threading
+
+import pytest
+
+import agent.assistant as assistant_module
+from agent.assistant import SQLAssistant
+
+
+class FakeConnection:
+    _direct_connection = True
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConversations:
+    def __init__(self):
+        self.messages = []
+        self.owners = {7: 1, 99: 2}
+
+    def create_conversation(self, user_id, title):
+        return 7
+
+    def is_owner(self, conversation_id, user_id):
+        return self.owners.get(conversation_id) == user_id
+
+    def add_message(self, conversation_id, role, content, sql_query=None, graph_data=None):
+        self.messages.append((role, content, conversation_id))
+
+
+class SharedRunnerUnavailable:
+    """Le pool partagé des /ask ne doit pas être utilisé par un lot"""
+
+    def submit(self, *args, **kwargs):
+        raise AssertionError("pool partagé utilisé par le lot")
+
+    run_parallel = submit
+
+
+SQL_BY_QUESTION = {
+    "Combien d'élèves ?": "SELECT COUNT(*) FROM eleve",
+    "Nombre d'élèves": "SELECT COUNT(*) FROM eleve",
+    "Liste des classes": "SELECT * FROM classe",
+}
+
+
+@pytest.fixture
+def assistant(monkeypatch):
+    connections = []
+
+    def get_db():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    monkeypatch.setattr(assistant_module, "get_db", get_db)
+    assistant = SQLAssistant.__new__(SQLAssistant)
+    assistant.stage_runner = SharedRunnerUnavailable()
+    assistant.conversation_manager = FakeConversations()
+    assistant.executed = []
+    assistant.connections = connections
+    lock = threading.Lock()
+
+    def resolve(question, use_ai=True):
+        return {"role": "admin", "sql": SQL_BY_QUESTION[question], "source": "cache", "message": None}
+
+    def execute(plan, question, auto_correct=True, connection=None):
+        with lock:
+            assistant.executed.append((plan["sql"], connection))
+        return {"success": True, "sql": plan["sql"], "data": [{"sql": plan["sql"]}], "error": None}
+
+    assistant._resolve_super_admin_sql = resolve
+    assistant._execute_plan = execute
+    assistant.format_response_with_ai = lambda data, question, sql_query: f"réponse: {question}"
+    assistant.generate_graph_if_relevant = lambda data, question: None
+    return assistant
+
+
+def test_batch_keeps_input_order_and_runs_identical_sql_once(assistant):
+    questions = ["Liste des classes", "Combien d'élèves ?", "Nombre d'élèves", "Combien  d'élèves ?", "Liste des classes"]
+
+    results, conversation_id = assistant.ask_questions_batch(questions, 1, ["ROLE_SUPER_ADMIN"], max_concurrency=2)
+
+    assert conversation_id == 7
+    assert [result["question"] for result in results] == questions
+    # Questions identiques à l'espacement près : même réponse
+    assert [result["response"] for result in results] == [f"réponse: {' '.join(q.split())}" for q in questions]
+    assert [result["sql_query"] for result in results] == [SQL_BY_QUESTION[" ".join(q.split())] for q in questions]
+    assert all(result["status"] == "success" for result in results)
+
+    # Deux requêtes SQL distinctes, exécutées une fois chacune sur une seule connexion empruntée
+    assert sorted(sql for sql, _ in assistant.executed) == ["SELECT * FROM classe", "SELECT COUNT(*) FROM eleve"]
+    assert len(assistant.connections) == 1
+    assert all(connection is assistant.connections[0] for _, connection in assistant.executed)
+    assert assistant.connections[0].closed
+
+    # Une seule conversation : une question et une réponse par entrée du lot
+    assert len(assistant.conversation_manager.messages) == 2 * len(questions)
+
+
+def test_batch_without_role_is_refused(assistant):
+    results, conversation_id = assistant.ask_questions_batch(["Liste des classes"], 1, [])
+
+    assert conversation_id == 0
+    assert results[0]["status"] == "error"
+    assert assistant.executed == []
+
+
+def test_batch_does_not_write_into_another_users_conversation(assistant):
+    results, conversation_id = assistant.ask_questions_batch(
+        ["Liste des classes"], 1, ["ROLE_SUPER_ADMIN"], conversation_id=99
+    )
+
+    assert results[0]["status"] == "success"
+    assert conversation_id == 7
+    assert {conversation for _, _, conversation in assistant.conversation_manager.messages} == {7}
+
+
+def test_batch_continues_an_owned_conversation(assistant):
+    assistant.conversation_manager.owners[12] = 1
+    _, conversation_id = assistant.ask_questions_batch(["Liste des classes"], 1, ["ROLE_SUPER_ADMIN"],
+                                                       conversation_id=12)
+
+    assert conversation_id == 12
+    assert {conversation for _, _, conversation in assistant.conversation_manager.messages} == {12}
+
+
+class RouteAssistant:
+    """Assistant minimal pour les routes : seule la conversation 99 appartient à l'utilisateur 2"""
+
+    def __init__(self):
+        self.calls = []
+
+    def is_conversation_owner(self, conversation_id, user_id):
+        return conversation_id == 99 and user_id == 2
+
+    def ask_questions_batch(self, questions, user_id, roles, conversation_id=None):
+        self.calls.append(conversation_id)
+        return [], conversation_id
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+
+    import routes.agent as agent_routes
+
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY="test-secret-key-with-enough-bytes", TESTING=True)
+    JWTManager(app)
+    app.register_blueprint(agent_routes.agent_bp, url_prefix='/api')
+    fake = RouteAssistant()
+    monkeypatch.setattr(agent_routes, "assistant", fake)
+
+    def headers(idpersonne):
+        with app.app_context():
+            token = create_access_token(identity=str(idpersonne), additional_claims={
+                "idpersonne": idpersonne, "roles": ["ROLE_PARENT"]
+            })
+        return {"Authorization": f"Bearer {token}"}
+
+    client = app.test_client()
+    client.headers_for, client.assistant = headers, fake
+    return client
+
+
+def test_batch_route_refuses_another_users_conversation(client):
+    body = {"questions": ["Liste des classes"], "conversation_id": 99}
+    response = client.post("/api/ask-batch", json=body, headers=client.headers_for(1))
+    assert response.status_code == 404
+    assert client.assistant.calls == []
+
+    response = client.post("/api/ask-batch", json=body, headers=client.headers_for(2))
+    assert response.status_code == 200
+    assert client.assistant.calls == [99]
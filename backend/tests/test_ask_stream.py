@@ -0,0 +1,95 @@
+import pytest
+
+from agent.assistant import SQLAssistant
+
+
+class FakeConversations:
+    def __init__(self):
+        self.messages = []
+        self.owners = {7: 1, 99: 2}
+
+    def create_conversation(self, user_id, title):
+        return 7
+
+    def is_owner(self, conversation_id, user_id):
+        return self.owners.get(conversation_id) == user_id
+
+    def add_message(self, conversation_id, role, content, sql_query=None, graph_data=None):
+        self.messages.append((conversation_id, role, content))
+
+
+@pytest.fixture
+def assistant():
+    assistant = SQLAssistant.__new__(SQLAssistant)
+    assistant.conversation_manager = FakeConversations()
+    assistant._resolve_super_admin_sql = lambda question: {
+        "role": "admin", "sql": "", "source": None, "message": "Bonjour"
+    }
+    return assistant
+
+
+def test_stream_does_not_write_into_another_users_conversation(assistant):
+    events = list(assistant.ask_question_stream("bonjour", 1, ["ROLE_SUPER_ADMIN"], conversation_id=99))
+
+    assert events[-1]["event"] == "done"
+    assert events[-1]["conversation_id"] == 7
+    assert [conversation for conversation, _, _ in assistant.conversation_manager.messages] == [7, 7]
+
+
+def test_stream_continues_an_owned_conversation(assistant):
+    events = list(assistant.ask_question_stream("bonjour", 2, ["ROLE_SUPER_ADMIN"], conversation_id=99))
+
+    assert events[-1]["conversation_id"] == 99
+    assert [conversation for conversation, _, _ in assistant.conversation_manager.messages] == [99, 99]
+
+
+class RouteAssistant:
+    """Assistant minimal pour les routes : seule la conversation 99 appartient à l'utilisateur 2"""
+
+    def __init__(self):
+        self.calls = []
+
+    def is_conversation_owner(self, conversation_id, user_id):
+        return conversation_id == 99 and user_id == 2
+
+    def ask_question_stream(self, question, user_id, roles, conversation_id):
+        self.calls.append(conversation_id)
+        yield {"event": "done", "conversation_id": conversation_id}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+
+    import routes.agent as agent_routes
+
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY="test-secret-key-with-enough-bytes", TESTING=True)
+    JWTManager(app)
+    app.register_blueprint(agent_routes.agent_bp, url_prefix='/api')
+    fake = RouteAssistant()
+    monkeypatch.setattr(agent_routes, "assistant", fake)
+
+    def headers(idpersonne):
+        with app.app_context():
+            token = create_access_token(identity=str(idpersonne), additional_claims={
+                "idpersonne": idpersonne, "roles": ["ROLE_PARENT"]
+            })
+        return {"Authorization": f"Bearer {token}"}
+
+    client = app.test_client()
+    client.headers_for, client.assistant = headers, fake
+    return client
+
+
+def test_stream_route_refuses_another_users_conversation(client):
+    response = client.post("/api/ask-stream", json={"question": "bonjour", "conversation_id": 99},
+                           headers=client.headers_for(1))
+    assert response.status_code == 404
+    assert client.assistant.calls == []
+
+    response = client.post("/api/ask-stream", json={"question": "bonjour", "conversation_id": 99},
+                           headers=client.headers_for(2))
+    assert response.status_code == 200
+    assert client.assistant.calls == [99]
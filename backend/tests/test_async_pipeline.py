@@ -0,0 +1,50 @@
+import asyncio
+
+from agent.assistant import SQLAssistant
+from agent.async_pipeline import AsyncAssistantPipeline
+
+
+class FakeConversations:
+    def __init__(self):
+        self.messages = []
+        self.owners = {7: 1, 99: 2}
+
+    def create_conversation(self, user_id, title):
+        return 7
+
+    def is_owner(self, conversation_id, user_id):
+        return self.owners.get(conversation_id) == user_id
+
+    def add_message(self, conversation_id, role, content, sql_query=None, graph_data=None):
+        self.messages.append((conversation_id, role))
+
+
+def make_pipeline():
+    assistant = SQLAssistant.__new__(SQLAssistant)
+    assistant.conversation_manager = FakeConversations()
+    pipeline = AsyncAssistantPipeline(assistant)
+
+    async def resolve(question, user_id, roles):
+        return {"role": "admin", "sql": "SELECT 1", "source": "cache", "message": None}
+
+    async def answer_from_plan(plan, question):
+        return plan["sql"], "1", None
+
+    pipeline.resolve, pipeline.answer_from_plan = resolve, answer_from_plan
+    return pipeline
+
+
+def test_ask_does_not_write_into_another_users_conversation():
+    pipeline = make_pipeline()
+    result = asyncio.run(pipeline.ask("Combien ?", 1, ["ROLE_SUPER_ADMIN"], conversation_id=99))
+
+    assert result[3] == 7
+    assert pipeline.assistant.conversation_manager.messages == [(7, 'user'), (7, 'assistant')]
+
+
+def test_ask_continues_an_owned_conversation():
+    pipeline = make_pipeline()
+    result = asyncio.run(pipeline.ask("Combien ?", 2, ["ROLE_SUPER_ADMIN"], conversation_id=99))
+
+    assert result[3] == 99
+    assert pipeline.assistant.conversation_manager.messages == [(99, 'user'), (99, 'assistant')]
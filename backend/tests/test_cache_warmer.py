@@ -0,0 +1,74 @@
+import pytest
+
+from agent import cache_warmer as cache_warmer_module
+from agent.cache_manager import CacheManager
+from agent.cache_manager1 import CacheManager1
+from agent.cache_warmer import CacheWarmer
+from agent.conversation_history import ConversationHistory
+
+ROLES = {
+    1: ["ROLE_SUPER_ADMIN"],
+    1001: ["ROLE_PARENT"],
+    3: ["ROLE_ADMIN"],
+}
+PARENT_QUESTION = "notes de Ahmed en maths"
+PARENT_SQL = "SELECT n.note FROM noteeval n WHERE n.IdPersonne = 7012"
+ADMIN_QUESTION = "Liste des salles du bâtiment Z"
+ADMIN_SQL = "SELECT * FROM salle WHERE batiment = 'Z'"
+
+
+@pytest.fixture
+def warmer(tmp_path, monkeypatch):
+    history = ConversationHistory(str(tmp_path / "conversations.db"))
+    for user_id, question, sql_query in [
+        (1001, PARENT_QUESTION, PARENT_SQL),
+        (1001, PARENT_QUESTION, PARENT_SQL),
+        (1, ADMIN_QUESTION, ADMIN_SQL),
+        (1, ADMIN_QUESTION, ADMIN_SQL),
+        (3, "Liste des enseignants", "SELECT * FROM enseignant"),
+        (3, "Liste des enseignants", "SELECT * FROM enseignant"),
+    ]:
+        conversation_id = history.create_conversation(user_id, question)
+        history.add_message(conversation_id, 'user', question)
+        history.add_message(conversation_id, 'assistant', "réponse", sql_query)
+
+    requested = []
+
+    def user_roles(user_ids):
+        requested.append(user_ids)
+        return {user_id: ROLES[user_id] for user_id in user_ids}
+
+    monkeypatch.setattr(CacheWarmer, "explain", staticmethod(lambda sql_query: None))
+    warmer = CacheWarmer(CacheManager(), CacheManager1(), history.db_path, user_roles=user_roles)
+    warmer.requested = requested
+    return warmer
+
+
+def test_groups_follow_the_role_of_the_conversation_owner(warmer):
+    groups = warmer.frequent_questions(top_n=10, days=1, min_count=2)
+
+    assert warmer.requested == [[1, 3, 1001]]
+    roles = {group["candidates"][0][0]: group["role"] for group in groups}
+    # Question d'un parent sans mot de la famille : jamais rangée côté admin
+    assert roles == {PARENT_QUESTION: "parent", ADMIN_QUESTION: "admin"}
+
+
+def test_parent_history_is_never_written_to_the_admin_cache(warmer, monkeypatch):
+    cached = []
+    monkeypatch.setattr(warmer.admin_cache, "cache_query", lambda question, sql: cached.append(("admin", sql)))
+    monkeypatch.setattr(warmer.parent_cache, "cache_query", lambda question, sql: cached.append(("parent", sql)))
+
+    report = warmer.warm(top_n=10, days=1, min_count=2)
+
+    entries = {entry["question"]: entry for entry in report["entries"]}
+    assert entries[PARENT_QUESTION]["role"] == "parent"
+    assert entries[PARENT_QUESTION]["status"] == "invalid"
+    assert ("admin", PARENT_SQL) not in cached
+    assert cached == [("admin", ADMIN_SQL)]
+
+
+def test_roles_are_parsed_from_the_user_table_format():
+    assert CacheWarmer._parse_roles('["ROLE_PARENT"]') == ["ROLE_PARENT"]
+    assert CacheWarmer._parse_roles(b'["ROLE_SUPER_ADMIN", "ROLE_USER"]') == ["ROLE_SUPER_ADMIN", "ROLE_USER"]
+    assert CacheWarmer._parse_roles("ROLE_PARENT") == ["ROLE_PARENT"]
+    assert CacheWarmer._parse_roles(None) == []
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import MySQLdb
+import pytest
+
+from config.database import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.alive = True
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        if not self.alive:
+            raise MySQLdb.OperationalError("MySQL server has gone away")
+
+    def cursor(self, cursorclass=None):
+        return ("cursor", self.number, cursorclass)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    def __init__(self, fail=False):
+        self.created = []
+        self.fail = fail
+
+    def __call__(self):
+        if self.fail:
+            return None
+        connection = FakeConnection(len(self.created))
+        self.created.append(connection)
+        return connection
+
+
+def make_pool(factory=None, **kwargs):
+    kwargs.setdefault("min_size", 0)
+    kwargs.setdefault("max_size", 2)
+    kwargs.setdefault("max_lifetime", 3600)
+    kwargs.setdefault("ping_after", 3600)
+    kwargs.setdefault("wait_timeout", 1)
+    return ConnectionPool(factory or FakeFactory(), **kwargs)
+
+
+def test_warm_up_opens_min_size_connections():
+    factory = FakeFactory()
+    pool = make_pool(factory, min_size=2, max_size=5)
+    pool.warm_up()
+
+    assert len(factory.created) == 2
+    assert pool.stats()["idle"] == 2
+    assert pool.stats()["in_use"] == 0
+
+
+def test_released_connection_is_reused():
+    factory = FakeFactory()
+    pool = make_pool(factory)
+
+    first = pool.acquire()
+    assert first.cursor() == ("cursor", 0, None)
+    assert first.number == 0
+    first.close()
+    first.close()  # second close() sans effet
+
+    second = pool.acquire()
+    assert second._raw is first._raw
+    assert len(factory.created) == 1
+    assert pool.stats()["in_use"] == 1
+    assert pool.stats()["checkouts"] == 2
+    assert not factory.created[0].closed
+
+
+def test_context_manager_returns_the_connection():
+    pool = make_pool()
+    with pool.acquire():
+        assert pool.stats()["in_use"] == 1
+    assert pool.stats()["in_use"] == 0
+    assert pool.stats()["idle"] == 1
+
+
+def test_acquire_times_out_when_every_connection_is_in_use():
+    pool = make_pool(max_size=1)
+    held = pool.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire(timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+    assert pool.stats()["timeouts"] == 1
+    held.close()
+
+
+def test_waiter_gets_the_released_connection():
+    factory = FakeFactory()
+    pool = make_pool(factory, max_size=1)
+    held = pool.acquire()
+    acquired = []
+
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=2)))
+    waiter.start()
+    time.sleep(0.1)
+    held.close()
+    waiter.join()
+
+    assert acquired[0]._raw is held._raw
+    assert len(factory.created) == 1
+
+
+def test_concurrent_checkouts_never_exceed_max_size():
+    factory = FakeFactory()
+    pool = make_pool(factory, max_size=3, wait_timeout=5)
+    in_use = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(20):
+            with pool.acquire():
+                with lock:
+                    in_use.append(1)
+                    peak.append(len(in_use))
+                time.sleep(0.001)
+                with lock:
+                    in_use.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) <= 3
+    assert len(factory.created) <= 3
+    assert pool.stats()["checkouts"] == 160
+    assert pool.stats()["in_use"] == 0
+
+
+def test_idle_connection_failing_ping_is_replaced():
+    factory = FakeFactory()
+    pool = make_pool(factory, ping_after=0)
+    pool.acquire().close()
+    factory.created[0].alive = False
+    time.sleep(0.01)
+
+    connection = pool.acquire()
+    assert connection.number == 1
+    assert factory.created[0].closed
+    assert pool.stats()["failed_pings"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_old_connections_are_recycled():
+    factory = FakeFactory()
+    pool = make_pool(factory, max_lifetime=0)
+    connection = pool.acquire()
+    time.sleep(0.01)
+    connection.close()
+
+    assert factory.created[0].closed
+    assert pool.stats()["recycled"] == 1
+    assert pool.stats()["size"] == 0
+
+
+def test_failed_creation_frees_its_slot():
+    pool = make_pool(FakeFactory(fail=True), max_size=1)
+
+    for _ in range(2):
+        with pytest.raises(MySQLdb.OperationalError):
+            pool.acquire()
+    assert pool.stats()["size"] == 0
+
+
+def test_forgotten_connection_is_discarded():
+    factory = FakeFactory()
+    pool = make_pool(factory, max_size=1)
+    connection = pool.acquire()
+    del connection
+
+    assert factory.created[0].closed
+    assert pool.stats()["discarded"] == 1
+    assert pool.acquire(timeout=0.1).number == 1
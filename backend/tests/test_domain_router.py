@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from agent.domain_router import DomainRouter
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent", "prompts")
+
+
+def _load(name):
+    with open(os.path.join(PROMPTS_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def domains():
+    return _load("domain_descriptions.json"), _load("domain_tables_mapping.json")
+
+
+def test_confident_question_is_routed_locally(domains):
+    calls = []
+    router = DomainRouter(*domains, llm_fallback=lambda question: calls.append(question) or [])
+
+    routed, score, source = router.route("Quel est le montant des paiements impayés ?")
+
+    assert source == "local"
+    assert "FINANCES_PAIEMENTS" in routed
+    assert score >= router.min_score
+    assert calls == []
+
+
+def test_llm_without_domain_means_full_schema(domains):
+    router = DomainRouter(*domains, llm_fallback=lambda question: [])
+
+    routed, score, source = router.route("bonjour")
+
+    assert score < router.min_score
+    assert (routed, source) == ([], "llm")
+
+
+def test_llm_domains_replace_low_confidence_candidates(domains):
+    descriptions, _ = domains
+    domain = next(iter(descriptions))
+    router = DomainRouter(*domains, llm_fallback=lambda question: [domain, "INCONNU"])
+
+    assert router.route("bonjour")[0] == [domain]
+
+
+def test_low_confidence_candidates_are_kept_without_fallback(domains):
+    router = DomainRouter(*domains)
+
+    routed, score, source = router.route("bonjour")
+
+    assert source == "local"
+    assert score < router.min_score
@@ -0,0 +1,179 @@
+import threading
+import time
+
+import pytest
+
+from agent.job_queue import JOB_STALE_AFTER, JobQueue, JobQueueFullError
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(**kwargs):
+        kwargs.setdefault("workers", 0)
+        kwargs.setdefault("poll_interval", 0.05)
+        queue = JobQueue(db_path=str(tmp_path / "jobs.db"), **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+
+
+def test_claim_takes_the_oldest_job_of_a_known_kind_once(make_queue):
+    queue = make_queue()
+    queue.register("ask", lambda payload: payload)
+    first = queue.submit("ask", {"n": 1})
+    second = queue.submit("ask", {"n": 2})
+
+    assert queue._claim()["id"] == first
+    assert queue._claim()["id"] == second
+    assert queue._claim() is None
+    assert queue.get(first)["status"] == "running"
+
+
+def test_claim_ignores_kinds_without_handler(make_queue):
+    producer = make_queue()
+    producer.register("ask", lambda payload: payload)
+    producer.register("attestation", lambda payload: payload)
+    producer.submit("attestation", {})
+    ask_id = producer.submit("ask", {})
+
+    consumer = make_queue()
+    consumer.register("ask", lambda payload: payload)
+    assert consumer._claim()["id"] == ask_id
+    assert consumer._claim() is None
+
+
+def test_each_job_runs_once_across_workers(make_queue):
+    queue = make_queue(workers=4)
+    runs = []
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            runs.append(payload["n"])
+        return payload["n"]
+
+    queue.register("ask", handler)
+    job_ids = [queue.submit("ask", {"n": n}) for n in range(20)]
+    results = [queue.wait(job_id, 5) for job_id in job_ids]
+
+    assert [job["status"] for job in results] == ["done"] * 20
+    assert [job["result"] for job in results] == list(range(20))
+    assert sorted(runs) == list(range(20))
+
+
+def test_handler_error_is_recorded(make_queue):
+    queue = make_queue(workers=1)
+
+    def boom(payload):
+        raise ValueError("kaput")
+
+    queue.register("boom", boom)
+    job = queue.wait(queue.submit("boom", {}), 5)
+
+    assert job["status"] == "error"
+    assert job["error"] == "kaput"
+    assert queue.stats()["failed"] == 1
+
+
+def test_jobs_are_only_visible_to_their_owner(make_queue):
+    queue = make_queue()
+    queue.register("ask", lambda payload: payload)
+    owned = queue.submit("ask", {}, owner=5)
+    anonymous = queue.submit("ask", {})
+
+    assert queue.get(owned, owner=5)["job_id"] == owned
+    assert queue.get(owned, owner="5")["job_id"] == owned
+    assert queue.get(owned, owner=6) is None
+    assert queue.get(owned) is None
+    assert queue.get(anonymous)["job_id"] == anonymous
+    assert queue.get(anonymous, owner=5) is None
+    assert queue.wait(owned, 1, owner=6) is None
+
+
+def test_finished_jobs_expire_after_the_result_ttl(make_queue):
+    queue = make_queue(result_ttl=60)
+    queue.register("ask", lambda payload: {"ok": True})
+    job_id = queue.submit("ask", {})
+    queue._run(job_id, "ask", queue._claim()["payload"])
+
+    job = queue.get(job_id)
+    assert job["status"] == "done" and job["result"] == {"ok": True}
+
+    # Résultat arrivé en fin de TTL
+    with queue._connection() as conn:
+        conn.execute('UPDATE jobs SET expires_at = ? WHERE id = ?', (time.time() - 1, job_id))
+    assert queue.get(job_id) is None
+
+    queue._purge(time.time())
+    assert queue._connection().execute('SELECT COUNT(*) FROM jobs').fetchone()[0] == 0
+
+
+def test_purge_closes_stale_running_jobs(make_queue):
+    queue = make_queue()
+    queue.register("ask", lambda payload: payload)
+    job_id = queue.submit("ask", {})
+    queue._claim()
+
+    queue._purge(time.time() + JOB_STALE_AFTER + 1)
+    job = queue.get(job_id)
+    assert job["status"] == "error"
+    assert job["error"] == "Tâche interrompue"
+
+
+def test_submit_is_refused_when_the_queue_is_full(make_queue):
+    queue = make_queue(max_pending=2)
+    queue.register("ask", lambda payload: payload)
+    queue.submit("ask", {})
+    queue.submit("ask", {})
+
+    with pytest.raises(JobQueueFullError):
+        queue.submit("ask", {})
+    with pytest.raises(ValueError):
+        queue.submit("inconnu", {})
+    assert queue.stats()["rejected"] == 1
+
+
+def test_wait_returns_the_running_job_after_the_timeout(make_queue):
+    queue = make_queue(workers=1)
+    release = threading.Event()
+    queue.register("slow", lambda payload: release.wait(5))
+    job_id = queue.submit("slow", {})
+
+    started = time.time()
+    job = queue.wait(job_id, 0.2)
+    assert job["status"] in ("queued", "running")
+    assert time.time() - started < 2
+
+    release.set()
+    assert queue.wait(job_id, 5)["status"] == "done"
+
+
+def test_concurrent_submits_never_exceed_max_pending(make_queue):
+    # Plusieurs instances sur la même base : comme des processus distincts
+    queues = [make_queue(max_pending=10) for _ in range(4)]
+    for queue in queues:
+        queue.register("ask", lambda payload: payload)
+    barrier = threading.Barrier(len(queues) * 5)
+    accepted, rejected = [], []
+
+    def submit(queue):
+        barrier.wait()
+        try:
+            accepted.append(queue.submit("ask", {}))
+        except JobQueueFullError:
+            rejected.append(1)
+
+    threads = [threading.Thread(target=submit, args=(queue,)) for queue in queues for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(accepted) == 10
+    assert len(rejected) == 10
+    assert queues[0].stats()["queued"] == 10
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agent import llm_utils
+from agent.llm_utils import LLMResponseCache, MemoryLRUBackend
+
+MESSAGES = [{"role": "user", "content": "Liste des classes"}]
+
+
+class FakeClient:
+    """Client chat.completions qui répond avec le max_tokens demandé"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = f"réponse max_tokens={kwargs['max_tokens']} temperature={kwargs['temperature']}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    cache = LLMResponseCache(MemoryLRUBackend())
+    monkeypatch.setattr(llm_utils, "get_llm_client", lambda: client)
+    monkeypatch.setattr(llm_utils, "get_llm_cache", lambda: cache)
+    return client
+
+
+def test_key_depends_on_every_generation_parameter():
+    base = LLMResponseCache.make_key("gpt-4o", 0.1, 2048, MESSAGES)
+    assert base == LLMResponseCache.make_key("gpt-4o", 0.1, 2048, [dict(m) for m in MESSAGES])
+    assert base != LLMResponseCache.make_key("gpt-4o", 0.1, 256, MESSAGES)
+    assert base != LLMResponseCache.make_key("gpt-4o", 0.7, 2048, MESSAGES)
+    assert base != LLMResponseCache.make_key("gpt-4o-mini", 0.1, 2048, MESSAGES)
+    assert base != LLMResponseCache.make_key("gpt-4o", 0.1, 2048, [{"role": "user", "content": "Autre"}])
+
+
+def test_truncated_response_is_not_served_for_a_larger_max_tokens(client):
+    short = llm_utils.chat_completion(MESSAGES, max_tokens=16, cache_site="format")
+    full = llm_utils.chat_completion(MESSAGES, max_tokens=2048, cache_site="format")
+
+    assert short != full
+    assert [call["max_tokens"] for call in client.calls] == [16, 2048]
+
+
+def test_identical_calls_are_served_from_cache(client):
+    first = llm_utils.chat_completion(MESSAGES, max_tokens=512, cache_site="format")
+    second = llm_utils.chat_completion(MESSAGES, max_tokens=512, timeout=5, cache_site="format")
+
+    assert first == second
+    assert len(client.calls) == 1
@@ -0,0 +1,133 @@
+import re
+import threading
+import time
+
+import pytest
+
+from agent.assistant import SQLAssistant
+from agent.cache_manager1 import CacheManager1
+from agent.question_parser import QuestionParser
+from agent.single_flight import SingleFlight
+
+QUESTION = "Notes de mon fils en mathématiques au 1er trimestre"
+
+PARENTS = {
+    1001: {"child_id": 55, "name": "Ali"},
+    2002: {"child_id": 66, "name": "Sara"},
+}
+
+
+@pytest.fixture
+def assistant():
+    assistant = SQLAssistant.__new__(SQLAssistant)
+    assistant.cache1 = CacheManager1()
+    assistant.question_parser = QuestionParser(assistant.cache1.extractor)
+    assistant.single_flight = SingleFlight()
+    return assistant
+
+
+def _plan(assistant, user_id):
+    parent = PARENTS[user_id]
+    return {
+        "role": "parent", "sql": None, "source": None, "message": None,
+        "parsed": assistant.question_parser.parse(QUESTION),
+        "context": {
+            "user_id": user_id,
+            "children_ids": [parent["child_id"]],
+            "children_ids_str": str(parent["child_id"]),
+            "children_names_str": parent["name"],
+        },
+    }
+
+
+def _ask_together(assistant, generate):
+    """Les deux parents posent la même question au même moment"""
+    calls = []
+
+    def generate_sql_parent(question, user_id, children_ids_str, children_names_str):
+        calls.append(user_id)
+        time.sleep(0.3)
+        return generate(user_id, children_ids_str)
+
+    assistant.generate_sql_parent = generate_sql_parent
+    barrier = threading.Barrier(len(PARENTS))
+    plans = {}
+
+    def ask(user_id):
+        plan = _plan(assistant, user_id)
+        barrier.wait()
+        plans[user_id] = assistant._generate_parent_sql_coalesced(plan, QUESTION, plan["parsed"])
+
+    threads = [threading.Thread(target=ask, args=(user_id,)) for user_id in PARENTS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return plans, calls
+
+
+def _numbers(sql):
+    return set(re.findall(r'\d+', sql))
+
+
+def _assert_isolated(plans):
+    for user_id, plan in plans.items():
+        assert not plan["message"], plan["message"]
+        own = PARENTS[user_id]
+        assert str(own["child_id"]) in _numbers(plan["sql"])
+        for other_id, other in PARENTS.items():
+            if other_id != user_id:
+                assert str(other_id) not in _numbers(plan["sql"])
+                assert str(other["child_id"]) not in _numbers(plan["sql"])
+
+
+def test_parent_id_in_generated_sql_is_never_shared(assistant):
+    def generate(user_id, child_id):
+        return (
+            "SELECT n.moyenne FROM edumoymati n "
+            "JOIN eleve e ON n.eleve = e.id "
+            "JOIN parenteleve pev ON pev.Eleve = e.id "
+            "JOIN parent pa ON pev.Parent = pa.id "
+            f"WHERE pa.Personne = {user_id} AND e.IdPersonne = {child_id} AND n.codeperiexam = 31"
+        )
+
+    plans, calls = _ask_together(assistant, generate)
+
+    _assert_isolated(plans)
+    # Le template contient l'ID du premier parent : le second a eu sa propre génération
+    assert sorted(calls) == sorted(PARENTS)
+    assert all(plan["source"] == "ai" for plan in plans.values())
+
+
+def test_shared_sql_is_bound_to_each_parent_children(assistant):
+    def generate(user_id, child_id):
+        return (
+            "SELECT n.moyenne FROM edumoymati n JOIN eleve e ON n.eleve = e.id "
+            f"WHERE e.IdPersonne = {child_id} AND n.codeperiexam = 31"
+        )
+
+    plans, calls = _ask_together(assistant, generate)
+
+    _assert_isolated(plans)
+    assert len(calls) == 1
+    assert sorted(plan["source"] for plan in plans.values()) == ["ai", "ai_shared"]
+
+
+def test_child_id_rewrite_is_limited_to_idpersonne(assistant):
+    plan = _plan(assistant, 1001)
+    template = assistant._parent_sql_template(
+        "SELECT * FROM eleve e WHERE e.IdPersonne = 55", QUESTION, plan["parsed"].variables, plan["context"]
+    )
+    assert template == "SELECT * FROM eleve e WHERE e.IdPersonne = {id_personne}"
+
+    sql = "SELECT * FROM eleve e JOIN classe c ON c.id = e.Classe WHERE e.IdPersonne = 55 AND c.IDNIV = 55"
+
+    # 55 reste écrit en dur dans une autre colonne : pas de template partageable
+    assert assistant._parent_sql_template(sql, QUESTION, plan["parsed"].variables, plan["context"]) is None
+
+
+def test_unexpected_numbers_prevent_sharing(assistant):
+    plan = _plan(assistant, 1001)
+    sql = "SELECT * FROM eleve e JOIN inscriptioneleve ie ON ie.Eleve = e.id WHERE e.IdPersonne = 55 AND ie.Classe = 4321"
+
+    assert assistant._parent_sql_template(sql, QUESTION, plan["parsed"].variables, plan["context"]) is None
@@ -0,0 +1,73 @@
+import pytest
+
+from agent import prompt_builder as prompt_builder_module
+from agent.prompt_builder import PromptBuilder, count_tokens
+from config.schema_catalog import SchemaCatalog
+
+QUESTION = "eleve nom prenom paiement montant cantine"
+
+COLUMNS = {
+    "eleve": ["id", "nom", "prenom"],
+    "paiement": ["id", "montant", "id_ins"],
+    "inscription": ["id", "id_el"],
+    "cantine": ["id", "id_rep"],
+    "repas": ["id", "id_fam", "menu", "prix", "jour", "service", "allergenes"],
+    "famille": ["id", "id_el", "adresse", "ville", "telephone", "quotient"],
+}
+FOREIGN_KEYS = [
+    ("paiement", "id_ins", "inscription", "id"),
+    ("inscription", "id_el", "eleve", "id"),
+    ("cantine", "id_rep", "repas", "id"),
+    ("repas", "id_fam", "famille", "id"),
+    ("famille", "id_el", "eleve", "id"),
+]
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    catalog = SchemaCatalog()
+    keys = {(table, column) for table, column, _, _ in FOREIGN_KEYS}
+    catalog._build(
+        [(table, column, "int", "NO", "PRI" if column == "id" else ("MUL" if (table, column) in keys else ""), None)
+         for table, columns in COLUMNS.items() for column in columns],
+        FOREIGN_KEYS
+    )
+    monkeypatch.setattr(catalog, "refresh", lambda force=False: False)
+    monkeypatch.setattr(prompt_builder_module, "get_schema_catalog", lambda: catalog)
+    return catalog
+
+
+def _reduced_cost(builder, catalog, tables):
+    terms = builder._question_terms(QUESTION)
+    return sum(count_tokens(catalog.render_table(table, builder._relevant_columns(catalog, table, terms))) + 1
+               for table in tables)
+
+
+def _tables(table_info):
+    return {line.split(": ", 1)[1] for line in table_info.splitlines() if line.startswith("Table: ")}
+
+
+def test_every_seed_comes_with_its_join_path(catalog):
+    builder = PromptBuilder()
+    table_info, stats = builder.select_table_info(QUESTION, None, budget=100000)
+
+    assert _tables(table_info) == set(COLUMNS)
+    assert sorted(stats["join_tables"]) == ["famille", "inscription", "repas"]
+
+
+def test_over_budget_drops_the_lowest_seed_with_its_path(catalog):
+    builder = PromptBuilder()
+    budget = _reduced_cost(builder, catalog, ["eleve", "paiement", "inscription"]) + 1
+    assert budget < _reduced_cost(builder, catalog, ["eleve", "paiement", "inscription", "cantine"])
+
+    table_info, stats = builder.select_table_info(QUESTION, None, budget=budget)
+
+    # cantine (pivot le moins pertinent) part avec repas et famille ; paiement garde son chemin
+    assert _tables(table_info) == {"eleve", "paiement", "inscription"}
+    assert stats["join_tables"] == ["inscription"]
+
+
+def test_first_seed_is_kept_even_over_budget(catalog):
+    table_info, _ = PromptBuilder().select_table_info(QUESTION, None, budget=1)
+
+    assert _tables(table_info) == {"eleve"}
@@ -0,0 +1,35 @@
+import pytest
+
+from agent.prompts.templates import ADMIN_PROMPT_TEMPLATE, PARENT_PROMPT_TEMPLATE, STATIC_PREFIXES
+
+TEMPLATES = {"admin": ADMIN_PROMPT_TEMPLATE, "parent": PARENT_PROMPT_TEMPLATE}
+
+CONTEXTS = [
+    {"input": "Combien d'élèves en 7B1 ?", "table_info": "Table: eleve\n- id INT", "relevant_domain_descriptions": "ELEVES",
+     "user_id": 1001, "children_ids": "7012", "children_names": "Amine"},
+    {"input": "Emploi du temps de mes enfants", "table_info": "Table: seance\n- jour VARCHAR",
+     "relevant_domain_descriptions": "", "user_id": 2002, "children_ids": "7012, 7716", "children_names": "Amine, Sara"},
+]
+
+
+def _render(template, context):
+    return template.format(**{name: context[name] for name in template.input_variables})
+
+
+@pytest.mark.parametrize("role", sorted(TEMPLATES))
+def test_static_prefix_is_identical_across_requests(role):
+    prefix = STATIC_PREFIXES[role].encode("utf-8")
+    first, second = (_render(TEMPLATES[role], context).encode("utf-8") for context in CONTEXTS)
+
+    assert first.startswith(prefix)
+    assert second.startswith(prefix)
+    assert first[:len(prefix)] == second[:len(prefix)]
+    # Les prompts ne diffèrent qu'après le préfixe
+    assert first != second
+
+
+@pytest.mark.parametrize("role", sorted(TEMPLATES))
+def test_static_prefix_has_no_variable(role):
+    prefix = STATIC_PREFIXES[role]
+    assert "{" not in prefix and "}" not in prefix
+    assert not any(f"{{{name}}}" in prefix for name in TEMPLATES[role].input_variables)
@@ -0,0 +1,115 @@
+import time
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from agent.similarity_index import SimilarityIndex
+
+TEMPLATES = {
+    "notes": "notes de mon fils en mathematiques",
+    "absences": "absences de ma fille ce trimestre",
+    "menu": "menu de la cantine aujourd hui",
+    "emploi": "emploi du temps de la classe",
+}
+
+
+def make_index(**kwargs):
+    kwargs.setdefault("refit_rows", 1000)
+    kwargs.setdefault("refit_interval", 3600)
+    index = SimilarityIndex(**kwargs)
+    for key, text in TEMPLATES.items():
+        index.add(key, index.encode(text))
+    return index
+
+
+def count_fits(index, monkeypatch):
+    calls = []
+    fit = index._fit
+
+    def counting_fit():
+        calls.append(1)
+        return fit()
+
+    monkeypatch.setattr(index, "_fit", counting_fit)
+    return calls
+
+
+def test_scores_match_tfidf_vectorizer():
+    index = make_index()
+    question = "notes de ma fille en mathematiques"
+
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform(list(TEMPLATES.values()))
+    expected = cosine_similarity(vectorizer.transform([question]), matrix)[0]
+
+    scores = dict(index.search(question, k=len(TEMPLATES)))
+    for key, score in zip(TEMPLATES, expected):
+        assert scores.get(key, 0.0) == pytest.approx(score)
+
+
+def test_insert_is_searchable_without_rebuilding_the_matrix(monkeypatch):
+    index = make_index()
+    index.search("menu")
+    fits = count_fits(index, monkeypatch)
+
+    index.add("paiements", index.encode("paiements des frais de scolarite"))
+    results = index.search("frais de scolarite", k=2)
+
+    assert results[0][0] == "paiements"
+    assert fits == []
+    assert index._pending.keys == ("paiements",)
+
+
+def test_replaced_row_no_longer_matches_its_old_text(monkeypatch):
+    index = make_index()
+    index.search("menu")
+    fits = count_fits(index, monkeypatch)
+
+    index.add("menu", index.encode("horaires bibliotheque"))
+
+    assert "menu" not in dict(index.search("menu de la cantine", k=4))
+    assert index.search("horaires bibliotheque", k=1)[0][0] == "menu"
+    assert fits == []
+
+
+def test_background_refit_after_refit_rows_inserts():
+    index = make_index(refit_rows=2)
+    index.search("menu")
+    index.add("paiements", index.encode("paiements des frais"))
+    index.add("bulletin", index.encode("bulletin du trimestre"))
+
+    deadline = time.time() + 5
+    while index._pending.keys and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert index._pending.keys == ()
+    assert set(index._snapshot.keys) == set(TEMPLATES) | {"paiements", "bulletin"}
+    # Après recalcul : mêmes scores qu'un index construit d'un coup
+    fresh = SimilarityIndex()
+    for key in index.keys:
+        fresh.add(key, index._counts[index.row_of(key)])
+    assert index.search("frais du trimestre", k=6) == pytest.approx(fresh.search("frais du trimestre", k=6))
+
+
+def test_inserts_during_a_refit_stay_searchable():
+    index = make_index()
+    index.search("menu")
+    index.add("paiements", index.encode("paiements des frais"))
+
+    snapshot, sequence = index._fit()
+    index.add("bulletin", index.encode("bulletin du trimestre"))
+    index._install(snapshot, sequence)
+
+    assert "paiements" in snapshot.keys
+    assert index._pending.keys == ("bulletin",)
+    assert index.search("bulletin", k=1)[0][0] == "bulletin"
+
+
+def test_empty_index_and_unknown_words():
+    index = SimilarityIndex()
+    assert index.search("menu") == []
+    index = make_index()
+    assert index.search("xyzzy inconnu") == []
+    assert np.isclose(index.most_similar("menu de la cantine aujourd hui")[1], 1.0)
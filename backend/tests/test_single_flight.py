@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from agent.single_flight import SingleFlight
+
+
+def _run_together(count, target):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        barrier.wait()
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_calls_share_the_leader_result():
+    flight = SingleFlight()
+    calls = []
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    results = _run_together(4, lambda: flight.do("key", slow, 21))
+
+    assert calls == [21]
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result == 42 for result, _ in results)
+    stats = flight.stats()
+    assert stats["leaders"] == 1 and stats["shared"] == 3 and stats["in_flight"] == 0
+
+
+def test_leader_exception_propagates_to_followers():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("kaput")
+
+    results = _run_together(3, lambda: flight.do("key", failing))
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["errors"] == 1
+
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    # Rien n'est gardé une fois l'appel terminé
+    assert flight.do("a", lambda: 3) == (3, False)
+
+
+def test_follower_runs_alone_after_timeout():
+    flight = SingleFlight(timeout=0.05)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(2)
+        return "leader"
+
+    leader = threading.Thread(target=flight.do, args=("key", blocking))
+    leader.start()
+    started.wait(1)
+    try:
+        assert flight.do("key", lambda: "follower") == ("follower", False)
+    finally:
+        release.set()
+        leader.join()
+    assert flight.stats()["timeouts"] == 1
+
+
+def test_leader_error_is_raised_to_leader():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do("key", lambda: {}["missing"])
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,105 @@
+import pytest
+
+from agent.sql_params import BoundQuery, PreparedStatementRegistry, bind_template, execute_bound, render_sql
+
+
+class FakeCursor:
+    def __init__(self, fail_on=None):
+        self.executed = []
+        self.fail_on = fail_on
+
+    def execute(self, sql, params=None):
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise RuntimeError("Unknown prepared statement")
+        self.executed.append((sql, params))
+
+
+class FakeConnection:
+    def thread_id(self):
+        return 42
+
+
+def test_placeholder_inside_like_pattern_is_bound_as_one_value():
+    bound = bind_template("SELECT * FROM personne WHERE NomFr LIKE '%{NomFr}%'", {"NomFr": "DUPONT"})
+
+    assert bound == BoundQuery("SELECT * FROM personne WHERE NomFr LIKE %s", ("%DUPONT%",))
+    assert render_sql(bound) == "SELECT * FROM personne WHERE NomFr LIKE '%DUPONT%'"
+
+
+def test_like_pattern_value_with_quote_is_escaped_when_rendered():
+    bound = bind_template("SELECT * FROM personne WHERE NomFr LIKE \"{NomFr}%\"", {"NomFr": "O'NEIL"})
+
+    assert bound.params == ("O'NEIL%",)
+    assert render_sql(bound) == "SELECT * FROM personne WHERE NomFr LIKE 'O''NEIL%'"
+
+
+def test_literal_percent_is_doubled_only_when_there_are_params():
+    bound = bind_template("SELECT * FROM classe WHERE CODECLASSEFR LIKE '7%' AND id = {id}", {"id": "12"})
+    assert bound == BoundQuery("SELECT * FROM classe WHERE CODECLASSEFR LIKE '7%%' AND id = %s", (12,))
+    assert render_sql(bound) == "SELECT * FROM classe WHERE CODECLASSEFR LIKE '7%' AND id = 12"
+
+    unbound = bind_template("SELECT * FROM classe WHERE CODECLASSEFR LIKE '7%'", {})
+    assert unbound == BoundQuery("SELECT * FROM classe WHERE CODECLASSEFR LIKE '7%'", ())
+
+
+def test_list_is_expanded_for_in_clause():
+    bound = bind_template("SELECT * FROM eleve e WHERE e.IdPersonne IN ({id_personne})", {"id_personne": [55, "56"]})
+
+    assert bound == BoundQuery("SELECT * FROM eleve e WHERE e.IdPersonne IN (%s, %s)", (55, 56))
+    assert render_sql(bound) == "SELECT * FROM eleve e WHERE e.IdPersonne IN (55, 56)"
+
+
+def test_empty_list_is_rejected():
+    with pytest.raises(ValueError):
+        bind_template("SELECT * FROM eleve WHERE IdPersonne IN ({id_personne})", {"id_personne": []})
+
+
+def test_quoted_placeholder_keeps_text_and_prequoted_value_is_unquoted():
+    bound = bind_template(
+        "SELECT * FROM edumoymati WHERE codeperiexam = '{codeperiexam}' AND libelleJourFr = {jour}",
+        {"codeperiexam": 31, "jour": "'Lundi'"}
+    )
+
+    assert bound.sql == "SELECT * FROM edumoymati WHERE codeperiexam = %s AND libelleJourFr = %s"
+    assert bound.params == ("31", "Lundi")
+
+
+def test_missing_variables_stay_in_text():
+    bound = bind_template("SELECT * FROM t WHERE a = {a} AND b LIKE '%{b}%' AND c = '{missing} {a}'", {"a": 1, "b": "x"})
+
+    assert bound.sql == "SELECT * FROM t WHERE a = %s AND b LIKE %s AND c = '{missing} 1'"
+    assert bound.params == (1, "%x%")
+
+
+def test_identifier_variables_are_inserted_after_validation():
+    bound = bind_template("SELECT {type_evaluation_column} FROM notes", {"type_evaluation_column": "orale1"})
+    assert bound == BoundQuery("SELECT orale1 FROM notes", ())
+
+    with pytest.raises(ValueError):
+        bind_template("SELECT {type_evaluation_column} FROM notes", {"type_evaluation_column": "1; DROP TABLE x"})
+
+
+def test_prepared_statements_are_reused_per_connection():
+    registry = PreparedStatementRegistry(per_connection=1)
+    connection, cursor = FakeConnection(), FakeCursor()
+
+    registry.execute(connection, cursor, BoundQuery("SELECT * FROM eleve WHERE id = %s AND a LIKE 'x%%'", (1,)))
+    registry.execute(connection, cursor, BoundQuery("SELECT * FROM eleve WHERE id = %s AND a LIKE 'x%%'", (2,)))
+
+    prepares = [sql for sql, _ in cursor.executed if sql.startswith("PREPARE")]
+    assert len(prepares) == 1
+    assert cursor.executed[0][1] == ("SELECT * FROM eleve WHERE id = ? AND a LIKE 'x%'",)
+    assert registry.stats()["reused"] == 1
+
+    # Une deuxième requête dépasse per_connection : la première est libérée
+    registry.execute(connection, cursor, BoundQuery("SELECT * FROM classe WHERE id = %s", (3,)))
+    assert any(sql.startswith("DEALLOCATE PREPARE") for sql, _ in cursor.executed)
+
+
+def test_execute_bound_falls_back_to_cursor_parameters():
+    cursor = FakeCursor(fail_on="PREPARE")
+    bound = BoundQuery("SELECT * FROM eleve WHERE id = %s", (1,))
+
+    execute_bound(FakeConnection(), cursor, bound, prepared=True)
+
+    assert cursor.executed[-1] == (bound.sql, bound.params)
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from agent.stage_runner import StageRunner
+
+
+def test_timeout_starts_when_the_stage_runs():
+    runner = StageRunner(max_workers=1)
+    release = threading.Event()
+    blocker = runner.submit("blocker", release.wait, 5)
+    try:
+        stage = runner.submit("format", lambda: time.sleep(0.3) or "formaté")
+        # Le pool est occupé 0,4 s puis l'étape dure 0,3 s : seul son temps d'exécution compte pour le délai de 0,5 s
+        threading.Timer(0.4, release.set).start()
+        assert runner.result("format", stage, fallback="repli", timeout=0.5) == "formaté"
+    finally:
+        release.set()
+        blocker.result()
+    assert runner.stats()["timeouts"] == 0
+
+
+def test_stage_still_queued_after_timeout_is_cancelled():
+    runner = StageRunner(max_workers=1)
+    release = threading.Event()
+    calls = []
+    blocker = runner.submit("blocker", release.wait, 5)
+    try:
+        stage = runner.submit("graph", calls.append, "graph")
+        assert runner.result("graph", stage, fallback="repli", timeout=0.1) == "repli"
+        assert stage.cancelled()
+    finally:
+        release.set()
+        blocker.result()
+    assert calls == []
+    assert runner.stats()["cancelled"] == 1
+
+
+def test_running_stage_over_its_timeout_falls_back():
+    runner = StageRunner(max_workers=2)
+    stage = runner.submit("format", time.sleep, 0.3)
+    assert runner.result("format", stage, fallback=lambda: "repli", timeout=0.05) == "repli"
+    assert runner.stats()["timeouts"] == 1
+
+
+def test_run_parallel_reports_fallbacks(caplog):
+    runner = StageRunner(max_workers=2)
+
+    def failing():
+        raise RuntimeError("kaput")
+
+    with caplog.at_level("WARNING"):
+        results = runner.run_parallel({
+            "graph": (lambda value: value, ("graphique",), None),
+            "format": (failing, (), "réponse simple"),
+        })
+
+    assert results == {"graph": "graphique", "format": "réponse simple"}
+    assert any("format (error)" in record.getMessage() for record in caplog.records)